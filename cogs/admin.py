@@ -17,24 +17,41 @@ class Admin(commands.Cog):
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=True)
         try:
-            db = self.bot.data.db
-            
+            db_handler = self.bot.data
+
             embed = discord.Embed(
                 title="⚙️ Админ-панель Aviasales Roblox",
                 color=discord.Color.red()
             )
 
-            # Получаем статистику
-            airlines_count = len(list(db.collection('airlines').stream()))
-            flights_count = len(list(db.collection('flights').stream()))
-            partners_count = len(list(db.collection('partners').stream()))
-            pending_apps = len(list(db.collection('airline_applications').where('status', '==', 'pending').stream()))
+            # Статистика из общего снимка (count()-запросы не чаще раза в минуту)
+            snapshot = await db_handler.stats_snapshot.get(max_age=60)
+            airlines_count = snapshot.get('total_airlines', 0)
+            flights_count = snapshot.get('total_flights', 0)
+            partners_count = snapshot.get('total_partners', 0)
+            pending_apps = snapshot.get('pending_applications', 0)
 
             embed.add_field(name="🛫 Авиакомпаний", value=f"**{airlines_count}**", inline=True)
             embed.add_field(name="✈️ Рейсов", value=f"**{flights_count}**", inline=True)
             embed.add_field(name="🤝 Партнеров", value=f"**{partners_count}**", inline=True)
             embed.add_field(name="⏳ Ожидают модерации", value=f"**{pending_apps}**", inline=True)
 
+            # Состояние внешних API аэропортов
+            airlines_cog = self.bot.get_cog('Airlines')
+            airport_service = getattr(airlines_cog, 'airport_service', None)
+            if airport_service and hasattr(airport_service, 'api_health'):
+                state_emoji = {'closed': '🟢', 'half_open': '🟡', 'open': '🔴'}
+                api_lines = []
+                for name, health in airport_service.api_health().items():
+                    line = f"{state_emoji.get(health['state'], '❓')} **{name}** — ошибки {health['error_rate']:.0%}"
+                    if health['p50_ms'] is not None:
+                        line += f", p50 {health['p50_ms']:.0f} мс / p95 {health['p95_ms']:.0f} мс"
+                    if health['retry_in'] is not None:
+                        line += f", повтор через {health['retry_in']:.0f} с"
+                    api_lines.append(line)
+                if api_lines:
+                    embed.add_field(name="🌐 API аэропортов", value="\n".join(api_lines), inline=False)
+
             # Кнопки управления
             class AdminView(View):
                 def __init__(self):
@@ -44,8 +61,8 @@ class Admin(commands.Cog):
                 async def moderation_button(self, interaction: discord.Interaction, button: Button):
                     try:
                         # Показываем очередь модерации
-                        apps_ref = db.collection('airline_applications')
-                        pending_apps = apps_ref.where('status', '==', 'pending').get()
+                        apps_ref = db_handler.collection('airline_applications')
+                        pending_apps = await db_handler.fetch(apps_ref.where('status', '==', 'pending'))
 
                         if not pending_apps:
                             await interaction.response.send_message(
@@ -104,36 +121,10 @@ class Admin(commands.Cog):
                             color=discord.Color.blue()
                         )
 
-                        # Собираем статистику
-                        today = datetime.now().date()
-
-                        # Рейсы за сегодня
-                        flights_today = 0
-                        flights = db.collection('flights').stream()
-                        for flight in flights:
-                            flight_data = flight.to_dict()
-                            flight_date_str = flight_data.get('created_at', '')
-                            if flight_date_str:
-                                try:
-                                    flight_date = datetime.fromisoformat(flight_date_str).date()
-                                    if flight_date == today:
-                                        flights_today += 1
-                                except:
-                                    pass
-
-                        # Новые авиакомпании за сегодня
-                        new_airlines = 0
-                        airlines = db.collection('airlines').stream()
-                        for airline in airlines:
-                            airline_data = airline.to_dict()
-                            created_str = airline_data.get('created_at', '')
-                            if created_str:
-                                try:
-                                    created_date = datetime.fromisoformat(created_str).date()
-                                    if created_date == today:
-                                        new_airlines += 1
-                                except:
-                                    pass
+                        # Дневные счетчики - один документ в stats
+                        daily = await db_handler.get_daily_counters()
+                        flights_today = daily.get('flights_created', 0)
+                        new_airlines = daily.get('airlines_created', 0)
 
                         stats_embed.add_field(name="📅 Сегодня", value=f"Новых рейсов: **{flights_today}**\nНовых авиакомпаний: **{new_airlines}**", inline=False)
 
@@ -218,7 +209,7 @@ class BanModal(Modal, title="🚫 Блокировка пользователя"
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            db = interaction.client.data.db
+            db_handler = interaction.client.data
 
             try:
                 duration_days = int(self.duration.value)
@@ -250,8 +241,7 @@ class BanModal(Modal, title="🚫 Блокировка пользователя"
                 unban_date = datetime.now() + timedelta(days=duration_days)
                 ban_data['unban_at'] = unban_date.isoformat()
 
-            bans_ref = db.collection('bans')
-            bans_ref.add(ban_data)
+            await db_handler.add_document('bans', ban_data)
 
             # Логируем в аудит
             audit_channel_id = interaction.client.CHANNEL_IDS.get("AUDIT_CHANNEL")
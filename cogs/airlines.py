@@ -17,6 +17,7 @@ except ImportError:
     class AirportService:
         def __init__(self, bot):
             self.bot = bot
+            self.airport_db = None
 
         async def initialize(self):
             pass
@@ -30,10 +31,18 @@ except ImportError:
         async def search_airport_by_code(self, code: str):
             return None
 
+        async def find_nearby(self, query: str, radius_km=None, limit: int = 10):
+            return None, []
+
+        async def suggestion_hint(self, query: str, limit: int = 3):
+            return ""
+
         def generate_flight_number(self, airline_iata: str, route_number: str):
             return f"{airline_iata}{route_number}"
 
 from utils.decorators import handle_errors
+from utils.database import FLIGHT_STATUSES
+from utils.route_geometry import estimate_route, estimate_routes
 from firebase_admin import firestore
 
 class Airlines(commands.Cog):
@@ -58,21 +67,11 @@ class Airlines(commands.Cog):
 
     async def _get_user_airline(self, user_id: Any) -> Optional[Dict]:
         """Получение авиакомпании пользователя"""
-        # Попробуем получить из кэша через DatabaseHandler
-        airline = await self.bot.data.get_airline_by_owner(str(user_id))
+        # Владелец или сотрудник - через индекс участников DatabaseHandler
+        airline = await self.bot.data.get_airline_by_member(str(user_id))
         if airline:
             return {'id': airline['id'], 'data': airline}
 
-        # Если не нашли как владельца, ищем как сотрудника
-        airlines_ref = self.db.collection('airlines')
-        all_airlines = airlines_ref.stream()
-        for airline_doc in all_airlines:
-            airline_data = airline_doc.to_dict()
-            employees = airline_data.get('employees', [])
-
-            if any(emp.get('user_id') == str(user_id) for emp in employees):
-                return {'id': airline_doc.id, 'data': airline_data}
-
         return None
 
     @app_commands.command(name="настройка", description="Настройки вашей авиакомпании")
@@ -171,8 +170,7 @@ class Airlines(commands.Cog):
 
                         @discord.ui.button(label="📋 Список аэропортов", style=discord.ButtonStyle.primary, emoji="📋")
                         async def list_airports(self, interaction: discord.Interaction, button: Button):
-                            airline_ref = self.cog.db.collection('airlines').document(self.airline_id)
-                            airline = airline_ref.get()
+                            airline = await self.cog.bot.data.get_document('airlines', self.airline_id)
 
                             if airline.exists:
                                 airline_data = airline.to_dict()
@@ -221,8 +219,7 @@ class Airlines(commands.Cog):
 
                         @discord.ui.button(label="📋 Список маршрутов", style=discord.ButtonStyle.primary, emoji="📋")
                         async def list_routes(self, interaction: discord.Interaction, button: Button):
-                            airline_ref = self.cog.db.collection('airlines').document(self.airline_id)
-                            airline = airline_ref.get()
+                            airline = await self.cog.bot.data.get_document('airlines', self.airline_id)
 
                             if airline.exists:
                                 airline_data = airline.to_dict()
@@ -251,6 +248,55 @@ class Airlines(commands.Cog):
                                 list_embed.set_footer(text=f"Всего маршрутов: {len(routes)}")
                                 await interaction.response.send_message(embed=list_embed, ephemeral=True)
 
+                        @discord.ui.button(label="📏 Проверить время маршрутов", style=discord.ButtonStyle.secondary, emoji="⏱️")
+                        async def check_routes(self, interaction: discord.Interaction, button: Button):
+                            await interaction.response.defer(ephemeral=True, thinking=True)
+                            db_handler = self.cog.bot.data
+                            airline = await db_handler.get_document('airlines', self.airline_id)
+                            if not airline.exists:
+                                await interaction.followup.send("❌ Авиакомпания не найдена!", ephemeral=True)
+                                return
+
+                            routes = airline.to_dict().get('routes', [])
+                            if not routes:
+                                await interaction.followup.send("❌ У вас нет добавленных маршрутов.", ephemeral=True)
+                                return
+
+                            # Расстояния по координатам из локальной базы аэропортов
+                            estimates = estimate_routes(self.cog.airport_service.airport_db, routes)
+
+                            check_text = ""
+                            changed = False
+                            for route, estimate in zip(routes, estimates):
+                                label = f"`{route.get('departure_code', '???')}` → `{route.get('arrival_code', '???')}`"
+                                if not estimate:
+                                    check_text += f"❓ {label}: нет координат\n"
+                                    continue
+
+                                distance, block_time = estimate
+                                if route.get('distance_km') != round(distance):
+                                    route['distance_km'] = round(distance)
+                                    changed = True
+
+                                try:
+                                    flight_time = int(route.get('flight_time') or 0)
+                                except (TypeError, ValueError):
+                                    check_text += f"❓ {label}: {distance:.0f} км, время указано неверно ({route.get('flight_time')}), оценка {block_time} мин\n"
+                                    continue
+                                # Расхождение больше трети - вероятная ошибка ввода
+                                mark = "⚠️" if abs(flight_time - block_time) > block_time / 3 else "✅"
+                                check_text += f"{mark} {label}: {distance:.0f} км, указано {flight_time} мин, оценка {block_time} мин\n"
+
+                            if changed:
+                                await db_handler.update_document('airlines', self.airline_id, {'routes': routes})
+
+                            check_embed = discord.Embed(
+                                title="📏 Проверка времени маршрутов",
+                                description=check_text[:4000],
+                                color=discord.Color.green())
+                            check_embed.set_footer(text="⚠️ - указанное время сильно отличается от расчетного")
+                            await interaction.followup.send(embed=check_embed, ephemeral=True)
+
                     routes_view = RoutesView(self.airline_id, self.airline_data, self.cog)
                     await interaction.response.send_message(embed=routes_embed, view=routes_view, ephemeral=True)
 
@@ -277,9 +323,7 @@ class Airlines(commands.Cog):
                             self.airline_data = airline_data
 
                         async def callback(self, interaction: discord.Interaction):
-                            db = interaction.client.data.db
-                            airline_ref = db.collection('airlines').document(self.airline_id)
-                            airline = airline_ref.get()
+                            airline = await interaction.client.data.get_document('airlines', self.airline_id)
 
                             if airline.exists:
                                 airline_data = airline.to_dict()
@@ -351,20 +395,21 @@ class Airlines(commands.Cog):
 
                                             @discord.ui.button(label="✅ Подтвердить удаление", style=discord.ButtonStyle.danger)
                                             async def confirm_button(self, interaction: discord.Interaction, button: Button):
-                                                db = interaction.client.data.db
+                                                db_handler = interaction.client.data
 
-                                                airlines_ref = db.collection('airlines')
-                                                airline_ref = airlines_ref.document(self.airline_id)
-                                                airline_data = airline_ref.get().to_dict()
+                                                airline_doc = await db_handler.get_document('airlines', self.airline_id)
+                                                airline_data = airline_doc.to_dict()
 
-                                                airline_ref.delete()
+                                                await db_handler.delete_document('airlines', self.airline_id)
 
-                                                flights_ref = db.collection('flights')
+                                                flights_ref = db_handler.collection('flights')
                                                 flights_query = flights_ref.where('airline_id', '==', self.airline_id)
-                                                flights = flights_query.get()
+                                                flights = await db_handler.fetch(flights_query)
 
-                                                for flight in flights:
-                                                    flight.reference.delete()
+                                                await asyncio.gather(*(
+                                                    db_handler.run(flight.reference.delete) for flight in flights
+                                                ))
+                                                await db_handler.delete_document('airline_stats', self.airline_id)
 
                                                 guild = interaction.guild
                                                 member = guild.get_member(int(self.owner_id))
@@ -443,10 +488,10 @@ class Airlines(commands.Cog):
                     )
 
             view = SettingsView(airline_id, airline_data, self)
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
         except Exception as e:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"❌ Ошибка при загрузке настроек: {str(e)}", ephemeral=True
             )
 
@@ -484,60 +529,80 @@ class Airlines(commands.Cog):
         modal = EnhancedAirportModal(airline_info['id'], self.airport_service)
         await interaction.response.send_modal(modal)
 
+    @app_commands.command(name="аэропорты_рядом", description="Аэропорты рядом с указанным")
+    @app_commands.describe(
+        airport="Код или название аэропорта (например: SVO)",
+        radius="Радиус поиска в км (по умолчанию - ближайшие)",
+        limit="Сколько аэропортов показать (до 25)"
+    )
+    async def nearby_airports_command(
+        self,
+        interaction: discord.Interaction,
+        airport: str,
+        radius: Optional[app_commands.Range[int, 1, 5000]] = None,
+        limit: app_commands.Range[int, 1, 25] = 10
+    ):
+        """Поиск ближайших аэропортов для планирования маршрутов"""
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=True)
+
+        origin, nearby = await self.airport_service.find_nearby(airport, radius, limit)
+
+        if not origin:
+            hint = await self.airport_service.suggestion_hint(airport)
+            await interaction.followup.send(f"❌ Аэропорт «{airport}» не найден." + hint, ephemeral=True)
+            return
+
+        if not nearby:
+            await interaction.followup.send(
+                f"❌ Рядом с {origin['name']} ({origin.get('iata') or origin.get('icao')}) аэропортов не найдено.",
+                ephemeral=True
+            )
+            return
+
+        nearby_text = ""
+        for i, item in enumerate(nearby, 1):
+            city = f", {item['city']}" if item.get('city') else ""
+            nearby_text += f"{i}. `{item['iata']}` **{item['name']}**{city} — {item['distance_km']:.0f} км\n"
+
+        embed = discord.Embed(
+            title=f"📍 Аэропорты рядом с {origin.get('iata') or origin.get('icao')}",
+            description=nearby_text,
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"{origin['name']} • " + (f"радиус {radius} км" if radius else f"ближайшие {limit}"))
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
     @app_commands.command(name="статистика", description="Статистика авиакомпании")
     async def airline_stats(self, interaction: discord.Interaction):
         """Статистика авиакомпании"""
         try:
             if not interaction.response.is_done():
                 await interaction.response.defer(ephemeral=True)
-            db = self.bot.data.db
+            db_handler = self.bot.data
 
-            airlines_ref = db.collection('airlines')
-            query = airlines_ref.where('owner_id', '==', str(interaction.user.id)).limit(1)
-            results = query.get()
+            airline_data = await db_handler.get_airline_by_owner(str(interaction.user.id))
 
-            if len(results) == 0:
+            if not airline_data:
                 await interaction.followup.send(
                     "❌ У вас нет зарегистрированной авиакомпании!",
                     ephemeral=True)
                 return
 
-            airline_data = results[0].to_dict()
-            airline_id = results[0].id
+            airline_id = airline_data['id']
             stats = airline_data.get('statistics', {})
 
-            flights_ref = db.collection('flights')
-            flights_query = flights_ref.where(filter=firestore.FieldFilter('airline_id', '==', airline_id))
-            airline_flights = flights_query.get()
-
-            status_counts = {
-                'scheduled': 0,
-                'boarding': 0,
-                'departed': 0,
-                'delayed': 0,
-                'cancelled': 0,
-                'completed': 0
-            }
-
-            for flight in airline_flights:
-                flight_data = flight.to_dict()
-                status = flight_data.get('status', 'scheduled')
-                if status in status_counts:
-                    status_counts[status] += 1
-
-            subscriptions_ref = db.collection('subscriptions')
-            total_subscriptions = 0
-
-            for flight in airline_flights:
-                flight_id = flight.id
-                subs_query = subscriptions_ref.where(filter=firestore.FieldFilter('flight_id', '==', flight_id))
-                subs = subs_query.get()
-                total_subscriptions += len(subs)
+            # Предрасчитанная статистика рейсов - одно чтение документа
+            flight_stats = await db_handler.get_airline_stats(airline_id)
+            total_flights = flight_stats.get('total_flights', 0)
+            total_subscriptions = flight_stats.get('total_subscriptions', 0)
+            status_counts = {status: 0 for status in FLIGHT_STATUSES}
+            status_counts.update(flight_stats.get('status_counts', {}))
 
             embed = discord.Embed(title=f"📊 Статистика {airline_data['name']}", color=discord.Color.blue())
 
             embed.add_field(name="📈 Общая статистика",
-                           value=f"""Всего рейсов: **{len(airline_flights)}**
+                           value=f"""Всего рейсов: **{total_flights}**
 Выполнено: **{stats.get('flights_completed', 0)}**
 Отменено: **{stats.get('flights_cancelled', 0)}**
 Задержано: **{stats.get('flights_delayed', 0)}**
@@ -564,29 +629,15 @@ class Airlines(commands.Cog):
                                    inline=True)
 
                     if days_active > 0:
-                        avg_flights = len(airline_flights) / days_active
+                        avg_flights = total_flights / days_active
                         embed.add_field(name="📊 Среднее рейсов в день",
                                        value=f"**{avg_flights:.1f}**",
                                        inline=True)
                 except:
                     pass
 
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            recent_flights = 0
-
-            for flight in airline_flights:
-                flight_data = flight.to_dict()
-                created_str = flight_data.get('created_at', '')
-                if created_str:
-                    try:
-                        created_date = datetime.fromisoformat(created_str.replace('Z', '+00:00'))
-                        if created_date > thirty_days_ago:
-                            recent_flights += 1
-                    except:
-                        pass
-
             embed.add_field(name="📅 Рейсов за 30 дней",
-                           value=f"**{recent_flights}**",
+                           value=f"**{flight_stats.get('recent_flights', 0)}**",
                            inline=True)
 
             # Добавляем статистику маршрутов
@@ -597,10 +648,10 @@ class Airlines(commands.Cog):
                            value=f"Маршрутов: **{len(routes)}**\nАэропортов: **{len(airports)}**",
                            inline=True)
 
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            await interaction.followup.send(embed=embed, ephemeral=True)
 
         except Exception as e:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"❌ Ошибка при загрузке статистики: {str(e)}", ephemeral=True
             )
 
@@ -666,19 +717,19 @@ class EnhancedAirportModal(Modal, title="🏢 Добавить аэропорт
 
             # 2. Проверяем результат
             if not self.found_airport:
+                hint = await self.airport_service.suggestion_hint(airport_name)
                 await interaction.followup.send(
                     "❌ Не удалось определить коды аэропорта.\n"
                     "Пожалуйста, уточните название или введите коды вручную:\n"
                     "- Для IATA кода: 3 заглавные буквы (например: SVO)\n"
-                    "- Для ICAO кода: 4 заглавные буквы (например: UUEE)",
+                    "- Для ICAO кода: 4 заглавные буквы (например: UUEE)" + hint,
                     ephemeral=True
                 )
                 return
 
             # 3. Сохраняем аэропорт в базу
-            db = interaction.client.data.db
-            airline_ref = db.collection('airlines').document(self.airline_id)
-            airline = airline_ref.get()
+            db_handler = interaction.client.data
+            airline = await db_handler.get_document('airlines', self.airline_id)
 
             if airline.exists:
                 current_data = airline.to_dict()
@@ -707,7 +758,7 @@ class EnhancedAirportModal(Modal, title="🏢 Добавить аэропорт
                     'added_at': datetime.now().isoformat()
                 })
 
-                airline_ref.update({'airports': airports})
+                await db_handler.update_document('airlines', self.airline_id, {'airports': airports})
 
                 # 4. Отправляем результат
                 embed = discord.Embed(
@@ -799,9 +850,8 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
 
         self.flight_time = TextInput(
             label="Время полета (минуты)",
-            placeholder="Например: 120",
-            required=True,
-            default="120"
+            placeholder="Пусто - рассчитать по координатам аэропортов",
+            required=False
         )
 
         self.aircraft = TextInput(
@@ -832,20 +882,25 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
                 )
                 return
 
-            # 2. Определяем коды аэропортов
-            self.departure_info = await self.airport_service.search_airport_by_name(self.departure_airport.value)
-            self.arrival_info = await self.airport_service.search_airport_by_name(self.arrival_airport.value)
+            # 2. Определяем коды аэропортов (оба аэропорта одновременно)
+            self.departure_info, self.arrival_info = await asyncio.gather(
+                self.airport_service.search_airport_by_name(self.departure_airport.value),
+                self.airport_service.search_airport_by_name(self.arrival_airport.value)
+            )
 
             if not self.departure_info or not self.arrival_info:
                 missing = []
+                hint = ""
                 if not self.departure_info:
                     missing.append("аэропорта вылета")
+                    hint += await self.airport_service.suggestion_hint(self.departure_airport.value)
                 if not self.arrival_info:
                     missing.append("аэропорта прилета")
+                    hint += await self.airport_service.suggestion_hint(self.arrival_airport.value)
 
                 await interaction.followup.send(
                     f"❌ Не удалось определить коды для {', '.join(missing)}.\n"
-                    "Пожалуйста, уточните названия или используйте коды (SVO, LED и т.д.)",
+                    "Пожалуйста, уточните названия или используйте коды (SVO, LED и т.д.)" + hint,
                     ephemeral=True
                 )
                 return
@@ -860,22 +915,31 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
             # 4. Создаем код маршрута
             route_code = f"{self.departure_info['iata']}-{self.arrival_info['iata']}"
 
-            # 5. Проверяем, что время полета - число
-            try:
-                flight_time = int(self.flight_time.value)
-                if flight_time <= 0:
-                    raise ValueError
-            except ValueError:
+            # 5. Время полета: введенное или рассчитанное по расстоянию
+            estimate = estimate_route(self.departure_info, self.arrival_info)
+            if self.flight_time.value.strip():
+                try:
+                    flight_time = int(self.flight_time.value)
+                    if flight_time <= 0:
+                        raise ValueError
+                except ValueError:
+                    await interaction.followup.send(
+                        "❌ Время полета должно быть положительным числом!",
+                        ephemeral=True
+                    )
+                    return
+            elif estimate:
+                flight_time = estimate[1]
+            else:
                 await interaction.followup.send(
-                    "❌ Время полета должно быть положительным числом!",
+                    "❌ Не удалось рассчитать время полета - нет координат аэропортов. Укажите его вручную.",
                     ephemeral=True
                 )
                 return
 
             # 6. Сохраняем маршрут в базу
-            db = interaction.client.data.db
-            airline_ref = db.collection('airlines').document(self.airline_id)
-            airline = airline_ref.get()
+            db_handler = interaction.client.data
+            airline = await db_handler.get_document('airlines', self.airline_id)
 
             if airline.exists:
                 current_data = airline.to_dict()
@@ -907,12 +971,13 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
                     'arrival_country': self.arrival_info.get('country', ''),
                     'aircraft': self.aircraft.value,
                     'flight_time': flight_time,
+                    'distance_km': round(estimate[0]) if estimate else None,
                     'created_at': datetime.now().isoformat(),
                     'active': True
                 }
 
                 routes.append(new_route)
-                airline_ref.update({'routes': routes})
+                await db_handler.update_document('airlines', self.airline_id, {'routes': routes})
 
                 # 7. Отправляем результат
                 embed = discord.Embed(
@@ -946,9 +1011,12 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
                     inline=True
                 )
 
+                flight_time_text = f"{flight_time} минут"
+                if estimate:
+                    flight_time_text += f"\n📏 {estimate[0]:.0f} км (оценка: {estimate[1]} мин)"
                 embed.add_field(
                     name="⏱️ Время полета",
-                    value=f"{flight_time} минут",
+                    value=flight_time_text,
                     inline=True
                 )
 
@@ -995,10 +1063,9 @@ class EmployeeModal(Modal, title="Добавить сотрудника"):
         self.add_item(self.role)
 
     async def on_submit(self, interaction: discord.Interaction):
-        db = interaction.client.data.db
-        airline_ref = db.collection('airlines').document(self.airline_id)
+        db_handler = interaction.client.data
 
-        airline = airline_ref.get()
+        airline = await db_handler.get_document('airlines', self.airline_id)
         if airline.exists:
             current_data = airline.to_dict()
             employees = current_data.get('employees', [])
@@ -1017,7 +1084,7 @@ class EmployeeModal(Modal, title="Добавить сотрудника"):
                 'added_at': datetime.now().isoformat()
             })
 
-            airline_ref.update({'employees': employees})
+            await db_handler.update_airline_employees(self.airline_id, current_data, employees)
 
             await interaction.response.send_message(
                 f"✅ Сотрудник с ID {self.user_id.value} добавлен!",
@@ -1057,8 +1124,7 @@ class EditAirlineModal(Modal, title="✏️ Редактирование ави
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            db = interaction.client.data.db
-            airline_ref = db.collection('airlines').document(self.airline_id)
+            db_handler = interaction.client.data
 
             updates = {}
             if self.name.value:
@@ -1070,7 +1136,7 @@ class EditAirlineModal(Modal, title="✏️ Редактирование ави
 
             if updates:
                 updates['updated_at'] = datetime.now().isoformat()
-                airline_ref.update(updates)
+                await db_handler.update_document('airlines', self.airline_id, updates)
 
                 audit_channel_id = self.bot.CHANNEL_IDS.get("AUDIT_CHANNEL")
                 if audit_channel_id:
@@ -1082,7 +1148,7 @@ class EditAirlineModal(Modal, title="✏️ Редактирование ави
                             timestamp=datetime.now()
                         )
 
-                        airline = airline_ref.get()
+                        airline = await db_handler.get_document('airlines', self.airline_id)
                         if airline.exists:
                             airline_data = airline.to_dict()
                             audit_embed.add_field(name="✈️ Авиакомпания", value=airline_data['name'], inline=True)
@@ -1,9 +1,15 @@
 import asyncio
 import aiohttp
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
 import re
-from datetime import datetime, timedelta
+import time
+
+from utils.airport_db import AirportDatabase, AIRPORTS_CSV_PATH
+from utils.airport_image import open_airport_table
+from utils.airport_cache import AirportCache
+from utils.circuit_breaker import CircuitBreaker
+from utils.route_geometry import airport_coordinates
 
 class AirportService:
     """Сервис для автоматического определения кодов аэропортов через API"""
@@ -11,9 +17,23 @@ class AirportService:
     def __init__(self, bot):
         self.bot = bot
         self.session = None
-        self.cache = {}
-        self.cache_ttl = 86400  # 24 часа кэширования
-        self.last_request = {}
+
+        # Кэш ответов внешних API: LRU в памяти + SQLite на диске,
+        # "не найдено" тоже кэшируется (на меньший срок)
+        self.cache = AirportCache()
+
+        # Одновременные поиски одного и того же ключа ждут один запрос
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.lookup_stats = {
+            'lookups': 0,
+            'coalesced': 0,
+            'cancelled': 0
+        }
+
+        # Локальная база аэропортов (загружается с диска при инициализации)
+        self.airport_db = AirportDatabase()
+        self._refresh_task = None
+        self._index_task = None
 
         # API для поиска аэропортов (публичные, без API ключа)
         self.api_endpoints = [
@@ -26,72 +46,133 @@ class AirportService:
                 'name': 'OpenSky',
                 'url': 'https://opensky-network.org/api/airports',
                 'parser': self._parse_opensky
-            },
-            {
-                'name': 'OurAirports',
-                'url': 'https://davidmegginson.github.io/ourairports-data/airports.csv',
-                'parser': self._parse_ourairports
             }
         ]
 
+        # Предохранитель и метрики для каждого API
+        for endpoint in self.api_endpoints:
+            endpoint['breaker'] = CircuitBreaker(endpoint['name'])
+
         # Регулярные выражения для извлечения IATA/ICAO кодов из текста
         self.iata_pattern = re.compile(r'\b[A-Z]{3}\b')
         self.icao_pattern = re.compile(r'\b[A-Z]{4}\b')
 
     async def initialize(self):
-        """Инициализация сессии"""
+        """Инициализация сессии и локальной базы аэропортов"""
         self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
 
+        try:
+            # Общий для всех процессов двоичный образ (собирается из CSV один раз)
+            self.airport_db = await asyncio.to_thread(open_airport_table)
+            print(f"✅ База аэропортов загружена: {len(self.airport_db)} аэропортов")
+            self._index_task = asyncio.create_task(self._build_indexes(self.airport_db))
+        except FileNotFoundError:
+            print(f"⚠️ Файл базы аэропортов {AIRPORTS_CSV_PATH} не найден")
+        except Exception as e:
+            print(f"Ошибка загрузки образа базы аэропортов: {e}")
+            try:
+                self.airport_db = await asyncio.to_thread(AirportDatabase.from_file)
+                print(f"✅ База аэропортов загружена из CSV: {len(self.airport_db)} аэропортов")
+            except Exception as e:
+                print(f"Ошибка загрузки базы аэропортов: {e}")
+
+        await self.cache.purge_expired()
+
+        # Обновление файла идет в фоне и не блокирует поиск
+        if AirportDatabase.is_stale():
+            self._refresh_task = asyncio.create_task(self._refresh_airport_db())
+
+    async def _refresh_airport_db(self):
+        """Скачать свежую базу OurAirports и подменить таблицу"""
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+                await AirportDatabase.download(session)
+            # Новый CSV свежее образа - open_airport_table пересоберет образ
+            table = await asyncio.to_thread(open_airport_table)
+            await self._build_indexes(table)
+
+            # Индексы новой таблицы готовы - подменяем, старую закрываем,
+            # когда ее перестанет читать поток построения ее индексов
+            previous, self.airport_db = self.airport_db, table
+            previous_index_task, self._index_task = self._index_task, None
+            print(f"✅ База аэропортов обновлена: {len(self.airport_db)} аэропортов")
+            await self._close_table(previous, previous_index_task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка обновления базы аэропортов: {e}")
+
+    async def _build_indexes(self, table):
+        """Индексы названий и координат строятся в потоке, коды доступны сразу"""
+        try:
+            await asyncio.to_thread(table.build_indexes)
+        except Exception as e:
+            print(f"Ошибка построения индексов аэропортов: {e}")
+
+    @staticmethod
+    async def _close_table(table, index_task: Optional[asyncio.Task]):
+        """Закрыть таблицу после потока построения ее индексов.
+
+        Отмена задачи не останавливает поток в to_thread, а закрытый
+        mmap под читающим потоком дает ошибку построения индексов.
+        """
+        if index_task is not None and not index_task.done():
+            await asyncio.wait({index_task})
+        if hasattr(table, 'close'):
+            table.close()
+
     async def close(self):
         """Закрытие сессии"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
         if self.session:
             await self.session.close()
+        self.cache.close()
+        await self._close_table(self.airport_db, self._index_task)
 
     async def search_airport_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Поиск аэропорта по названию"""
-        # Проверяем кэш
-        cache_key = f"name:{name.lower().strip()}"
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if (datetime.now() - cached_data['cached_at']).seconds < self.cache_ttl:
-                return cached_data['data']
+        # Сначала локальная база - без сети
+        result = self.airport_db.find_by_name(name)
+        if result:
+            return result
+
+        # Есть похожие аэропорты, но выбор неоднозначный - решает пользователь по подсказкам
+        if self.airport_db.search(name, limit=1):
+            return None
 
-        # Ограничение частоты запросов
-        if cache_key in self.last_request:
-            time_since_last = (datetime.now() - self.last_request[cache_key]).seconds
-            if time_since_last < 2:  # 2 секунды между запросами
-                await asyncio.sleep(2 - time_since_last)
+        cache_key = f"name:{name.lower().strip()}"
+        return await self._single_flight(cache_key, lambda: self._lookup_name(name, cache_key))
 
-        self.last_request[cache_key] = datetime.now()
+    async def _lookup_name(self, name: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        # Кэш ответов API (включая отрицательные)
+        found, cached = await self.cache.get(cache_key)
+        if found:
+            return cached
 
-        # Пытаемся найти через разные API
-        for endpoint in self.api_endpoints:
-            try:
-                result = await self._query_api(endpoint, name)
-                if result and result.get('iata') and result.get('icao'):
-                    # Кэшируем результат
-                    self.cache[cache_key] = {
-                        'data': result,
-                        'cached_at': datetime.now()
-                    }
-                    return result
-            except Exception as e:
-                print(f"Ошибка API {endpoint['name']}: {e}")
-                continue
+        # Опрашиваем все API одновременно - побеждает первый годный ответ
+        result, api_errors = await self._query_endpoints(
+            lambda endpoint: self._query_api(endpoint, name),
+            lambda result: bool(result and result.get('iata') and result.get('icao'))
+        )
 
         # Если API не сработали, попробуем извлечь коды из названия
-        return await self._extract_from_text(name)
+        if not result:
+            result = await self._extract_from_text(name)
+
+        # "Не найдено" кэшируем, только если API ответили без ошибок
+        if result or api_errors == 0:
+            await self.cache.set(cache_key, result)
+        return result
 
     async def search_airport_by_code(self, code: str) -> Optional[Dict[str, Any]]:
         """Поиск аэропорта по коду (IATA или ICAO)"""
         code = code.upper().strip()
 
-        # Проверяем кэш
-        cache_key = f"code:{code}"
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if (datetime.now() - cached_data['cached_at']).seconds < self.cache_ttl:
-                return cached_data['data']
+        # Локальная база: поиск по индексу IATA/ICAO
+        result = self.airport_db.get_by_code(code)
+        if result:
+            return result
 
         # Определяем тип кода
         if len(code) == 3:
@@ -101,133 +182,121 @@ class AirportService:
         else:
             return None
 
-        # Ищем через API
-        for endpoint in self.api_endpoints:
-            try:
-                result = await self._query_api_by_code(endpoint, code, search_type)
-                if result:
-                    self.cache[cache_key] = {
-                        'data': result,
-                        'cached_at': datetime.now()
-                    }
-                    return result
-            except Exception as e:
-                print(f"Ошибка API {endpoint['name']}: {e}")
-                continue
-
-        return None
-
-    async def _query_api(self, endpoint: Dict, query: str) -> Optional[Dict[str, Any]]:
-        """Запрос к API"""
-        try:
-            if endpoint['name'] == 'OurAirports':
-                # Для CSV файла - нужно скачать и парсить локально
-                return await self._download_and_search_ourairports(query)
-
-            url = f"{endpoint['url']}{query}"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    if 'json' in response.headers.get('Content-Type', ''):
-                        data = await response.json()
-                    else:
-                        data = await response.text()
-
-                    return endpoint['parser'](data, query)
-        except Exception as e:
-            print(f"Ошибка запроса к {endpoint['name']}: {e}")
-            return None
-
-    async def _query_api_by_code(self, endpoint: Dict, code: str, code_type: str) -> Optional[Dict[str, Any]]:
-        """Запрос к API по коду"""
+        cache_key = f"code:{code}"
+        return await self._single_flight(cache_key, lambda: self._lookup_code(code, search_type, cache_key))
+
+    async def _lookup_code(self, code: str, search_type: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        found, cached = await self.cache.get(cache_key)
+        if found:
+            return cached
+
+        result, api_errors = await self._query_endpoints(
+            lambda endpoint: self._query_api_by_code(endpoint, code, search_type),
+            bool
+        )
+
+        if result or api_errors == 0:
+            await self.cache.set(cache_key, result)
+        return result
+
+    async def _single_flight(self, key: str,
+                             lookup: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Объединить одновременные поиски одного ключа в один запрос"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.lookup_stats['coalesced'] += 1
+        else:
+            self.lookup_stats['lookups'] += 1
+            future = asyncio.ensure_future(lookup())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # shield: отмена одного ожидающего не отменяет поиск для остальных
+        return await asyncio.shield(future)
+
+    async def _query_endpoints(self, query: Callable[[Dict], Awaitable[Optional[Dict[str, Any]]]],
+                               accept: Callable[[Optional[Dict[str, Any]]], bool]
+                               ) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Параллельный запрос ко всем API: (первый подходящий ответ, число ошибок).
+
+        Остальные запросы отменяются, как только найден ответ, поэтому время
+        поиска - время самого быстрого источника, а не сумма таймаутов.
+        """
+        # API с разомкнутой цепью пропускаем сразу - без ожидания таймаута
+        available = [endpoint for endpoint in self.api_endpoints if endpoint['breaker'].allow()]
+        api_errors = len(self.api_endpoints) - len(available)
+
+        tasks = {
+            asyncio.ensure_future(self._call_endpoint(endpoint, query)): endpoint
+            for endpoint in available
+        }
+        pending = set(tasks)
         try:
-            if endpoint['name'] == 'OurAirports':
-                return await self._download_and_search_ourairports_by_code(code, code_type)
-
-            url = f"{endpoint['url']}?{code_type}={code}"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    if 'json' in response.headers.get('Content-Type', ''):
-                        data = await response.json()
-                    else:
-                        data = await response.text()
-
-                    return endpoint['parser'](data, code)
-        except Exception as e:
-            print(f"Ошибка запроса к {endpoint['name']}: {e}")
-            return None
-
-    async def _download_and_search_ourairports(self, query: str) -> Optional[Dict[str, Any]]:
-        """Скачивание и поиск в OurAirports CSV"""
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        api_errors += 1
+                        print(f"Ошибка API {tasks[task]['name']}: {e}")
+                        continue
+                    if accept(result):
+                        return result, api_errors
+            return None, api_errors
+        finally:
+            for task in pending:
+                task.cancel()
+                self.lookup_stats['cancelled'] += 1
+
+    async def _call_endpoint(self, endpoint: Dict,
+                             query: Callable[[Dict], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Запрос к одному API с учетом задержки и ошибок в предохранителе"""
+        breaker = endpoint['breaker']
+        started = time.monotonic()
         try:
-            url = "https://davidmegginson.github.io/ourairports-data/airports.csv"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    csv_data = await response.text()
-
-                    # Ищем в CSV по названию
-                    query_lower = query.lower()
-                    for line in csv_data.split('\n')[1:]:  # Пропускаем заголовок
-                        if not line:
-                            continue
-
-                        parts = line.split(',')
-                        if len(parts) >= 3:
-                            name = parts[3].strip('"').lower()
-                            if query_lower in name:
-                                iata = parts[1].strip('"') if parts[1].strip('"') != '""' else None
-                                icao = parts[2].strip('"') if parts[2].strip('"') != '""' else None
-
-                                if iata and icao:
-                                    return {
-                                        'name': parts[3].strip('"'),
-                                        'city': parts[10].strip('"') if len(parts) > 10 else '',
-                                        'country': parts[8].strip('"') if len(parts) > 8 else '',
-                                        'iata': iata,
-                                        'icao': icao,
-                                        'latitude': parts[4].strip('"') if len(parts) > 4 else '',
-                                        'longitude': parts[5].strip('"') if len(parts) > 5 else ''
-                                    }
-        except Exception as e:
-            print(f"Ошибка поиска в OurAirports: {e}")
+            result = await query(endpoint)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure((time.monotonic() - started) * 1000)
+            raise
+        breaker.record_success((time.monotonic() - started) * 1000)
+        return result
+
+    def api_health(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние предохранителей и метрики задержек по каждому API"""
+        return {endpoint['name']: endpoint['breaker'].snapshot() for endpoint in self.api_endpoints}
 
+    async def _query_api(self, endpoint: Dict, query: str) -> Optional[Dict[str, Any]]:
+        """Запрос к API (ошибки сети пробрасываются - их не кэшируем)"""
+        url = f"{endpoint['url']}{query}"
+        async with self.session.get(url) as response:
+            if response.status >= 500:
+                response.raise_for_status()
+            if response.status == 200:
+                if 'json' in response.headers.get('Content-Type', ''):
+                    data = await response.json()
+                else:
+                    data = await response.text()
+
+                return endpoint['parser'](data, query)
         return None
 
-    async def _download_and_search_ourairports_by_code(self, code: str, code_type: str) -> Optional[Dict[str, Any]]:
-        """Поиск в OurAirports по коду"""
-        try:
-            url = "https://davidmegginson.github.io/ourairports-data/airports.csv"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    csv_data = await response.text()
-
-                    for line in csv_data.split('\n')[1:]:
-                        if not line:
-                            continue
-
-                        parts = line.split(',')
-                        if len(parts) >= 3:
-                            if code_type == 'iata':
-                                field_index = 1
-                            else:  # icao
-                                field_index = 2
-
-                            field_value = parts[field_index].strip('"')
-                            if field_value == code:
-                                iata = parts[1].strip('"') if parts[1].strip('"') != '""' else None
-                                icao = parts[2].strip('"') if parts[2].strip('"') != '""' else None
-
-                                return {
-                                    'name': parts[3].strip('"'),
-                                    'city': parts[10].strip('"') if len(parts) > 10 else '',
-                                    'country': parts[8].strip('"') if len(parts) > 8 else '',
-                                    'iata': iata,
-                                    'icao': icao,
-                                    'latitude': parts[4].strip('"') if len(parts) > 4 else '',
-                                    'longitude': parts[5].strip('"') if len(parts) > 5 else ''
-                                }
-        except Exception as e:
-            print(f"Ошибка поиска кода в OurAirports: {e}")
-
+    async def _query_api_by_code(self, endpoint: Dict, code: str, code_type: str) -> Optional[Dict[str, Any]]:
+        """Запрос к API по коду (ошибки сети пробрасываются - их не кэшируем)"""
+        url = f"{endpoint['url']}?{code_type}={code}"
+        async with self.session.get(url) as response:
+            if response.status >= 500:
+                response.raise_for_status()
+            if response.status == 200:
+                if 'json' in response.headers.get('Content-Type', ''):
+                    data = await response.json()
+                else:
+                    data = await response.text()
+
+                return endpoint['parser'](data, code)
         return None
 
     def _parse_aviationapi(self, data: Any, query: str) -> Optional[Dict[str, Any]]:
@@ -272,10 +341,6 @@ class AirportService:
 
         return None
 
-    def _parse_ourairports(self, data: Any, query: str) -> Optional[Dict[str, Any]]:
-        """Парсинг OurAirports (уже обработан ранее)"""
-        return None
-
     async def _extract_from_text(self, text: str) -> Optional[Dict[str, Any]]:
         """Извлечение кодов из текста (резервный метод)"""
         # Ищем IATA код (3 заглавные буквы)
@@ -293,6 +358,31 @@ class AirportService:
 
         return None
 
+    async def find_nearby(self, query: str, radius_km: Optional[float] = None,
+                          limit: int = 10) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(исходный аэропорт, соседние аэропорты с distance_km).
+
+        Без радиуса - limit ближайших, с радиусом - ближайшие в его пределах.
+        """
+        query = query.strip()
+        if len(query) in (3, 4) and query.isalpha():
+            origin = await self.search_airport_by_code(query)
+        else:
+            origin = await self.search_airport_by_name(query)
+
+        point = airport_coordinates(origin)
+        if not point:
+            return origin, []
+
+        # +1: сам исходный аэропорт тоже попадет в выборку
+        if radius_km:
+            nearby = self.airport_db.within_radius(*point, radius_km, limit + 1)
+        else:
+            nearby = self.airport_db.nearest(*point, limit + 1)
+
+        nearby = [airport for airport in nearby if airport['iata'] != origin.get('iata')]
+        return origin, nearby[:limit]
+
     def generate_flight_number(self, airline_iata: str, route_number: str) -> str:
         """Генерация номера рейса в формате IATA123"""
         # Убираем пробелы и приводим к верхнему регистру
@@ -308,9 +398,12 @@ class AirportService:
 
     async def get_airport_suggestions(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Получение подсказок для автодополнения"""
+        if self.airport_db.loaded:
+            return self.airport_db.search(query, limit)
+
         suggestions = []
 
-        # Для простоты, можно использовать известные аэропорты
+        # Пока база не загружена - только известные аэропорты
         known_airports = [
             {"name": "Шереметьево", "city": "Москва", "iata": "SVO", "icao": "UUEE"},
             {"name": "Домодедово", "city": "Москва", "iata": "DME", "icao": "UUDD"},
@@ -334,4 +427,12 @@ class AirportService:
             if len(suggestions) >= limit:
                 break
 
-        return suggestions
\ No newline at end of file
+        return suggestions
+
+    async def suggestion_hint(self, query: str, limit: int = 3) -> str:
+        """Строка "Возможно, вы имели в виду ..." для сообщений об ошибке"""
+        suggestions = await self.get_airport_suggestions(query, limit)
+        if not suggestions:
+            return ""
+        options = ", ".join(f"{airport['name']} ({airport['iata']})" for airport in suggestions)
+        return f"\n💡 Возможно, вы имели в виду: {options}"
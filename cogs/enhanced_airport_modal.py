@@ -3,6 +3,7 @@ import discord
 from discord.ui import Modal, TextInput, Select
 from typing import Optional
 import asyncio
+from datetime import datetime
 
 class EnhancedAirportModal(Modal, title="🏢 Добавить аэропорт (автоматически)"):
     def __init__(self, airline_id: str, airport_service):
@@ -61,9 +62,8 @@ class EnhancedAirportModal(Modal, title="🏢 Добавить аэропорт
             return
 
         # Сохраняем аэропорт в базу
-        db = interaction.client.data.db
-        airline_ref = db.collection('airlines').document(self.airline_id)
-        airline = airline_ref.get()
+        db_handler = interaction.client.data
+        airline = await db_handler.get_document('airlines', self.airline_id)
 
         if airline.exists:
             current_data = airline.to_dict()
@@ -89,7 +89,7 @@ class EnhancedAirportModal(Modal, title="🏢 Добавить аэропорт
                 'added_at': datetime.now().isoformat()
             })
 
-            airline_ref.update({'airports': airports})
+            await db_handler.update_document('airlines', self.airline_id, {'airports': airports})
 
             await interaction.response.send_message(
                 f"✅ Аэропорт **{self.found_airport['name']}** добавлен!\n"
@@ -4,6 +4,8 @@ from discord.ui import Modal, TextInput, Select, View, Button
 from datetime import datetime
 import asyncio
 
+from utils.route_geometry import estimate_route
+
 class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут"):
     def __init__(self, airline_id: str, airline_data: dict, airport_service):
         super().__init__()
@@ -41,9 +43,8 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
 
         self.flight_time = TextInput(
             label="Время полета (минуты)",
-            placeholder="Например: 120",
-            required=True,
-            default="120"
+            placeholder="Пусто - рассчитать по координатам аэропортов",
+            required=False
         )
 
         self.aircraft = TextInput(
@@ -67,9 +68,11 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         try:
-            # 1. Определяем коды аэропортов
-            self.departure_info = await self.airport_service.search_airport_by_name(self.departure_airport.value)
-            self.arrival_info = await self.airport_service.search_airport_by_name(self.arrival_airport.value)
+            # 1. Определяем коды аэропортов (оба аэропорта одновременно)
+            self.departure_info, self.arrival_info = await asyncio.gather(
+                self.airport_service.search_airport_by_name(self.departure_airport.value),
+                self.airport_service.search_airport_by_name(self.arrival_airport.value)
+            )
 
             if not self.departure_info or not self.arrival_info:
                 missing = []
@@ -95,10 +98,31 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
             # 3. Создаем код маршрута в формате IATA-IATA
             route_code = f"{self.departure_info['iata']}-{self.arrival_info['iata']}"
 
+            # Время полета: введенное или рассчитанное по расстоянию
+            estimate = estimate_route(self.departure_info, self.arrival_info)
+            if self.flight_time.value.strip():
+                try:
+                    flight_time = int(self.flight_time.value)
+                    if flight_time <= 0:
+                        raise ValueError
+                except ValueError:
+                    await interaction.followup.send(
+                        "❌ Время полета должно быть положительным числом!",
+                        ephemeral=True
+                    )
+                    return
+            elif estimate:
+                flight_time = estimate[1]
+            else:
+                await interaction.followup.send(
+                    "❌ Не удалось рассчитать время полета - нет координат аэропортов. Укажите его вручную.",
+                    ephemeral=True
+                )
+                return
+
             # 4. Сохраняем маршрут в базу
-            db = interaction.client.data.db
-            airline_ref = db.collection('airlines').document(self.airline_id)
-            airline = airline_ref.get()
+            db_handler = interaction.client.data
+            airline = await db_handler.get_document('airlines', self.airline_id)
 
             if airline.exists:
                 current_data = airline.to_dict()
@@ -131,13 +155,14 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
                     'arrival_country': self.arrival_info.get('country', ''),
                     'arrival_game_link': '',  # Можно добавить позже
                     'aircraft': self.aircraft.value,
-                    'flight_time': int(self.flight_time.value),
+                    'flight_time': flight_time,
+                    'distance_km': round(estimate[0]) if estimate else None,
                     'created_at': datetime.now().isoformat(),
                     'active': True
                 }
 
                 routes.append(new_route)
-                airline_ref.update({'routes': routes})
+                await db_handler.update_document('airlines', self.airline_id, {'routes': routes})
 
                 # 5. Отправляем результат
                 embed = discord.Embed(
@@ -167,7 +192,7 @@ class EnhancedRouteModal(Modal, title="🛣️ Добавить маршрут")
 
                 embed.add_field(
                     name="⏱️ Время полета",
-                    value=f"{self.flight_time.value} минут",
+                    value=f"{flight_time} минут",
                     inline=True
                 )
 
@@ -4,12 +4,23 @@ from firebase_admin import firestore
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
+from google.api_core.exceptions import FailedPrecondition
 from discord.ui import Button, View, Modal, TextInput, Select
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 import asyncio
 import pytz
 import re
+from utils.flight_scheduler import FlightStatusScheduler
+from utils.reminder_queue import REMINDER_OFFSETS
+from utils.route_geometry import estimate_route
+from utils.query_pager import QueryPager
+from utils.flight_search import AirlineFlightSearch
+from utils.departure_board import DepartureBoards
+
+# Запрос требует составного индекса, которого нет в проекте Firestore
+MISSING_INDEX_TEXT = ("Для этого запроса в базе не создан индекс. Администратору: "
+                      "разверните firestore.indexes.json (`firebase deploy --only firestore:indexes`).")
 
 class FlightStyles:
     """Стили для оформления рейсов"""
@@ -57,7 +68,7 @@ class EnhancedFlightCreationView(View):
         self.airline_data = airline_data
         self.bot = bot
         self.db = bot.data.db
-        self.db_handler = bot.data # Предполагаем, что bot.data это DatabaseHandler
+        self.db_handler = bot.data  # BotData наследует DatabaseHandler
 
         # Получаем сервис аэропортов из кога Airlines
         self.airport_service = None
@@ -452,13 +463,20 @@ class EnhancedFlightCreationView(View):
                 )
                 return
 
-            # Ищем коды
-            departure_info = await self.airport_service.search_airport_by_name(departure_value)
-            arrival_info = await self.airport_service.search_airport_by_name(arrival_value)
+            # Ищем коды (оба аэропорта одновременно)
+            departure_info, arrival_info = await asyncio.gather(
+                self.airport_service.search_airport_by_name(departure_value),
+                self.airport_service.search_airport_by_name(arrival_value)
+            )
 
             if not departure_info or not arrival_info:
+                hint = ""
+                if not departure_info:
+                    hint += await self.airport_service.suggestion_hint(departure_value)
+                if not arrival_info:
+                    hint += await self.airport_service.suggestion_hint(arrival_value)
                 await interaction.followup.send(
-                    "❌ Не удалось определить коды аэропортов. Проверьте названия.",
+                    "❌ Не удалось определить коды аэропортов. Проверьте названия." + hint,
                     ephemeral=True
                 )
                 return
@@ -570,6 +588,63 @@ class EnhancedFlightCreationView(View):
         )
         await interaction.followup.send(embed=success_embed if 'success_embed' in locals() else embed, ephemeral=True)
 
+    async def _resolve_custom_route(self) -> Dict[str, str]:
+        """Аэропорты и ВС авто/ручного режима из полей ввода (для предпросмотра и создания)"""
+        route = {
+            'departure_code': "???",
+            'arrival_code': "???",
+            'departure_airport': "Неизвестно",
+            'arrival_airport': "Неизвестно",
+            'departure_icao': "",
+            'arrival_icao': "",
+            'aircraft': "Неизвестно",
+            'departure_name': "",
+            'arrival_name': ""
+        }
+
+        # Пытаемся получить данные из полей
+        for child in self.children:
+            if isinstance(child, TextInput):
+                label = child.label.lower()
+                if 'вылета' in label and 'код' in label:
+                    route['departure_code'] = child.value.upper()
+                elif 'прилета' in label and 'код' in label:
+                    route['arrival_code'] = child.value.upper()
+                elif 'вылета' in label and 'название' in label:
+                    route['departure_airport'] = child.value
+                elif 'прилета' in label and 'название' in label:
+                    route['arrival_airport'] = child.value
+                elif 'судно' in label:
+                    route['aircraft'] = child.value
+
+                if 'вылета' in label and 'код' not in label:
+                    route['departure_name'] = child.value
+                elif 'прилета' in label and 'код' not in label:
+                    route['arrival_name'] = child.value
+
+        # Если в авто режиме, пытаемся определить коды через сервис
+        if self.airport_service and (route['departure_code'] == '???' or route['arrival_code'] == '???'):
+            for side in ('departure', 'arrival'):
+                name = route[f'{side}_name']
+                if not name:
+                    continue
+                info = await self.airport_service.search_airport_by_name(name)
+                if info:
+                    route[f'{side}_code'] = info['iata']
+                    route[f'{side}_icao'] = info.get('icao', '')
+                    route[f'{side}_airport'] = info.get('name', name)
+
+        return route
+
+    def _estimate_flight_time(self, departure_code: str, arrival_code: str, default: int = 120) -> int:
+        """Время рейса по координатам аэропортов из локальной базы"""
+        airport_db = getattr(self.airport_service, 'airport_db', None)
+        if airport_db is not None:
+            estimate = estimate_route(airport_db.get_by_code(departure_code), airport_db.get_by_code(arrival_code))
+            if estimate:
+                return estimate[1]
+        return default
+
     async def preview_flight(self, interaction: discord.Interaction):
         """Предпросмотр рейса"""
         if not all([self.selected_date, self.selected_time, self.selected_profile]):
@@ -609,14 +684,15 @@ class EnhancedFlightCreationView(View):
                 flight_time = route.get('flight_time', 120)
                 aircraft = route.get('aircraft', 'Неизвестно')
             else:
-                # Авто/ручной режим
+                # Авто/ручной режим - те же аэропорты и время рейса, что и при создании
                 flight_number = self.custom_flight_number or "N/A"
-                departure_code = "???"
-                arrival_code = "???"
-                departure_name = "Неизвестно"
-                arrival_name = "Неизвестно"
-                flight_time = 120
-                aircraft = "Неизвестно"
+                custom_route = await self._resolve_custom_route()
+                departure_code = custom_route['departure_code']
+                arrival_code = custom_route['arrival_code']
+                departure_name = custom_route['departure_airport']
+                arrival_name = custom_route['arrival_airport']
+                flight_time = self._estimate_flight_time(departure_code, arrival_code, 120)
+                aircraft = custom_route['aircraft']
 
             # Рассчитываем времена
             checkin_open = departure_datetime - timedelta(minutes=profile.get('checkin_open', 55))
@@ -757,56 +833,39 @@ class EnhancedFlightCreationView(View):
 
                 flight_number = self.custom_flight_number
 
-                # Получаем данные из полей ввода
-                departure_code = "???"
-                arrival_code = "???"
-                departure_airport = "Неизвестно"
-                arrival_airport = "Неизвестно"
-                departure_icao = ""
-                arrival_icao = ""
-                aircraft = "Неизвестно"
+                # Данные из полей ввода (в авто режиме коды определяет сервис)
+                custom_route = await self._resolve_custom_route()
+                departure_code = custom_route['departure_code']
+                arrival_code = custom_route['arrival_code']
+                departure_airport = custom_route['departure_airport']
+                arrival_airport = custom_route['arrival_airport']
+                departure_icao = custom_route['departure_icao']
+                arrival_icao = custom_route['arrival_icao']
+                aircraft = custom_route['aircraft']
+                departure_name = custom_route['departure_name']
+                arrival_name = custom_route['arrival_name']
                 flight_time = 120
 
-                # Пытаемся получить данные из полей
-                for child in self.children:
-                    if isinstance(child, TextInput):
-                        if 'вылета' in child.label.lower() and 'код' in child.label.lower():
-                            departure_code = child.value.upper()
-                        elif 'прилета' in child.label.lower() and 'код' in child.label.lower():
-                            arrival_code = child.value.upper()
-                        elif 'вылета' in child.label.lower() and 'название' in child.label.lower():
-                            departure_airport = child.value
-                        elif 'прилета' in child.label.lower() and 'название' in child.label.lower():
-                            arrival_airport = child.value
-                        elif 'судно' in child.label.lower():
-                            aircraft = child.value
-
-                # Если в авто режиме, пытаемся определить коды через сервис
-                if self.airport_service and (departure_code == '???' or arrival_code == '???'):
-                    # Ищем названия аэропортов
-                    departure_name = ""
-                    arrival_name = ""
-
-                    for child in self.children:
-                        if isinstance(child, TextInput):
-                            if 'вылета' in child.label.lower() and 'код' not in child.label.lower():
-                                departure_name = child.value
-                            elif 'прилета' in child.label.lower() and 'код' not in child.label.lower():
-                                arrival_name = child.value
-
-                    if departure_name:
-                        dep_info = await self.airport_service.search_airport_by_name(departure_name)
-                        if dep_info:
-                            departure_code = dep_info['iata']
-                            departure_icao = dep_info.get('icao', '')
-                            departure_airport = dep_info.get('name', departure_name)
-
-                    if arrival_name:
-                        arr_info = await self.airport_service.search_airport_by_name(arrival_name)
-                        if arr_info:
-                            arrival_code = arr_info['iata']
-                            arrival_icao = arr_info.get('icao', '')
-                            arrival_airport = arr_info.get('name', arrival_name)
+                if self.airport_service:
+                    # Неоднозначное название - не выбираем аэропорт за пользователя
+                    if departure_code == '???' or arrival_code == '???':
+                        hint = ""
+                        if departure_code == '???' and departure_name:
+                            hint += await self.airport_service.suggestion_hint(departure_name)
+                        if arrival_code == '???' and arrival_name:
+                            hint += await self.airport_service.suggestion_hint(arrival_name)
+                        await interaction.followup.send(
+                            embed=FlightCard.create_embed(
+                                "Аэропорт не определен",
+                                f"Уточните аэропорт или укажите его код.{hint}",
+                                FlightStyles.COLORS['error']
+                            ),
+                            ephemeral=True
+                        )
+                        return
+
+                # Время рейса - по расстоянию между аэропортами
+                flight_time = self._estimate_flight_time(departure_code, arrival_code, flight_time)
 
                 route_name = f"{departure_airport} - {arrival_airport}"
                 departure_game_link = ""
@@ -850,8 +909,6 @@ class EnhancedFlightCreationView(View):
             arrival_time = departure_datetime + timedelta(minutes=flight_time)
 
             # Создаем рейс в базе данных
-            flight_ref = self.db.collection('flights')
-
             flight_data = {
                 'airline_id': self.airline_id,
                 'airline_name': self.airline_data['name'],
@@ -884,12 +941,10 @@ class EnhancedFlightCreationView(View):
                 'subscriptions': 0,
             }
 
-            flight_doc = flight_ref.add(flight_data)
-            flight_id = flight_doc[1].id
+            flight_id = await self.db_handler.create_flight(flight_data)
 
             # Обновляем статистику авиакомпании
-            airline_ref = self.db.collection('airlines').document(self.airline_id)
-            airline_ref.update({
+            await self.db_handler.update_document('airlines', self.airline_id, {
                 'statistics.flights_created': firestore.Increment(1)
             })
 
@@ -931,7 +986,7 @@ class EnhancedFlightCreationView(View):
 
                 @discord.ui.button(label="👁️ Просмотр", style=discord.ButtonStyle.primary, row=0)
                 async def view_button(self, interaction: discord.Interaction, button: Button):
-                    flight_doc = self.bot.data.db.collection('flights').document(self.flight_id).get()
+                    flight_doc = await self.bot.data.get_document('flights', self.flight_id)
                     if flight_doc.exists:
                         flight_data = flight_doc.to_dict()
 
@@ -980,166 +1035,18 @@ class EnhancedFlightCreationView(View):
         return bool(re.match(pattern, flight_number.upper()))
 
     async def publish_to_partners(self, interaction: discord.Interaction, flight_data: dict, flight_id: str):
-        """Публикация рейса у партнеров"""
-        try:
-            db = self.db
-            partners_ref = db.collection('partners')
-            partners = partners_ref.where('status', '==', 'active').get()
+        """Публикация рейса у партнеров: рейс попадает на живые табло вылетов в их каналах.
 
+        Табло сами подхватывают новый рейс из реплики и засчитывают его
+        партнеру при правке сообщения - здесь только подключаются новые партнеры.
+        """
+        try:
             published_count = 0
 
-            # Создаем красивое сообщение для партнеров
-            partner_embed = discord.Embed(
-                title=f"✈️ Новый рейс: {flight_data['flight_number']}",
-                description=f"**{flight_data['airline_name']}** объявляет новый рейс!",
-                color=discord.Color.green(),
-                timestamp=datetime.now()
-            )
-
-            # Основная информация
-            partner_embed.add_field(
-                name="Маршрут",
-                value=f"**{flight_data['departure_airport']}** ({flight_data['departure_code']}) → **{flight_data['arrival_airport']}** ({flight_data['arrival_code']})",
-                inline=False
-            )
-
-            partner_embed.add_field(
-                name="Расписание",
-                value=f"**📅 Дата:** {flight_data['departure_date']}\n**🕐 Вылет:** {flight_data['departure_time']}\n**🛬 Прилет:** {flight_data['arrival_time']}",
-                inline=True
-            )
-
-            partner_embed.add_field(
-                name="Детали",
-                value=f"**✈️ Рейс:** {flight_data['flight_number']}\n**🛩️ ВС:** {flight_data['aircraft']}\n**⏱️ В пути:** {flight_data['flight_time']} мин",
-                inline=True
-            )
-
-            # Тайминги
-            partner_embed.add_field(
-                name="⏰ Тайминги",
-                value=f"**📋 Регистрация:** {flight_data['checkin_open']} - {flight_data['checkin_close']}\n**🎮 Сервер:** {flight_data['server_open']} - {flight_data['server_close']}",
-                inline=False
-            )
-
-            # Создаем View для пассажиров
-            class PassengerActions(View):
-                def __init__(self, flight_id: str, bot):
-                    super().__init__(timeout=None)
-                    self.flight_id = flight_id
-                    self.bot = bot
-
-                @discord.ui.button(label="🔔 Подписаться", style=discord.ButtonStyle.success, emoji="🔔", row=0)
-                async def subscribe_button(self, interaction: discord.Interaction, button: Button):
-                    if interaction.is_expired(): return
-                    try: await interaction.response.defer(ephemeral=True)
-                    except: return
-                    await self.handle_subscription(interaction)
-
-                @discord.ui.button(label="ℹ️ Информация", style=discord.ButtonStyle.secondary, emoji="ℹ️", row=0)
-                async def info_button(self, interaction: discord.Interaction, button: Button):
-                    if interaction.is_expired(): return
-                    try: await interaction.response.defer(ephemeral=True)
-                    except: return
-                    await self.show_info(interaction)
-
-                async def handle_subscription(self, interaction: discord.Interaction):
-                    subscriptions_ref = self.bot.data.db.collection('subscriptions')
-
-                    # Проверяем, есть ли уже подписка
-                    query = subscriptions_ref.where(
-                        'user_id', '==', str(interaction.user.id)
-                    ).where(
-                        'flight_id', '==', self.flight_id
-                    ).limit(1)
-                    existing = query.get()
-
-                    if len(existing) > 0:
-                        embed = discord.Embed(
-                            title="ℹ️ Уже подписаны",
-                            description="Вы уже подписаны на уведомления об этом рейсе.",
-                            color=discord.Color.blue()
-                        )
-                        await interaction.followup.send(embed=embed, ephemeral=True)
-                        return
-
-                    # Создаем подписку
-                    subscription_data = {
-                        'user_id': str(interaction.user.id),
-                        'username': str(interaction.user),
-                        'flight_id': self.flight_id,
-                        'created_at': datetime.now().isoformat(),
-                        'notifications': ['24h', '6h', '1h', '30min', 'server_open'],
-                        'notifications_sent': []
-                    }
-
-                    self.bot.data.db.collection('subscriptions').add(subscription_data)
-
-                    # Обновляем счетчик подписок
-                    flight_ref = self.bot.data.db.collection('flights').document(self.flight_id)
-                    flight_ref.update({
-                        'subscriptions': firestore.Increment(1)
-                    })
-
-                    # Отправляем подтверждение
-                    success_embed = discord.Embed(
-                        title="✅ Подписка активирована",
-                        description="Вы успешно подписались на уведомления о рейсе!",
-                        color=discord.Color.green()
-                    )
-
-                    await interaction.followup.send(embed=success_embed, ephemeral=True)
-
-                async def show_info(self, interaction: discord.Interaction):
-                    flight_doc = self.bot.data.db.collection('flights').document(self.flight_id).get()
-                    if flight_doc.exists:
-                        flight_data = flight_doc.to_dict()
-
-                        embed = discord.Embed(
-                            title=f"ℹ️ Информация о рейсе {flight_data['flight_number']}",
-                            description=f"**{flight_data['airline_name']}**",
-                            color=discord.Color.blue()
-                        )
-
-                        embed.add_field(
-                            name="Маршрут",
-                            value=f"{flight_data['departure_airport']} → {flight_data['arrival_airport']}",
-                            inline=False
-                        )
-
-                        embed.add_field(
-                            name="Расписание",
-                            value=f"Дата: {flight_data['departure_date']}\nВылет: {flight_data['departure_time']}\nПрилет: {flight_data['arrival_time']}",
-                            inline=True
-                        )
-
-                        await interaction.followup.send(embed=embed, ephemeral=True)
-
-            passenger_view = PassengerActions(flight_id, self.bot)
-
-            # Публикуем у каждого партнера
-            for partner in partners:
-                partner_data = partner.to_dict()
-                channel_id = partner_data.get('channel_id')
-
-                if channel_id:
-                    try:
-                        channel = interaction.guild.get_channel(int(channel_id))
-                        if channel and isinstance(channel, discord.TextChannel):
-                            # Отправляем сообщение партнеру
-                            await channel.send(embed=partner_embed, view=passenger_view)
-
-                            # Обновляем статистику партнера
-                            partner_ref = partners_ref.document(partner.id)
-                            partner_ref.update({
-                                'published_flights': firestore.Increment(1),
-                                'last_published': datetime.now().isoformat()
-                            })
-
-                            published_count += 1
-
-                    except Exception as e:
-                        print(f"Ошибка публикации у партнера {channel_id}: {e}")
+            flights_cog = self.bot.get_cog('Flights')
+            if flights_cog:
+                await flights_cog.departure_boards.sync_partners()
+                published_count = flights_cog.departure_boards.board_count()
 
             # Логируем публикацию
             audit_channel_id = self.bot.CHANNEL_IDS.get("AUDIT_CHANNEL")
@@ -1170,8 +1077,26 @@ class Flights(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.flight_status_updater.start()
-        self.notification_sender.start()
+        self.status_scheduler = FlightStatusScheduler(bot.data)
+        self.departure_boards = DepartureBoards(bot)
+        self._boards_task = None
+
+    async def cog_load(self):
+        # Статусы рейсов и напоминания срабатывают по таймеру, а не опросом коллекций
+        self.status_scheduler.start()
+        # Табло вылетов у партнеров подключаются после входа бота
+        self._boards_task = asyncio.ensure_future(self.departure_boards.start())
+        try:
+            await self.bot.data.reminders.start(self.send_reminder)
+        except Exception as e:
+            print(f"Ошибка запуска очереди напоминаний: {e}")
+
+    async def cog_unload(self):
+        self.status_scheduler.stop()
+        if self._boards_task:
+            self._boards_task.cancel()
+        self.departure_boards.stop()
+        self.bot.data.reminders.stop()
 
     @app_commands.command(name="рейс", description="Создать новый рейс")
     async def create_flight_command(self, interaction: discord.Interaction):
@@ -1179,38 +1104,21 @@ class Flights(commands.Cog):
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=True, thinking=True)
 
-        db = self.bot.data.db
-
-        # Получаем авиакомпанию пользователя
-        airlines_ref = db.collection('airlines')
-        query = airlines_ref.where('owner_id', '==', str(interaction.user.id)).limit(1)
-        results = query.get()
+        db_handler = self.bot.data
 
-        if len(results) == 0:
-            # Проверяем как сотрудник
-            user_airlines = []
-            all_airlines = airlines_ref.stream()
+        # Получаем авиакомпанию пользователя (владелец или сотрудник)
+        airline_data = await db_handler.get_airline_by_member(str(interaction.user.id))
 
-            for airline in all_airlines:
-                airline_data = airline.to_dict()
-                employees = airline_data.get('employees', [])
-
-                if any(emp.get('user_id') == str(interaction.user.id) for emp in employees):
-                    user_airlines.append((airline.id, airline_data))
-
-            if not user_airlines:
-                error_embed = FlightCard.create_embed(
-                    "Доступ запрещен",
-                    "У вас нет доступа к управлению авиакомпаниями.",
-                    FlightStyles.COLORS['error']
-                )
-                await interaction.followup.send(embed=error_embed, ephemeral=True)
-                return
+        if not airline_data:
+            error_embed = FlightCard.create_embed(
+                "Доступ запрещен",
+                "У вас нет доступа к управлению авиакомпаниями.",
+                FlightStyles.COLORS['error']
+            )
+            await interaction.followup.send(embed=error_embed, ephemeral=True)
+            return
 
-            airline_id, airline_data = user_airlines[0]
-        else:
-            airline_data = results[0].to_dict()
-            airline_id = results[0].id
+        airline_id = airline_data['id']
 
         # Проверяем наличие маршрутов
         routes = airline_data.get('routes', [])
@@ -1227,7 +1135,7 @@ class Flights(commands.Cog):
                 }
             ]
 
-            airlines_ref.document(airline_id).update({
+            await db_handler.update_document('airlines', airline_id, {
                 'timing_profiles': timing_profiles,
                 'default_timing_profile': 'Стандартный'
             })
@@ -1277,45 +1185,27 @@ class Flights(commands.Cog):
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=True, thinking=True)
 
-        db = self.bot.data.db
-
-        # Получаем авиакомпанию пользователя
-        airlines_ref = db.collection('airlines')
-        query = airlines_ref.where('owner_id', '==', str(interaction.user.id)).limit(1)
-        results = query.get()
+        db_handler = self.bot.data
 
-        if len(results) == 0:
-            # Проверяем как сотрудник
-            user_airlines = []
-            all_airlines = airlines_ref.stream()
+        # Получаем авиакомпанию пользователя (владелец или сотрудник)
+        airline_data = await db_handler.get_airline_by_member(str(interaction.user.id))
 
-            for airline in all_airlines:
-                airline_data = airline.to_dict()
-                employees = airline_data.get('employees', [])
-
-                if any(emp.get('user_id') == str(interaction.user.id) for emp in employees):
-                    user_airlines.append((airline.id, airline_data))
-
-            if not user_airlines:
-                error_embed = FlightCard.create_embed(
-                    "Доступ запрещен",
-                    "У вас нет доступа к управлению авиакомпаниями.",
-                    FlightStyles.COLORS['error']
-                )
-                await interaction.followup.send(embed=error_embed, ephemeral=True)
-                return
+        if not airline_data:
+            error_embed = FlightCard.create_embed(
+                "Доступ запрещен",
+                "У вас нет доступа к управлению авиакомпаниями.",
+                FlightStyles.COLORS['error']
+            )
+            await interaction.followup.send(embed=error_embed, ephemeral=True)
+            return
 
-            airline_id, airline_data = user_airlines[0]
-        else:
-            airline_data = results[0].to_dict()
-            airline_id = results[0].id
+        airline_id = airline_data['id']
 
-        # Получаем рейсы авиакомпании
-        flights_ref = db.collection('flights')
-        flights_query = flights_ref.where('airline_id', '==', airline_id)
-        flights = flights_query.get()
+        # Сводка - из предрасчитанной статистики, без чтения всех рейсов
+        stats = await db_handler.get_airline_stats(airline_id)
+        total_flights = stats.get('total_flights', 0)
 
-        if len(flights) == 0:
+        if total_flights == 0:
             embed = FlightCard.create_embed(
                 "Рейсы не найдены",
                 "У вашей авиакомпании пока нет созданных рейсов.",
@@ -1324,52 +1214,32 @@ class Flights(commands.Cog):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        # Сортируем рейсы по дате вылета
-        flights_list = []
-        for flight in flights:
-            flight_data = flight.to_dict()
-            flights_list.append({
-                'id': flight.id,
-                'data': flight_data
-            })
-
-        flights_list.sort(key=lambda x: x['data'].get('departure_datetime', ''))
-
         # Создаем Embed со списком рейсов
         embed = FlightCard.create_embed(
             f"Рейсы {airline_data['name']}",
-            f"Всего рейсов: **{len(flights_list)}**",
+            f"Всего рейсов: **{total_flights}**",
             FlightStyles.COLORS['info']
         )
 
-        # Группируем рейсы по статусу
-        status_groups = {}
-        for flight in flights_list:
-            status = flight['data'].get('status', 'scheduled')
-            if status not in status_groups:
-                status_groups[status] = []
-            status_groups[status].append(flight)
-
-        # Показываем ближайшие рейсы
-        today = datetime.now().date()
-        upcoming_flights = []
-
-        for flight in flights_list:
-            flight_data = flight['data']
-            departure_str = flight_data.get('departure_datetime')
-            if departure_str:
-                try:
-                    departure_time = datetime.fromisoformat(departure_str.replace('Z', '+00:00'))
-                    if departure_time.date() >= today:
-                        upcoming_flights.append(flight)
-                except:
-                    pass
-
-        # Ближайшие рейсы
-        if upcoming_flights[:5]:
+        # Ближайшие рейсы - один запрос на 5 документов
+        airline_flights = db_handler.collection('flights').where('airline_id', '==', airline_id)
+        upcoming_query = airline_flights.where(
+            'departure_datetime', '>=', datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+        ).order_by('departure_datetime').limit(5)
+        try:
+            upcoming_flights = await db_handler.fetch(upcoming_query)
+        except FailedPrecondition as e:
+            print(f"Ошибка запроса рейсов авиакомпании (нет индекса): {e}")
+            await interaction.followup.send(
+                embed=FlightCard.create_embed("Рейсы недоступны", MISSING_INDEX_TEXT, FlightStyles.COLORS['error']),
+                ephemeral=True
+            )
+            return
+
+        if upcoming_flights:
             upcoming_text = ""
-            for flight in upcoming_flights[:5]:
-                flight_data = flight['data']
+            for flight in upcoming_flights:
+                flight_data = flight.to_dict()
                 upcoming_text += f"• **{flight_data['flight_number']}** - {flight_data['departure_code']} → {flight_data['arrival_code']}\n"
                 upcoming_text += f"  📅 {flight_data['departure_date']} {flight_data['departure_time']} | {FlightCard.create_status_badge(flight_data.get('status', 'scheduled'))}\n\n"
 
@@ -1381,7 +1251,10 @@ class Flights(commands.Cog):
 
         # Статистика по статусам
         status_text = ""
-        for status, flights_in_status in status_groups.items():
+        for status, count in stats.get('status_counts', {}).items():
+            if count <= 0:
+                continue
+
             status_emoji = {
                 'scheduled': '📅',
                 'boarding': '🎫',
@@ -1400,261 +1273,214 @@ class Flights(commands.Cog):
                 'completed': 'Завершено'
             }.get(status, 'Неизвестно')
 
-            status_text += f"{status_emoji} {status_name}: **{len(flights_in_status)}**\n"
+            status_text += f"{status_emoji} {status_name}: **{count}**\n"
 
-        embed.add_field(
-            name="📊 Статистика",
-            value=status_text,
-            inline=True
-        )
+        if status_text:
+            embed.add_field(
+                name="📊 Статистика",
+                value=status_text,
+                inline=True
+            )
 
-        # Создаем View для навигации
+        # Создаем View для навигации: страницы читаются по курсорам по мере листания
         class FlightListView(View):
-            def __init__(self, flights: list, airline_name: str):
+            def __init__(self, pager: QueryPager, airline_id: str, airline_name: str, total_flights: int):
                 super().__init__(timeout=180)
-                self.flights = flights
+                self.pager = pager
+                self.airline_id = airline_id
                 self.airline_name = airline_name
-                self.current_page = 0
-                self.page_size = 5
+                self.total_flights = total_flights
+                self.current_page = -1
+                self.has_next = True
 
             @discord.ui.button(label="⬅️ Назад", style=discord.ButtonStyle.secondary, row=0)
             async def prev_button(self, interaction: discord.Interaction, button: Button):
                 if self.current_page > 0:
-                    self.current_page -= 1
-                    await self.update_embed(interaction)
+                    await self.show_page(interaction, self.current_page - 1)
+                else:
+                    await interaction.response.defer()
 
             @discord.ui.button(label="➡️ Вперед", style=discord.ButtonStyle.secondary, row=0)
             async def next_button(self, interaction: discord.Interaction, button: Button):
-                if (self.current_page + 1) * self.page_size < len(self.flights):
-                    self.current_page += 1
-                    await self.update_embed(interaction)
+                if self.has_next:
+                    await self.show_page(interaction, self.current_page + 1)
+                else:
+                    await interaction.response.defer()
 
             @discord.ui.button(label="🔍 Поиск", style=discord.ButtonStyle.primary, row=0)
             async def search_button(self, interaction: discord.Interaction, button: Button):
-                await interaction.response.send_modal(FlightSearchModal(self.flights))
+                await interaction.response.send_modal(FlightSearchModal(self.airline_id))
 
-            async def update_embed(self, interaction: discord.Interaction):
-                start_idx = self.current_page * self.page_size
-                end_idx = min(start_idx + self.page_size, len(self.flights))
+            async def show_page(self, interaction: discord.Interaction, page: int):
+                try:
+                    flights, has_next = await self.pager.get_page(page)
+                except FailedPrecondition as e:
+                    print(f"Ошибка чтения страницы рейсов (нет индекса): {e}")
+                    await interaction.response.send_message(MISSING_INDEX_TEXT, ephemeral=True)
+                    return
+                if not flights:
+                    self.has_next = False
+                    await interaction.response.defer()
+                    return
+
+                self.current_page = page
+                self.has_next = has_next
+                page_size = self.pager.page_size
+                total_pages = max(1, (self.total_flights + page_size - 1) // page_size)
 
                 page_embed = FlightCard.create_embed(
                     f"Рейсы {self.airline_name}",
-                    f"Страница {self.current_page + 1}/{(len(self.flights) + self.page_size - 1) // self.page_size}",
+                    f"Страница {page + 1}/{total_pages}",
                     FlightStyles.COLORS['info']
                 )
 
-                for i in range(start_idx, end_idx):
-                    flight = self.flights[i]
-                    flight_data = flight['data']
-
+                for i, (flight_id, flight_data) in enumerate(flights, page * page_size + 1):
                     flight_text = f"**{flight_data['flight_number']}** - {flight_data['departure_code']} → {flight_data['arrival_code']}\n"
                     flight_text += f"📅 {flight_data['departure_date']} {flight_data['departure_time']}\n"
                     flight_text += f"✈️ {FlightCard.create_status_badge(flight_data.get('status', 'scheduled'))}\n"
                     flight_text += f"🛩️ {flight_data.get('aircraft', 'Неизвестно')}\n"
 
                     page_embed.add_field(
-                        name=f"Рейс #{i+1}",
+                        name=f"Рейс #{i}",
                         value=flight_text,
                         inline=True
                     )
 
                 await interaction.response.edit_message(embed=page_embed, view=self)
 
-        view = FlightListView(flights_list, airline_data['name'])
+        pager = QueryPager(db_handler, airline_flights.order_by('departure_datetime'))
+        view = FlightListView(pager, airline_id, airline_data['name'], total_flights)
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
-    @tasks.loop(minutes=5)
-    async def flight_status_updater(self):
-        """Автоматическое обновление статусов рейсов"""
-        try:
-            db = self.bot.data.db
-            flights_ref = db.collection('flights')
+    async def send_reminder(self, reminder: Dict[str, Any], flight_data: Dict[str, Any]) -> bool:
+        """Отправка напоминания о рейсе из очереди напоминаний"""
+        user_id = int(reminder['user_id'])
+        user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+        if not user:
+            return False
 
-            now = datetime.now()
+        if reminder['type'] == 'server_open':
+            embed = FlightCard.create_embed(
+                "Сервер открыт",
+                "Сервер рейса открыт - можно заходить!",
+                FlightStyles.COLORS['info']
+            )
+        else:
+            text = REMINDER_OFFSETS[reminder['type']][1]
+            embed = FlightCard.create_embed(
+                f"Напоминание о рейсе",
+                f"До {text} до вылета!",
+                FlightStyles.COLORS['info']
+            )
 
-            scheduled_flights = flights_ref.where('status', '==', 'scheduled').get()
-            boarding_flights = flights_ref.where('status', '==', 'boarding').get()
-            departed_flights = flights_ref.where('status', '==', 'departed').get()
+        embed.add_field(
+            name="Рейс",
+            value=f"{flight_data.get('flight_number', '')} - {flight_data.get('airline_name', '')}",
+            inline=False
+        )
 
-            all_flights = list(scheduled_flights) + list(boarding_flights) + list(departed_flights)
+        embed.add_field(
+            name="Детали",
+            value=f"Вылет: {flight_data.get('departure_airport', '')}\nПрилет: {flight_data.get('arrival_airport', '')}\nДата: {flight_data.get('departure_date', '')}\nВремя: {flight_data.get('departure_time', '')}",
+            inline=False
+        )
 
-            for flight in all_flights:
-                flight_data = flight.to_dict()
-                flight_id = flight.id
+        if reminder['type'] == 'server_open' and flight_data.get('departure_game_link'):
+            embed.add_field(
+                name="Ссылка на игру",
+                value=flight_data['departure_game_link'],
+                inline=False
+            )
 
-                try:
-                    departure_str = flight_data.get('departure_datetime')
-                    if not departure_str:
-                        continue
-
-                    departure_time = datetime.fromisoformat(departure_str.replace('Z', '+00:00'))
-
-                    checkin_close_str = flight_data.get('checkin_close')
-                    departure_date_str = flight_data.get('departure_date')
-
-                    if checkin_close_str and departure_date_str:
-                        try:
-                            close_hour, close_minute = map(int, checkin_close_str.split(':'))
-                            dep_date = datetime.strptime(departure_date_str, "%d.%m.%Y")
-                            checkin_close_time = dep_date.replace(hour=close_hour, minute=close_minute)
-
-                            if now >= checkin_close_time and departure_time > now:
-                                if flight_data.get('status') == 'scheduled':
-                                    flights_ref.document(flight_id).update({
-                                        'status': 'boarding',
-                                        'updated_at': datetime.now().isoformat()
-                                    })
-                        except Exception as e:
-                            print(f"Ошибка обработки времени регистрации: {e}")
-
-                    if now >= departure_time:
-                        if flight_data.get('status') != 'departed':
-                            flights_ref.document(flight_id).update({
-                                'status': 'departed',
-                                'updated_at': datetime.now().isoformat(),
-                                'actual_departure': now.isoformat()
-                            })
-
-                    if flight_data.get('status') == 'departed':
-                        actual_departure_str = flight_data.get('actual_departure')
-                        flight_time = flight_data.get('flight_time', 120)
-
-                        if actual_departure_str:
-                            try:
-                                actual_departure = datetime.fromisoformat(actual_departure_str.replace('Z', '+00:00'))
-                                completion_time = actual_departure + timedelta(minutes=flight_time)
-
-                                if now >= completion_time:
-                                    flights_ref.document(flight_id).update({
-                                        'status': 'completed',
-                                        'updated_at': datetime.now().isoformat()
-                                    })
-
-                                    airline_id = flight_data.get('airline_id')
-                                    if airline_id:
-                                        airline_ref = db.collection('airlines').document(airline_id)
-                                        airline_ref.update({
-                                            'statistics.flights_completed': firestore.Increment(1)
-                                        })
-                            except:
-                                pass
-
-                except Exception as e:
-                    print(f"Ошибка обновления статуса рейса {flight_id}: {e}")
+        try:
+            await user.send(embed=embed)
+        except discord.Forbidden:
+            # Личные сообщения закрыты - повтор не поможет
+            return False
+        return True
+
+class FlightSearchResultsView(View):
+    """Постраничный просмотр результатов поиска рейсов"""
+
+    def __init__(self, search: AirlineFlightSearch):
+        super().__init__(timeout=180)
+        self.search = search
+        self.current_page = 0
+        self.has_next = False
+
+    def build_embed(self, flights: list) -> discord.Embed:
+        page_size = self.search.page_size
+        if self.search.exhausted and not self.search.truncated:
+            found_text = f"Найдено рейсов: **{self.search.found}**"
+        else:
+            found_text = f"Найдено рейсов: **{self.search.found}+**"
 
-        except Exception as e:
-            print(f"Ошибка в flight_status_updater: {e}")
+        embed = FlightCard.create_embed(
+            "Результаты поиска",
+            f"{found_text}\nСтраница {self.current_page + 1}",
+            FlightStyles.COLORS['info']
+        )
 
-    @tasks.loop(minutes=1)
-    async def notification_sender(self):
-        """Отправка уведомлений о рейсах"""
-        try:
-            db = self.bot.data.db
+        for i, (flight_id, flight_data) in enumerate(flights, self.current_page * page_size + 1):
+            flight_text = f"**{flight_data['flight_number']}** - {flight_data['departure_code']} → {flight_data['arrival_code']}\n"
+            flight_text += f"📅 {flight_data['departure_date']} {flight_data['departure_time']}\n"
+            flight_text += f"✈️ {FlightCard.create_status_badge(flight_data.get('status', 'scheduled'))}\n"
+            flight_text += f"🛩️ {flight_data.get('aircraft', 'Неизвестно')}\n"
 
-            subscriptions_ref = db.collection('subscriptions')
-            flights_ref = db.collection('flights')
+            embed.add_field(
+                name=f"Рейс #{i}",
+                value=flight_text,
+                inline=True
+            )
 
-            now = datetime.now()
+        if self.search.truncated and not self.has_next:
+            embed.add_field(
+                name="ℹ️ Показаны не все рейсы",
+                value="Уточните запрос: номер рейса, аэропорты или даты.",
+                inline=False
+            )
 
-            subscriptions = list(subscriptions_ref.stream())
+        self.prev_button.disabled = self.current_page == 0
+        self.next_button.disabled = not self.has_next
+        return embed
 
-            for sub in subscriptions:
-                try:
-                    sub_data = sub.to_dict()
-                    user_id = sub_data.get('user_id')
-                    flight_id = sub_data.get('flight_id')
-                    notifications_sent = sub_data.get('notifications_sent', [])
-
-                    flight_doc = flights_ref.document(flight_id).get()
-                    if not flight_doc.exists:
-                        continue
-
-                    flight_data = flight_doc.to_dict()
-
-                    if flight_data.get('status') in ['cancelled', 'completed']:
-                        continue
-
-                    departure_str = flight_data.get('departure_datetime')
-                    if not departure_str:
-                        continue
-
-                    departure_time = datetime.fromisoformat(departure_str.replace('Z', '+00:00'))
-
-                    notifications_to_send = []
-
-                    if '24h' not in notifications_sent:
-                        time_until = (departure_time - now).total_seconds()
-                        if 23.5 * 3600 < time_until <= 24.5 * 3600:
-                            notifications_to_send.append(('24h', "24 часа"))
-
-                    if '6h' not in notifications_sent:
-                        time_until = (departure_time - now).total_seconds()
-                        if 5.5 * 3600 < time_until <= 6.5 * 3600:
-                            notifications_to_send.append(('6h', "6 часов"))
-
-                    if '1h' not in notifications_sent:
-                        time_until = (departure_time - now).total_seconds()
-                        if 0.5 * 3600 < time_until <= 1.5 * 3600:
-                            notifications_to_send.append(('1h', "1 час"))
-
-                    if '30min' not in notifications_sent:
-                        time_until = (departure_time - now).total_seconds()
-                        if 25 * 60 < time_until <= 35 * 60:
-                            notifications_to_send.append(('30min', "30 минут"))
-
-                    for notification_type, text in notifications_to_send:
-                        try:
-                            user = await self.bot.fetch_user(int(user_id))
-                            if user:
-                                embed = FlightCard.create_embed(
-                                    f"Напоминание о рейсе",
-                                    f"До {text} до вылета!",
-                                    FlightStyles.COLORS['info']
-                                )
-
-                                embed.add_field(
-                                    name="Рейс",
-                                    value=f"{flight_data.get('flight_number', '')} - {flight_data.get('airline_name', '')}",
-                                    inline=False
-                                )
-
-                                embed.add_field(
-                                    name="Детали",
-                                    value=f"Вылет: {flight_data.get('departure_airport', '')}\nПрилет: {flight_data.get('arrival_airport', '')}\nДата: {flight_data.get('departure_date', '')}\nВремя: {flight_data.get('departure_time', '')}",
-                                    inline=False
-                                )
-
-                                await user.send(embed=embed)
-
-                                subscriptions_ref.document(sub.id).update({
-                                    'notifications_sent': firestore.ArrayUnion([notification_type])
-                                })
-
-                        except Exception as e:
-                            print(f"Ошибка отправки уведомления: {e}")
-
-                except Exception as e:
-                    print(f"Ошибка обработки подписки: {e}")
+    async def load_page(self, page: int) -> list:
+        flights, self.has_next = await self.search.get_page(page)
+        self.current_page = page
+        return flights
 
-        except Exception as e:
-            print(f"Ошибка в notification_sender: {e}")
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        try:
+            flights = await self.load_page(page)
+        except FailedPrecondition as e:
+            print(f"Ошибка поиска рейсов (нет индекса): {e}")
+            await interaction.response.send_message(MISSING_INDEX_TEXT, ephemeral=True)
+            return
+        await interaction.response.edit_message(embed=self.build_embed(flights), view=self)
 
-    @flight_status_updater.before_loop
-    async def before_flight_status_updater(self):
-        await self.bot.wait_until_ready()
+    @discord.ui.button(label="⬅️ Назад", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: Button):
+        if self.current_page == 0:
+            await interaction.response.defer()
+            return
+        await self.show_page(interaction, self.current_page - 1)
+
+    @discord.ui.button(label="➡️ Вперед", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: Button):
+        if not self.has_next:
+            await interaction.response.defer()
+            return
+        await self.show_page(interaction, self.current_page + 1)
 
-    @notification_sender.before_loop
-    async def before_notification_sender(self):
-        await self.bot.wait_until_ready()
 
 class FlightSearchModal(Modal, title="🔍 Поиск рейса"):
-    def __init__(self, flights: list):
+    def __init__(self, airline_id: str):
         super().__init__()
-        self.flights = flights
+        self.airline_id = airline_id
 
         self.flight_number = TextInput(
-            label="Номер рейса",
-            placeholder="Например: SU123",
+            label="Номер рейса (или его начало)",
+            placeholder="Например: SU123 или SU1",
             required=False,
             max_length=10
         )
@@ -1673,36 +1499,76 @@ class FlightSearchModal(Modal, title="🔍 Поиск рейса"):
             max_length=3
         )
 
+        self.dates = TextInput(
+            label="Даты вылета",
+            placeholder="ДД.ММ.ГГГГ или ДД.ММ.ГГГГ-ДД.ММ.ГГГГ",
+            required=False,
+            max_length=21
+        )
+
         self.add_item(self.flight_number)
         self.add_item(self.departure_code)
         self.add_item(self.arrival_code)
+        self.add_item(self.dates)
+
+    @staticmethod
+    def parse_dates(value: str):
+        """'ДД.ММ.ГГГГ' или 'ДД.ММ.ГГГГ-ДД.ММ.ГГГГ' -> (начало, конец) полуинтервала"""
+        parts = [part.strip() for part in value.split('-')]
+        if len(parts) > 2:
+            raise ValueError(value)
+        date_from = datetime.strptime(parts[0], "%d.%m.%Y")
+        date_to = datetime.strptime(parts[-1], "%d.%m.%Y") + timedelta(days=1)
+        if date_to <= date_from:
+            raise ValueError(value)
+        return date_from, date_to
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
-        # Фильтруем рейсы
-        filtered_flights = []
-
-        for flight in self.flights:
-            flight_data = flight['data']
-            matches = True
-
-            if self.flight_number.value:
-                if self.flight_number.value.upper() not in flight_data.get('flight_number', '').upper():
-                    matches = False
-
-            if self.departure_code.value:
-                if self.departure_code.value.upper() != flight_data.get('departure_code', '').upper():
-                    matches = False
+        date_from = date_to = None
+        if self.dates.value.strip():
+            try:
+                date_from, date_to = self.parse_dates(self.dates.value)
+            except ValueError:
+                embed = FlightCard.create_embed(
+                    "Неверные даты",
+                    "Укажите дату в формате ДД.ММ.ГГГГ или диапазон ДД.ММ.ГГГГ-ДД.ММ.ГГГГ.",
+                    FlightStyles.COLORS['error']
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
 
-            if self.arrival_code.value:
-                if self.arrival_code.value.upper() != flight_data.get('arrival_code', '').upper():
-                    matches = False
+        # Поиск выполняется запросами к Firestore, страницы читаются по мере листания
+        search = AirlineFlightSearch(
+            interaction.client.data,
+            self.airline_id,
+            flight_number=self.flight_number.value,
+            departure=self.departure_code.value,
+            arrival=self.arrival_code.value,
+            date_from=date_from,
+            date_to=date_to
+        )
+        view = FlightSearchResultsView(search)
 
-            if matches:
-                filtered_flights.append(flight)
+        try:
+            flights = await view.load_page(0)
+        except FailedPrecondition as e:
+            print(f"Ошибка поиска рейсов (нет индекса): {e}")
+            embed = FlightCard.create_embed("Поиск недоступен", MISSING_INDEX_TEXT, FlightStyles.COLORS['error'])
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+        except Exception as e:
+            print(f"Ошибка поиска рейсов: {e}")
+            embed = FlightCard.create_embed(
+                "Ошибка поиска",
+                "Не удалось выполнить поиск. Попробуйте позже.",
+                FlightStyles.COLORS['error']
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
 
-        if not filtered_flights:
+        if not flights:
             embed = FlightCard.create_embed(
                 "Рейсы не найдены",
                 "По вашему запросу рейсов не найдено.",
@@ -1711,31 +1577,7 @@ class FlightSearchModal(Modal, title="🔍 Поиск рейса"):
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        # Создаем Embed с результатами
-        embed = FlightCard.create_embed(
-            "Результаты поиска",
-            f"Найдено рейсов: **{len(filtered_flights)}**",
-            FlightStyles.COLORS['info']
-        )
-
-        for i, flight in enumerate(filtered_flights[:5], 1):
-            flight_data = flight['data']
-
-            flight_text = f"**{flight_data['flight_number']}** - {flight_data['departure_code']} → {flight_data['arrival_code']}\n"
-            flight_text += f"📅 {flight_data['departure_date']} {flight_data['departure_time']}\n"
-            flight_text += f"✈️ {FlightCard.create_status_badge(flight_data.get('status', 'scheduled'))}\n"
-            flight_text += f"🛩️ {flight_data.get('aircraft', 'Неизвестно')}\n"
-
-            embed.add_field(
-                name=f"Рейс #{i}",
-                value=flight_text,
-                inline=True
-            )
-
-        if len(filtered_flights) > 5:
-            embed.set_footer(text=f"Показано 5 из {len(filtered_flights)} найденных рейсов")
-
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=view.build_embed(flights), view=view, ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Flights(bot))
\ No newline at end of file
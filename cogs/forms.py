@@ -53,12 +53,12 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            db = self.bot.data.db
+            db_handler = self.bot.data
 
             # Проверяем уникальность IATA
-            airlines_ref = db.collection('airlines')
+            airlines_ref = db_handler.collection('airlines')
             query = airlines_ref.where(filter=firestore.FieldFilter('iata', '==', self.iata.value.upper())).limit(1)
-            existing = query.get()
+            existing = await db_handler.fetch(query)
 
             if len(existing) > 0:
                 await interaction.response.send_message(
@@ -69,7 +69,7 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
 
             # Проверяем, нет ли у пользователя уже авиакомпании
             user_query = airlines_ref.where(filter=firestore.FieldFilter('owner_id', '==', str(interaction.user.id))).limit(1)
-            user_airlines = user_query.get()
+            user_airlines = await db_handler.fetch(user_query)
 
             if len(user_airlines) > 0:
                 await interaction.response.send_message(
@@ -93,9 +93,8 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
             }
 
             # Сохраняем в Firebase
-            apps_ref = db.collection('airline_applications')
-            new_doc = apps_ref.add(application_data)
-            app_id = new_doc[1].id
+            app_id = await db_handler.add_document('airline_applications', application_data)
+            db_handler.stats_snapshot.adjust('pending_applications')
 
             # Создаем Embed для модерации
             embed = discord.Embed(
@@ -125,16 +124,17 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
                 @discord.ui.button(label="✅ Принять", style=discord.ButtonStyle.success, emoji="✅")
                 async def accept_button(self, interaction: discord.Interaction, button: discord.ui.Button):
                     # Обновляем статус заявки
-                    app_doc = apps_ref.document(self.application_id)
-                    app_doc.update({
+                    application_id = self.application_id
+                    await db_handler.update_document('airline_applications', application_id, {
                         'status': 'accepted',
                         'moderator_id': str(interaction.user.id),
                         'moderator_name': str(interaction.user),
                         'processed_at': datetime.now().isoformat()
                     })
+                    db_handler.stats_snapshot.adjust('pending_applications', -1)
 
                     # Получаем данные заявки
-                    app_data = app_doc.get().to_dict()
+                    app_data = (await db_handler.get_document('airline_applications', application_id)).to_dict()
 
                     # Создаем запись авиакомпании
                     airline_data = {
@@ -158,7 +158,7 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
                         }
                     }
 
-                    airlines_ref.add(airline_data)
+                    await db_handler.create_airline(airline_data)
 
                     # Отправляем уведомление пользователю
                     try:
@@ -230,7 +230,7 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
                             @discord.ui.button(label="❌ Не согласен", style=discord.ButtonStyle.danger, emoji="❌")
                             async def disagree_button(self, interaction: discord.Interaction, button: discord.ui.Button):
                                 # Отклоняем заявку
-                                app_doc.update({'status': 'rejected_agreement'})
+                                await db_handler.update_document('airline_applications', application_id, {'status': 'rejected_agreement'})
                                 await interaction.response.send_message(
                                     "❌ Регистрация отменена. Условия оферты не были приняты.",
                                     ephemeral=True
@@ -273,14 +273,14 @@ class AirlineRegistrationModal(Modal, title="📝 Регистрация ави
 
                         async def on_submit(self, interaction: discord.Interaction):
                             # Обновляем статус заявки
-                            app_doc = apps_ref.document(self.application_id)
-                            app_doc.update({
+                            await db_handler.update_document('airline_applications', self.application_id, {
                                 'status': 'rejected',
                                 'moderator_id': str(interaction.user.id),
                                 'moderator_name': str(interaction.user),
                                 'rejection_reason': self.reason.value,
                                 'processed_at': datetime.now().isoformat()
                             })
+                            db_handler.stats_snapshot.adjust('pending_applications', -1)
 
                             # Уведомляем пользователя
                             try:
@@ -376,7 +376,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            db = self.bot.data.db
+            db_handler = self.bot.data
 
             # Создаем заявку
             application_data = {
@@ -390,9 +390,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                 'created_at': datetime.now().isoformat()
             }
 
-            partners_ref = db.collection('partner_applications')
-            application_doc = partners_ref.add(application_data)
-            app_id = application_doc[1].id
+            app_id = await db_handler.add_document('partner_applications', application_data)
 
             # Отправляем в канал модерации партнеров
             guild = interaction.guild
@@ -425,8 +423,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                         @discord.ui.button(label="✅ Одобрить", style=discord.ButtonStyle.success)
                         async def approve_button(self, interaction: discord.Interaction, button: discord.ui.Button):
                             # Обновляем статус заявки
-                            app_ref = partners_ref.document(self.app_id)
-                            app_ref.update({
+                            await db_handler.update_document('partner_applications', self.app_id, {
                                 'status': 'approved',
                                 'moderator_id': str(interaction.user.id),
                                 'moderator_name': str(interaction.user),
@@ -434,7 +431,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                             })
 
                             # Создаем партнера
-                            app_data = app_ref.get().to_dict()
+                            app_data = (await db_handler.get_document('partner_applications', self.app_id)).to_dict()
 
                             partner_data = {
                                 'server_name': app_data['server_name'],
@@ -449,7 +446,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                                 'last_published': None
                             }
 
-                            db.collection('partners').add(partner_data)
+                            await db_handler.add_document('partners', partner_data)
 
                             # Выдаем роль партнера
                             guild = interaction.guild
@@ -512,15 +509,14 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                                     self.add_item(self.reason)
 
                                 async def on_submit(self, interaction: discord.Interaction):
-                                    app_ref = partners_ref.document(self.app_id)
-                                    app_ref.update({
+                                    await db_handler.update_document('partner_applications', self.app_id, {
                                         'status': 'rejected',
                                         'moderator_id': str(interaction.user.id),
                                         'moderator_name': str(interaction.user),
                                         'rejection_reason': self.reason.value
                                     })
 
-                                    app_data = app_ref.get().to_dict()
+                                    app_data = (await db_handler.get_document('partner_applications', self.app_id)).to_dict()
 
                                     # Уведомляем заявителя
                                     try:
@@ -588,7 +584,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            db = self.bot.data.db
+            db_handler = self.bot.data
 
             # Создаем тикет
             ticket_data = {
@@ -602,9 +598,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                 'messages': []
             }
 
-            tickets_ref = db.collection('support_tickets')
-            ticket_doc = tickets_ref.add(ticket_data)
-            ticket_id = ticket_doc[1].id
+            ticket_id = await db_handler.add_document('support_tickets', ticket_data)
 
             # Отправляем в канал поддержки
             guild = interaction.guild
@@ -636,8 +630,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                         @discord.ui.button(label="📥 Взять тикет", style=discord.ButtonStyle.primary, emoji="👮")
                         async def take_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
                             # Проверяем, не взят ли уже тикет
-                            ticket_ref = tickets_ref.document(self.ticket_id)
-                            ticket_data = ticket_ref.get().to_dict()
+                            ticket_data = (await db_handler.get_document('support_tickets', self.ticket_id)).to_dict()
 
                             if ticket_data['assigned_to']:
                                 try:
@@ -653,7 +646,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                                 return
 
                             # Назначаем модератора
-                            ticket_ref.update({
+                            await db_handler.update_document('support_tickets', self.ticket_id, {
                                 'assigned_to': str(interaction.user.id),
                                 'assigned_name': str(interaction.user),
                                 'status': 'in_progress',
@@ -698,8 +691,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
 
                                             async def on_submit(self, interaction: discord.Interaction):
                                                 # Добавляем сообщение в историю тикета
-                                                ticket_ref = tickets_ref.document(self.ticket_id)
-                                                ticket_ref.update({
+                                                await db_handler.update_document('support_tickets', self.ticket_id, {
                                                     'messages': firestore.ArrayUnion([{
                                                         'from': 'user',
                                                         'user_id': str(interaction.user.id),
@@ -754,10 +746,9 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                                     self.add_item(self.reason)
 
                                 async def on_submit(self, interaction: discord.Interaction):
-                                    ticket_ref = tickets_ref.document(self.ticket_id)
-                                    ticket_data = ticket_ref.get().to_dict()
+                                    ticket_data = (await db_handler.get_document('support_tickets', self.ticket_id)).to_dict()
 
-                                    ticket_ref.update({
+                                    await db_handler.update_document('support_tickets', self.ticket_id, {
                                         'status': 'closed',
                                         'closed_by': str(interaction.user.id),
                                         'closed_at': datetime.now().isoformat(),
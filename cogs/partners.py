@@ -35,7 +35,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
         self.add_item(self.contact)
 
     async def on_submit(self, interaction: discord.Interaction):
-        db = interaction.client.data.db
+        db_handler = interaction.client.data
 
         # Создаем заявку
         application_data = {
@@ -49,8 +49,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
             'created_at': datetime.now().isoformat()
         }
 
-        partners_ref = db.collection('partner_applications')
-        application_doc = partners_ref.add(application_data)
+        app_id = await db_handler.add_document('partner_applications', application_data)
 
         # Отправляем в канал модерации
         guild = interaction.guild
@@ -91,15 +90,14 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                                          interaction: discord.Interaction,
                                          button: Button):
                     # Обновляем статус заявки
-                    app_ref = partners_ref.document(self.app_id)
-                    app_ref.update({
+                    await db_handler.update_document('partner_applications', self.app_id, {
                         'status': 'approved',
                         'moderator_id': str(interaction.user.id),
                         'moderator_name': str(interaction.user)
                     })
 
                     # Создаем партнера
-                    app_data = app_ref.get().to_dict()
+                    app_data = (await db_handler.get_document('partner_applications', self.app_id)).to_dict()
 
                     partner_data = {
                         'server_name': app_data['server_name'],
@@ -112,7 +110,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                         'published_flights': 0
                     }
 
-                    db.collection('partners').add(partner_data)
+                    await db_handler.add_document('partners', partner_data)
 
                     # Выдаем роль партнера
                     guild = interaction.guild
@@ -143,14 +141,13 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                                    style=discord.ButtonStyle.danger)
                 async def reject_button(self, interaction: discord.Interaction,
                                         button: Button):
-                    app_ref = partners_ref.document(self.app_id)
-                    app_ref.update({
+                    await db_handler.update_document('partner_applications', self.app_id, {
                         'status': 'rejected',
                         'moderator_id': str(interaction.user.id),
                         'moderator_name': str(interaction.user)
                     })
 
-                    app_data = app_ref.get().to_dict()
+                    app_data = (await db_handler.get_document('partner_applications', self.app_id)).to_dict()
 
                     # Уведомляем заявителя
                     try:
@@ -169,7 +166,7 @@ class PartnerApplicationModal(Modal, title="🤝 Заявка на партне
                     await interaction.response.edit_message(embed=embed,
                                                             view=None)
 
-            view = PartnerModerationView(application_doc[1].id)
+            view = PartnerModerationView(app_id)
             await mod_channel.send(embed=embed, view=view)
 
         await interaction.response.send_message(
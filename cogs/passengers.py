@@ -5,9 +5,11 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from discord.ui import Button, View, Modal, TextInput, Select
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 import asyncio
 
+from utils.schedule_board import ScheduleBoard, ScheduleSnapshot
+
 class Passengers(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -16,25 +18,22 @@ class Passengers(commands.Cog):
     @app_commands.describe(
         date="Дата вылета (ДД.ММ.ГГГГ)",
         departure="Код аэропорта вылета (например: SVO)",
-        arrival="Код аэропорта прилета (например: DME)"
+        arrival="Код аэропорта прилета (например: DME)",
+        flight="Номер рейса (например: SU1234)"
     )
     async def search_flights(
         self,
         interaction: discord.Interaction,
         date: Optional[str] = None,
         departure: Optional[str] = None,
-        arrival: Optional[str] = None
+        arrival: Optional[str] = None,
+        flight: Optional[str] = None
     ):
         """Поиск рейсов по параметрам"""
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=True)
         
         db_handler = self.bot.data
-        db = db_handler.db
-        flights_ref = db.collection('flights')
-
-        # Базовый запрос - только активные рейсы
-        query = flights_ref.where('status', 'in', ['scheduled', 'boarding', 'delayed'])
 
         # Конвертируем дату если указана
         departure_date = None
@@ -42,47 +41,17 @@ class Passengers(commands.Cog):
             try:
                 departure_date = datetime.strptime(date, "%d.%m.%Y")
             except ValueError:
-                await interaction.response.send_message(
+                await interaction.followup.send(
                     "❌ Неверный формат даты! Используйте ДД.ММ.ГГГГ",
                     ephemeral=True
                 )
                 return
 
-        # Получаем рейсы
-        flights = query.get()
-
-        # Фильтруем результаты
-        filtered_flights = []
-
-        for flight in flights:
-            flight_data = flight.to_dict()
-            flight_id = flight.id
-
-            # Фильтр по дате
-            if date:
-                flight_date_str = flight_data.get('departure_date')
-                if not flight_date_str or flight_date_str != date:
-                    continue
-
-            # Фильтр по аэропорту вылета
-            if departure:
-                flight_departure = flight_data.get('departure_code', '').upper()
-                if flight_departure != departure.upper():
-                    continue
-
-            # Фильтр по аэропорту прилета
-            if arrival:
-                flight_arrival = flight_data.get('arrival_code', '').upper()
-                if flight_arrival != arrival.upper():
-                    continue
-
-            filtered_flights.append((flight_id, flight_data))
-
-        # Сортируем по дате и времени
-        filtered_flights.sort(key=lambda x: x[1].get('departure_datetime', ''))
+        # Поиск по индексам реплики: сразу отфильтровано и отсортировано по вылету
+        filtered_flights = await db_handler.search_flights(date, departure, arrival, flight)
 
         if len(filtered_flights) == 0:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ Рейсы по вашему запросу не найдены!",
                 ephemeral=True
             )
@@ -103,6 +72,8 @@ class Passengers(commands.Cog):
             filters_text += f"🛫 Вылет из: **{departure.upper()}**\n"
         if arrival:
             filters_text += f"🛬 Прилет в: **{arrival.upper()}**\n"
+        if flight:
+            filters_text += f"✈️ Рейс: **{flight.upper()}**\n"
 
         if filters_text:
             embed.add_field(name="🎯 Примененные фильтры", value=filters_text, inline=False)
@@ -222,40 +193,24 @@ class Passengers(commands.Cog):
 
                     @discord.ui.button(label="🔔 Напомнить", style=discord.ButtonStyle.primary, emoji="🔔")
                     async def remind_button(self, interaction: discord.Interaction, button: Button):
-                        db = interaction.client.data.db
+                        # Несколько запросов к базе - отвечаем после defer
+                        await interaction.response.defer(ephemeral=True)
 
                         # Сохраняем подписку
-                        subscriptions_ref = db.collection('subscriptions')
-
-                        # Проверяем, есть ли уже подписка
-                        query = subscriptions_ref.where('user_id', '==', str(interaction.user.id)).where('flight_id', '==', self.flight_id).limit(1)
-                        existing = query.get()
+                        created = await interaction.client.data.add_subscription(
+                            str(interaction.user.id),
+                            self.flight_id,
+                            username=str(interaction.user)
+                        )
 
-                        if len(existing) > 0:
-                            await interaction.response.send_message(
+                        if not created:
+                            await interaction.followup.send(
                                 "❌ Вы уже подписаны на уведомления об этом рейсе!",
                                 ephemeral=True
                             )
                             return
 
-                        subscription_data = {
-                            'user_id': str(interaction.user.id),
-                            'username': str(interaction.user),
-                            'flight_id': self.flight_id,
-                            'created_at': datetime.now().isoformat(),
-                            'notifications': ['24h', '6h', '1h', '30min', 'server_open'],
-                            'notifications_sent': []
-                        }
-
-                        subscriptions_ref.add(subscription_data)
-
-                        # Увеличиваем счетчик подписок
-                        flights_ref = db.collection('flights')
-                        flights_ref.document(self.flight_id).update({
-                            'subscriptions': firestore.Increment(1)
-                        })
-
-                        await interaction.response.send_message(
+                        await interaction.followup.send(
                             "✅ Вы подписались на уведомления о рейсе! Вы получите напоминания:\n"
                             "• За 24 часа до вылета\n"
                             "• За 6 часов до вылета\n"
@@ -267,19 +222,19 @@ class Passengers(commands.Cog):
 
                     @discord.ui.button(label="📊 Статистика рейса", style=discord.ButtonStyle.secondary, emoji="📊")
                     async def stats_button(self, interaction: discord.Interaction, button: Button):
-                        db = interaction.client.data.db
+                        db_handler = interaction.client.data
 
                         # Получаем количество подписок
-                        subscriptions_ref = db.collection('subscriptions')
+                        subscriptions_ref = db_handler.collection('subscriptions')
                         query = subscriptions_ref.where('flight_id', '==', self.flight_id)
-                        subscriptions = query.get()
+                        subscriptions_count = await db_handler.count(query)
 
                         stats_embed = discord.Embed(
                             title=f"📊 Статистика рейса {self.flight_data.get('flight_number', '')}",
                             color=discord.Color.blue()
                         )
 
-                        stats_embed.add_field(name="🔔 Подписок на уведомления", value=f"**{len(subscriptions)}**", inline=True)
+                        stats_embed.add_field(name="🔔 Подписок на уведомления", value=f"**{subscriptions_count}**", inline=True)
 
                         # Статус рейса
                         status = self.flight_data.get('status', 'scheduled')
@@ -335,138 +290,159 @@ class Passengers(commands.Cog):
         if len(filtered_flights) > 5:
             embed.set_footer(text=f"Показано 5 из {len(filtered_flights)} рейсов. Используйте меню ниже для просмотра всех.")
             view = FlightSelectView(filtered_flights)
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
         else:
             view = FlightSelectView(filtered_flights)
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-
-    @app_commands.command(name="расписание_рейсов", description="Показать расписание рейсов")
-    async def show_schedule(self, interaction: discord.Interaction):
-        """Показать расписание всех активных рейсов"""
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+
+    # Автодополнение - только из памяти, без запросов к Firestore
+    def _airport_choices(self, current: str, role: str, other: Optional[str]) -> List[app_commands.Choice[str]]:
+        index = self.bot.data.flight_autocomplete
+        choices = []
+        for code, name, count in index.airports(current, role, other):
+            label = f"{code} — {name}" if name else code
+            choices.append(app_commands.Choice(name=f"{label} ({count} рейс.)"[:100], value=code))
+        return choices
+
+    @search_flights.autocomplete('departure')
+    async def departure_autocomplete(self, interaction: discord.Interaction,
+                                     current: str) -> List[app_commands.Choice[str]]:
+        return self._airport_choices(current, 'departure', getattr(interaction.namespace, 'arrival', None))
+
+    @search_flights.autocomplete('arrival')
+    async def arrival_autocomplete(self, interaction: discord.Interaction,
+                                   current: str) -> List[app_commands.Choice[str]]:
+        return self._airport_choices(current, 'arrival', getattr(interaction.namespace, 'departure', None))
+
+    @search_flights.autocomplete('flight')
+    async def flight_autocomplete(self, interaction: discord.Interaction,
+                                  current: str) -> List[app_commands.Choice[str]]:
+        index = self.bot.data.flight_autocomplete
+        return [
+            app_commands.Choice(name=number if count == 1 else f"{number} ({count} рейс.)", value=number)
+            for number, count in index.flight_numbers(current)
+        ]
+
+    @app_commands.command(name="пересадки", description="Маршруты с пересадками между аэропортами")
+    @app_commands.describe(
+        departure="Код аэропорта вылета (например: SVO)",
+        arrival="Код аэропорта прилета (например: KZN)",
+        date="Дата вылета (ДД.ММ.ГГГГ), по умолчанию - сейчас",
+        max_legs="Максимум перелетов в маршруте"
+    )
+    async def search_itineraries(
+        self,
+        interaction: discord.Interaction,
+        departure: str,
+        arrival: str,
+        date: Optional[str] = None,
+        max_legs: app_commands.Range[int, 1, 3] = 3
+    ):
+        """Поиск маршрутов с пересадками по активным рейсам"""
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=True)
-        db = self.bot.data.db
-        flights_ref = db.collection('flights')
 
-        # Получаем активные рейсы (по расписанию, идет регистрация и задержанные)
-        query = flights_ref.where('status', 'in', ['scheduled', 'boarding', 'delayed'])
-        active_flights = query.get()
+        db_handler = self.bot.data
+
+        start = datetime.now()
+        if date:
+            try:
+                start = max(start, datetime.strptime(date, "%d.%m.%Y"))
+            except ValueError:
+                await interaction.followup.send(
+                    "❌ Неверный формат даты! Используйте ДД.ММ.ГГГГ",
+                    ephemeral=True
+                )
+                return
 
-        # Преобразуем в список и сортируем по дате вылета
-        flights_list = []
-        for flight in active_flights:
-            flight_data = flight.to_dict()
-            flights_list.append((flight.id, flight_data))
+        if not db_handler.flight_replica.ready:
+            await interaction.followup.send(
+                "⏳ Расписание еще загружается, попробуйте через минуту.",
+                ephemeral=True
+            )
+            return
 
-        # Сортируем по дате и времени вылета
-        flights_list.sort(key=lambda x: x[1].get('departure_datetime', ''))
+        itineraries = db_handler.itineraries.search(departure, arrival, start, max_legs)
 
-        if not flights_list:
-            await interaction.response.send_message(
-                "❌ Активных рейсов не найдено!",
+        if not itineraries:
+            await interaction.followup.send(
+                f"❌ Маршрутов из **{departure.upper()}** в **{arrival.upper()}** не найдено!",
                 ephemeral=True
             )
             return
 
-        # Создаем Embed
         embed = discord.Embed(
-            title="📅 Расписание рейсов",
-            description=f"Найдено активных рейсов: **{len(flights_list)}**",
-            color=discord.Color.green(),
-            timestamp=datetime.now()
+            title=f"🧭 Маршруты {departure.upper()} → {arrival.upper()}",
+            description=f"Вылет не раньше **{start.strftime('%d.%m.%Y %H:%M')}**, "
+                        f"стыковка от {db_handler.itineraries.min_connection} мин.",
+            color=discord.Color.blue()
         )
 
-        # Добавляем информацию о статусах
-        status_counts = {
-            'scheduled': 0,
-            'boarding': 0,
-            'delayed': 0
-        }
+        for itinerary in itineraries:
+            first, last = itinerary[0][1], itinerary[-1][1]
+            transfers = len(itinerary) - 1
+            title = "✈️ Прямой рейс" if transfers == 0 else f"🔁 Пересадок: {transfers}"
+
+            lines = []
+            connections = db_handler.itineraries.connection_minutes(itinerary)
+            for position, (flight_id, flight_data) in enumerate(itinerary):
+                arrival_time = flight_data.get('arrival_time', '')
+                lines.append(
+                    f"**{flight_data.get('flight_number', 'N/A')}** {flight_data.get('departure_code', '')} → "
+                    f"{flight_data.get('arrival_code', '')} | {flight_data.get('departure_date', '')} "
+                    f"{flight_data.get('departure_time', '')}{f' - {arrival_time}' if arrival_time else ''}"
+                )
+                if position < len(connections):
+                    hours, minutes = divmod(connections[position], 60)
+                    lines.append(f"  ⏱️ Стыковка в {flight_data.get('arrival_code', '')}: {hours} ч {minutes} мин")
 
-        for _, flight_data in flights_list:
-            status = flight_data.get('status', 'scheduled')
-            if status in status_counts:
-                status_counts[status] += 1
-
-        embed.add_field(
-            name="📊 Статистика статусов",
-            value=f"""
-            🟢 По расписанию: **{status_counts['scheduled']}**
-            🟡 Идет регистрация: **{status_counts['boarding']}**
-            🟠 Задержано: **{status_counts['delayed']}**
-            """,
-            inline=False
-        )
+            arrival_at = (last.get('arrival_datetime') or '')[:16].replace('T', ' ') or last.get('arrival_time', 'Неизвестно')
+            lines.append(f"🛬 Прилет: **{arrival_at}** | 🏢 {first.get('airline_name', 'Неизвестно')}")
+            embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
-        # Показываем ближайшие рейсы
-        today = datetime.now().date()
-        today_flights = []
-        tomorrow_flights = []
-        future_flights = []
-
-        for flight_id, flight_data in flights_list:
-            departure_str = flight_data.get('departure_datetime')
-            if departure_str:
-                try:
-                    departure_time = datetime.fromisoformat(departure_str.replace('Z', '+00:00'))
-                    flight_date = departure_time.date()
-
-                    if flight_date == today:
-                        today_flights.append((flight_id, flight_data))
-                    elif flight_date == today + timedelta(days=1):
-                        tomorrow_flights.append((flight_id, flight_data))
-                    else:
-                        future_flights.append((flight_id, flight_data))
-                except:
-                    future_flights.append((flight_id, flight_data))
-
-        # Сегодняшние рейсы
-        if today_flights:
-            today_text = ""
-            for flight_id, flight_data in today_flights[:3]:
-                today_text += f"• **{flight_data.get('flight_number', 'N/A')}** - {flight_data.get('departure_airport', 'N/A')} → {flight_data.get('arrival_airport', 'N/A')} - {flight_data.get('departure_time', 'N/A')}\n"
-
-            if len(today_flights) > 3:
-                today_text += f"*...и еще {len(today_flights) - 3} рейсов*"
-
-            embed.add_field(name="📅 Сегодня", value=today_text or "Нет рейсов", inline=False)
-
-        # Завтрашние рейсы
-        if tomorrow_flights:
-            tomorrow_text = ""
-            for flight_id, flight_data in tomorrow_flights[:3]:
-                tomorrow_text += f"• **{flight_data.get('flight_number', 'N/A')}** - {flight_data.get('departure_airport', 'N/A')} → {flight_data.get('arrival_airport', 'N/A')} - {flight_data.get('departure_time', 'N/A')}\n"
-
-            if len(tomorrow_flights) > 3:
-                tomorrow_text += f"*...и еще {len(tomorrow_flights) - 3} рейсов*"
-
-            embed.add_field(name="📅 Завтра", value=tomorrow_text or "Нет рейсов", inline=False)
+    @search_itineraries.autocomplete('departure')
+    async def itinerary_departure_autocomplete(self, interaction: discord.Interaction,
+                                               current: str) -> List[app_commands.Choice[str]]:
+        # Связь с другим концом не требуется - между ними могут быть пересадки
+        return self._airport_choices(current, 'departure', None)
+
+    @search_itineraries.autocomplete('arrival')
+    async def itinerary_arrival_autocomplete(self, interaction: discord.Interaction,
+                                             current: str) -> List[app_commands.Choice[str]]:
+        return self._airport_choices(current, 'arrival', None)
+
+    @app_commands.command(name="расписание_рейсов", description="Показать расписание рейсов")
+    async def show_schedule(self, interaction: discord.Interaction):
+        """Показать расписание всех активных рейсов"""
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=True)
+        db_handler = self.bot.data
+
+        # Готовое общее табло; пока реплика не готова - собираем разово из запроса
+        if db_handler.flight_replica.ready:
+            board = db_handler.schedule_board.get()
+        else:
+            board = ScheduleSnapshot(await db_handler.get_active_flights(ScheduleBoard.STATUSES))
+
+        if not board.flights:
+            await interaction.followup.send(
+                "❌ Активных рейсов не найдено!",
+                ephemeral=True
+            )
+            return
 
         # Создаем View с селектором для выбора рейса
         class ScheduleSelectView(View):
-            def __init__(self, flights: list):
+            def __init__(self, board: ScheduleSnapshot):
                 super().__init__(timeout=180)
-                self.flights = flights
-
-                # Создаем опции для селектора
-                options = []
-                for i, (flight_id, flight_data) in enumerate(flights[:25], 1):
-                    dep_code = flight_data.get('departure_code', 'N/A')
-                    arr_code = flight_data.get('arrival_code', 'N/A')
-                    flight_num = flight_data.get('flight_number', 'N/A')
-                    airline = flight_data.get('airline_name', 'Неизвестно')
-
-                    option = discord.SelectOption(
-                        label=f"{flight_num} ({dep_code} → {arr_code})",
-                        description=f"{airline} - {flight_data.get('departure_date', '')} {flight_data.get('departure_time', '')}",
-                        value=flight_id,
-                        emoji="✈️"
-                    )
-                    options.append(option)
+                self.board = board
 
+                # Варианты селектора собраны вместе с табло
                 self.select = Select(
                     placeholder="Выберите рейс для подробностей...",
-                    options=options
+                    options=list(board.options)
                 )
                 self.select.callback = self.flight_selected
                 self.add_item(self.select)
@@ -476,13 +452,9 @@ class Passengers(commands.Cog):
 
                 # Находим выбранный рейс
                 selected_flight = None
-                selected_data = None
-
-                for flight_id, flight_data in self.flights:
-                    if flight_id == selected_id:
-                        selected_flight = flight_id
-                        selected_data = flight_data
-                        break
+                selected_data = self.board.by_id.get(selected_id)
+                if selected_data is not None:
+                    selected_flight = selected_id
 
                 if not selected_flight:
                     await interaction.response.send_message(
@@ -537,40 +509,24 @@ class Passengers(commands.Cog):
                         self.flight_id = flight_id
 
                     async def callback(self, interaction: discord.Interaction):
-                        db = interaction.client.data.db
+                        # Несколько запросов к базе - отвечаем после defer
+                        await interaction.response.defer(ephemeral=True)
 
                         # Сохраняем подписку
-                        subscriptions_ref = db.collection('subscriptions')
-
-                        # Проверяем, есть ли уже подписка
-                        query = subscriptions_ref.where('user_id', '==', str(interaction.user.id)).where('flight_id', '==', self.flight_id).limit(1)
-                        existing = query.get()
+                        created = await interaction.client.data.add_subscription(
+                            str(interaction.user.id),
+                            self.flight_id,
+                            username=str(interaction.user)
+                        )
 
-                        if len(existing) > 0:
-                            await interaction.response.send_message(
+                        if not created:
+                            await interaction.followup.send(
                                 "❌ Вы уже подписаны на уведомления об этом рейсе!",
                                 ephemeral=True
                             )
                             return
 
-                        subscription_data = {
-                            'user_id': str(interaction.user.id),
-                            'username': str(interaction.user),
-                            'flight_id': self.flight_id,
-                            'created_at': datetime.now().isoformat(),
-                            'notifications': ['24h', '6h', '1h', '30min', 'server_open'],
-                            'notifications_sent': []
-                        }
-
-                        subscriptions_ref.add(subscription_data)
-
-                        # Увеличиваем счетчик подписок
-                        flights_ref = db.collection('flights')
-                        flights_ref.document(self.flight_id).update({
-                            'subscriptions': firestore.Increment(1)
-                        })
-
-                        await interaction.response.send_message(
+                        await interaction.followup.send(
                             "✅ Вы подписались на уведомления о рейсе!",
                             ephemeral=True
                         )
@@ -580,8 +536,8 @@ class Passengers(commands.Cog):
 
                 await interaction.response.send_message(embed=details_embed, view=details_view, ephemeral=True)
 
-        view = ScheduleSelectView(flights_list)
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        view = ScheduleSelectView(board)
+        await interaction.followup.send(embed=board.embed, view=view, ephemeral=True)
 
     def _get_status_emoji(self, status: str) -> str:
         """Возвращает эмодзи для статуса"""
@@ -27,7 +27,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
         self.add_item(self.description)
 
     async def on_submit(self, interaction: discord.Interaction):
-        db = interaction.client.data.db
+        db_handler = interaction.client.data
 
         # Создаем тикет
         ticket_data = {
@@ -41,8 +41,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
             'messages': []
         }
 
-        tickets_ref = db.collection('support_tickets')
-        ticket_doc = tickets_ref.add(ticket_data)
+        ticket_id = await db_handler.add_document('support_tickets', ticket_data)
 
         # Отправляем в канал поддержки
         guild = interaction.guild
@@ -51,7 +50,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
 
         if support_channel:
             embed = discord.Embed(
-                title=f"🆘 Новый тикет #{ticket_doc[1].id[:8]}",
+                title=f"🆘 Новый тикет #{ticket_id[:8]}",
                 color=discord.Color.orange(),
                 timestamp=datetime.now())
 
@@ -79,8 +78,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                 async def take_ticket(self, interaction: discord.Interaction,
                                       button: Button):
                     # Проверяем, не взят ли уже тикет
-                    ticket_ref = tickets_ref.document(self.ticket_id)
-                    ticket_data = ticket_ref.get().to_dict()
+                    ticket_data = (await db_handler.get_document('support_tickets', self.ticket_id)).to_dict()
 
                     if ticket_data['assigned_to']:
                         await interaction.response.send_message(
@@ -89,7 +87,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                         return
 
                     # Назначаем модератора
-                    ticket_ref.update({
+                    await db_handler.update_document('support_tickets', self.ticket_id, {
                         'assigned_to': str(interaction.user.id),
                         'assigned_name': str(interaction.user),
                         'status': 'in_progress'
@@ -119,7 +117,7 @@ class SupportTicketModal(Modal, title="🆘 Обращение в поддерж
                     await interaction.response.edit_message(embed=embed,
                                                             view=None)
 
-            view = TicketView(ticket_doc[1].id)
+            view = TicketView(ticket_id)
             await support_channel.send(embed=embed, view=view)
 
         await interaction.response.send_message(
@@ -18,7 +18,14 @@ import sys
 from collections import deque
 import aiohttp
 
-from utils.database import DatabaseHandler
+from utils.database import DatabaseHandler, DEFAULT_NOTIFICATIONS
+from utils.flight_replica import FlightReplica
+from utils.flight_index import FlightAutocompleteIndex, FlightSearchIndex
+from utils.itinerary import ItineraryIndex
+from utils.schedule_board import ScheduleBoard
+from utils.reminder_queue import ReminderQueue
+from utils.telemetry import TelemetryBuffer
+from utils.stats_snapshot import StatsSnapshot
 from utils.embeds import Embeds
 from utils.status_manager import StatusManager, ActivityType
 
@@ -429,11 +436,11 @@ class ChannelManager:
         return None
 
 # =============== МОДЕЛЬ ДАННЫХ (УЛУЧШЕННАЯ) ===============
-class BotData:
+class BotData(DatabaseHandler):
     """Улучшенный класс для работы с данными"""
 
     def __init__(self, db: firestore.firestore.Client):
-        self.db = db
+        super().__init__(db)
         self.collections = {
             'airlines': db.collection('airlines'),
             'flights': db.collection('flights'),
@@ -465,51 +472,75 @@ class BotData:
             'total_guilds': 0,
             'open_tickets': 0,
             'command_count': 0,
-            'error_count': 0
+            'error_count': 0,
+            'total_partners': 0,
+            'pending_applications': 0
         }
 
         # История операций
         self.operation_history = deque(maxlen=100)
 
+        # Реплика активных рейсов
+        self.flight_replica = FlightReplica(self)
+
+        # Подсказки аэропортов и номеров рейсов для автодополнения
+        self.flight_autocomplete = FlightAutocompleteIndex(self.flight_replica)
+
+        # Индексы поиска рейсов (вылет, прилет, маршрут, дата, номер)
+        self.flight_search = FlightSearchIndex(self.flight_replica)
+
+        # Расписание для поиска маршрутов с пересадками
+        self.itineraries = ItineraryIndex(self.flight_replica)
+
+        # Общее табло /расписание_рейсов (пересборка с задержкой после изменений)
+        self.schedule_board = ScheduleBoard(self.flight_replica)
+
+        # Очередь напоминаний подписчикам (запускается когом рейсов)
+        self.reminders = ReminderQueue(self)
+        self._subscription_tasks: set = set()
+
+        # Отложенная запись телеметрии команд и ошибок
+        self.telemetry = TelemetryBuffer(self)
+
+        # Общий снимок статистики (статус бота, get_bot_info, админ-панель)
+        self.stats_snapshot = StatsSnapshot(self._load_stats)
+        self.flight_replica.add_listener(self._on_flight_change)
+
     async def initialize(self):
         """Инициализация данных"""
         logger.info("📊 Инициализация данных...")
 
+        self.telemetry.start()
+
+        # Запускаем реплику активных рейсов
+        try:
+            await self.flight_replica.start()
+        except Exception as e:
+            logger.error(f"Ошибка запуска реплики рейсов: {e}")
+
         # Загружаем статистику
         await self.refresh_stats()
 
         # Загружаем кэшированные данные
         await self.cache_frequent_data()
 
+        # Строим индекс участников авиакомпаний
+        try:
+            members = await self.build_member_index()
+            logger.info(f"👥 Индекс участников авиакомпаний: {members} пользователей")
+        except Exception as e:
+            logger.error(f"Ошибка построения индекса участников: {e}")
+
         logger.info(f"✅ Данные инициализированы: {len(self.collections)} коллекций")
 
-    async def refresh_stats(self):
-        """Обновление статистики"""
+    async def refresh_stats(self, force: bool = False):
+        """Обновление статистики из общего снимка"""
         try:
-            tasks = [
-                self._count_documents('airlines'),
-                self._count_documents('flights'),
-                self._count_active_flights(),
-                self._count_documents('users'),
-                self._count_documents('guilds'),
-                self._count_open_tickets(),
-                self._count_documents('commands'),
-                self._count_documents('errors')
-            ]
-
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Обновляем статистику
-            self.stats.update({
-                'total_airlines': results[0] if not isinstance(results[0], Exception) else 0,
-                'total_flights': results[1] if not isinstance(results[1], Exception) else 0,
-                'active_flights': results[2] if not isinstance(results[2], Exception) else 0,
-                'total_users': results[3] if not isinstance(results[3], Exception) else 0,
-                'total_guilds': results[4] if not isinstance(results[4], Exception) else 0,
-                'open_tickets': results[5] if not isinstance(results[5], Exception) else 0,
-                'command_count': results[6] if not isinstance(results[6], Exception) else 0,
-                'error_count': results[7] if not isinstance(results[7], Exception) else 0
-            })
+            if force:
+                snapshot = await self.stats_snapshot.refresh()
+            else:
+                snapshot = await self.stats_snapshot.get()
+            self.stats.update(snapshot)
 
             # Сохраняем статистику в Firebase
             await self._save_stats_to_firebase()
@@ -519,11 +550,41 @@ class BotData:
         except Exception as e:
             logger.error(f"Ошибка обновления статистики: {e}")
 
+    async def _load_stats(self) -> Dict[str, Any]:
+        """Загрузка снимка статистики aggregation-запросами"""
+        tasks = [
+            self._count_documents('airlines'),
+            self._count_documents('flights'),
+            self._count_active_flights(),
+            self._count_documents('users'),
+            self._count_documents('guilds'),
+            self._count_open_tickets(),
+            self._count_documents('commands'),
+            self._count_documents('errors'),
+            self._count_documents('partners'),
+            self._count_pending_applications()
+        ]
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        keys = [
+            'total_airlines', 'total_flights', 'active_flights', 'total_users',
+            'total_guilds', 'open_tickets', 'command_count', 'error_count',
+            'total_partners', 'pending_applications'
+        ]
+        return {
+            key: result if not isinstance(result, Exception) else 0
+            for key, result in zip(keys, results)
+        }
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        # Число активных рейсов известно из реплики без запросов
+        if self.flight_replica.ready:
+            self.stats_snapshot.set('active_flights', len(self.flight_replica))
+
     async def _count_documents(self, collection_name: str) -> int:
         """Подсчет документов в коллекции"""
         try:
-            docs = self.collections[collection_name].count().get()
-            return docs[0][0].value if docs else 0
+            return await self.count(self.collections[collection_name])
         except Exception as e:
             logger.error(f"Ошибка подсчета документов в {collection_name}: {e}")
             return 0
@@ -531,12 +592,11 @@ class BotData:
     async def _count_active_flights(self) -> int:
         """Подсчет активных рейсов"""
         try:
-            now = datetime.now()
-            today_start = datetime(now.year, now.month, now.day)
+            if self.flight_replica.ready:
+                return len(self.flight_replica)
 
-            query = self.collections['flights'].where('departure_time', '>=', today_start)
-            docs = query.count().get()
-            return docs[0][0].value if docs else 0
+            query = self.collections['flights'].where('status', 'in', list(FlightReplica.ACTIVE_STATUSES))
+            return await self.count(query)
         except Exception as e:
             logger.error(f"Ошибка подсчета активных рейсов: {e}")
             return 0
@@ -545,18 +605,36 @@ class BotData:
         """Подсчет открытых тикетов"""
         try:
             query = self.collections['support_tickets'].where('status', '==', 'open')
-            docs = query.count().get()
-            return docs[0][0].value if docs else 0
+            return await self.count(query)
         except Exception as e:
             logger.error(f"Ошибка подсчета открытых тикетов: {e}")
             return 0
 
+    async def _count_pending_applications(self) -> int:
+        """Подсчет заявок авиакомпаний на модерации"""
+        try:
+            query = self.collections['airline_applications'].where('status', '==', 'pending')
+            return await self.count(query)
+        except Exception as e:
+            logger.error(f"Ошибка подсчета заявок на модерации: {e}")
+            return 0
+
+    async def create_flight(self, flight_data: Dict) -> str:
+        flight_id = await super().create_flight(flight_data)
+        self.stats_snapshot.adjust('total_flights')
+        return flight_id
+
+    async def create_airline(self, airline_data: Dict) -> str:
+        airline_id = await super().create_airline(airline_data)
+        self.stats_snapshot.adjust('total_airlines')
+        return airline_id
+
     async def _save_stats_to_firebase(self):
         """Сохранение статистики в Firebase"""
         try:
-            stats_ref = self.collections['stats'].document('bot_stats')
-            await asyncio.to_thread(
-                stats_ref.set,
+            await self.set_document(
+                'stats',
+                'bot_stats',
                 {
                     **self.stats,
                     'last_updated': datetime.now(),
@@ -572,20 +650,18 @@ class BotData:
         try:
             # Кэшируем активные авиакомпании
             # Используем list() чтобы сразу получить данные и избежать StreamGenerator ошибки
-            active_airlines_query = await asyncio.to_thread(
-                lambda: list(self.collections['airlines'].where('active', '==', True).limit(50).stream())
+            active_airlines_query = await self.stream(
+                self.collections['airlines'].where('active', '==', True).limit(50)
             )
             airlines = [doc.to_dict() for doc in active_airlines_query]
 
             self._cache['active_airlines'] = airlines
             self._cache_timestamps['active_airlines'] = datetime.now()
 
-            # Кэшируем популярные рейсы
-            # Исправлено: убрали асинхронный цикл для StreamGenerator
-            popular_flights_query = await asyncio.to_thread(
-                lambda: list(self.collections['flights'].order_by('bookings', direction=firestore.Query.DESCENDING).limit(20).stream())
-            )
-            flights = [doc.to_dict() for doc in popular_flights_query]
+            # Кэшируем популярные рейсы из реплики
+            active = await self.get_active_flights()
+            active.sort(key=lambda x: x[1].get('subscriptions', 0), reverse=True)
+            flights = [data for _, data in active[:20]]
 
             self._cache['popular_flights'] = flights
             self._cache_timestamps['popular_flights'] = datetime.now()
@@ -595,6 +671,63 @@ class BotData:
         except Exception as e:
             logger.error(f"Ошибка кэширования данных: {e}")
 
+    async def get_active_flights(self, statuses=None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Активные рейсы [(id, data)] по времени вылета - из реплики, если она готова"""
+        if self.flight_replica.ready:
+            return self.flight_replica.active_flights(statuses)
+
+        statuses = list(statuses or FlightReplica.ACTIVE_STATUSES)
+        docs = await self.fetch(self.collections['flights'].where('status', 'in', statuses))
+        flights = [(doc.id, doc.to_dict()) for doc in docs]
+        flights.sort(key=lambda x: x[1].get('departure_datetime', ''))
+        return flights
+
+    async def search_flights(self, date: Optional[str] = None, departure: Optional[str] = None,
+                             arrival: Optional[str] = None, flight_number: Optional[str] = None
+                             ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Поиск рейсов для /поиск по индексам реплики (по времени вылета)"""
+        if self.flight_replica.ready:
+            return self.flight_search.search(date, departure, arrival, flight_number)
+
+        # Реплика еще не готова - один запрос и фильтр в памяти
+        flights = await self.get_active_flights(FlightSearchIndex.SEARCHABLE_STATUSES)
+        return [
+            (flight_id, flight_data) for flight_id, flight_data in flights
+            if FlightSearchIndex.matches(flight_data, date, departure, arrival, flight_number)
+        ]
+
+    async def add_subscription(self, user_id: str, flight_id: str, username: str = None) -> Optional[str]:
+        """Подписка на рейс: напоминания в очередь и счетчик подписок авиакомпании.
+
+        Напоминания и статистика записываются в фоне - ответ пользователю
+        ждет только создания подписки.
+        """
+        subscription_id = await super().add_subscription(user_id, flight_id, username)
+        if not subscription_id:
+            return None
+
+        task = asyncio.ensure_future(self._process_subscription(subscription_id, user_id, flight_id))
+        self._subscription_tasks.add(task)
+        task.add_done_callback(self._subscription_tasks.discard)
+        return subscription_id
+
+    async def _process_subscription(self, subscription_id: str, user_id: str, flight_id: str):
+        try:
+            flight_data = self.flight_replica.get(flight_id)
+            if flight_data is None:
+                flight_doc = await self.get_document('flights', flight_id)
+                flight_data = flight_doc.to_dict() if flight_doc.exists else None
+
+            if flight_data:
+                writes = [self.reminders.schedule_subscription(
+                    subscription_id, user_id, flight_id, flight_data, DEFAULT_NOTIFICATIONS
+                )]
+                if flight_data.get('airline_id'):
+                    writes.append(self.bump_airline_stats(flight_data['airline_id'], subscriptions=1))
+                await asyncio.gather(*writes)
+        except Exception as e:
+            logger.error(f"Ошибка обработки новой подписки {subscription_id}: {e}")
+
     def get_cached(self, key: str, max_age: int = 300):
         """Получение данных из кэша"""
         if key not in self._cache:
@@ -1313,13 +1446,23 @@ class AviasalesBot(commands.Bot):
             'memory_usage': self._get_memory_usage()
         }
 
+        # Внешние API аэропортов: открытая цепь - деградация, а не отказ бота
+        airport_apis = {}
+        airlines_cog = self.get_cog('Airlines')
+        airport_service = getattr(airlines_cog, 'airport_service', None)
+        if airport_service and hasattr(airport_service, 'api_health'):
+            airport_apis = airport_service.api_health()
+
         status = 'healthy'
         if not all(checks.values()):
             status = 'unhealthy'
+        elif any(api['state'] != 'closed' for api in airport_apis.values()):
+            status = 'degraded'
 
         return {
             'status': status,
             'checks': checks,
+            'airport_apis': airport_apis,
             'timestamp': datetime.now()
         }
 
@@ -1394,22 +1537,20 @@ class AviasalesBot(commands.Bot):
         self.logger.info(f"✅ Команда выполнена: /{ctx.command.name} "
                         f"пользователем {ctx.author} в {ctx.guild.name if ctx.guild else 'DM'}")
 
-        # Сохраняем в Firebase
+        # Сохраняем в Firebase (пакетно, через буфер телеметрии)
         if self.data:
-            try:
-                await asyncio.to_thread(
-                    self.data.collections['commands'].add,
-                    {
-                        'user_id': str(ctx.author.id),
-                        'command': ctx.command.name,
-                        'guild_id': str(ctx.guild.id) if ctx.guild else None,
-                        'channel_id': str(ctx.channel.id),
-                        'timestamp': datetime.now(),
-                        'success': True
-                    }
-                )
-            except Exception as e:
-                self.logger.error(f"Ошибка сохранения команды в Firebase: {e}")
+            self.data.stats_snapshot.adjust('command_count')
+            self.data.telemetry.record(
+                'commands',
+                {
+                    'user_id': str(ctx.author.id),
+                    'command': ctx.command.name,
+                    'guild_id': str(ctx.guild.id) if ctx.guild else None,
+                    'channel_id': str(ctx.channel.id),
+                    'timestamp': datetime.now(),
+                    'success': True
+                }
+            )
 
     async def on_command_error(self, ctx, error):
         """Обработка ошибок команд"""
@@ -1450,10 +1591,8 @@ class AviasalesBot(commands.Bot):
                     'channel_id': str(ctx.channel.id)
                 }
 
-                await asyncio.to_thread(
-                    self.data.collections['errors'].add,
-                    error_data
-                )
+                self.data.stats_snapshot.adjust('error_count')
+                self.data.telemetry.record('errors', error_data)
             except Exception as e:
                 self.logger.error(f"Ошибка сохранения ошибки в Firebase: {e}")
 
@@ -1525,6 +1664,20 @@ class AviasalesBot(commands.Bot):
         # Сохраняем финальную статистику
         await self._save_final_stats()
 
+        # Сбрасываем накопленную телеметрию
+        if self.data:
+            try:
+                await self.data.telemetry.close()
+            except Exception as e:
+                self.logger.error(f"Ошибка сброса телеметрии: {e}")
+
+        # Останавливаем пул потоков Firestore
+        if self.data:
+            self.data.flight_replica.stop()
+            self.data.schedule_board.close()
+            self.data.reminders.stop()
+            self.data.close()
+
         # Закрываем бота
         await super().close()
 
@@ -1544,10 +1697,7 @@ class AviasalesBot(commands.Bot):
                     'shutdown_time': datetime.now()
                 }
 
-                await asyncio.to_thread(
-                    self.data.collections['stats'].document('shutdown_stats').set,
-                    final_stats
-                )
+                await self.data.set_document('stats', 'shutdown_stats', final_stats)
         except Exception as e:
             self.logger.error(f"Ошибка сохранения финальной статистики: {e}")
 
@@ -1558,6 +1708,7 @@ class AviasalesBot(commands.Bot):
             'uptime': str(self.uptime) if self.uptime else '0:00:00',
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'stats': self.stats.copy(),
+            'data_stats': self.data.stats_snapshot.peek() if self.data else {},
             'version': '2.0.0',
             'maintenance_mode': self.maintenance_mode,
             'latency': round(self.latency * 1000, 2),
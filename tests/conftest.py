@@ -0,0 +1,99 @@
+import csv
+import random
+import string
+
+import pytest
+
+from utils.airport_db import AirportDatabase
+
+CSV_FIELDS = ['ident', 'type', 'name', 'latitude_deg', 'longitude_deg', 'iso_country',
+              'municipality', 'gps_code', 'icao_code', 'iata_code', 'keywords']
+TYPES = ['large_airport', 'medium_airport', 'small_airport']
+
+
+def _code(number: int, width: int) -> str:
+    letters = []
+    for _ in range(width):
+        number, digit = divmod(number, 26)
+        letters.append(string.ascii_uppercase[digit])
+    return ''.join(reversed(letters))
+
+
+def synthetic_airports(count: int = 600, seed: int = 7):
+    """Строки CSV OurAirports: случайные координаты, полюса, 180-й меридиан, (0, 0), без IATA"""
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        if number % 10 == 0:
+            latitude, longitude = rng.uniform(-90, 90), rng.choice([-1, 1]) * rng.uniform(178, 180)
+        elif number % 10 == 1:
+            latitude, longitude = rng.choice([-1, 1]) * rng.uniform(85, 90), rng.uniform(-180, 180)
+        else:
+            latitude, longitude = rng.uniform(-70, 70), rng.uniform(-180, 180)
+        if number % 97 == 0:
+            latitude = longitude = 0.0
+
+        icao = _code(number + 1000, 4)
+        rows.append({
+            'ident': icao,
+            'type': TYPES[number % 3],
+            'name': f"Аэропорт {number} International",
+            'latitude_deg': repr(latitude),
+            'longitude_deg': repr(longitude),
+            'iso_country': rng.choice(['RU', 'US', 'DE', 'JP']),
+            'municipality': f"Город {number}",
+            'gps_code': icao,
+            'icao_code': icao,
+            # Каждый седьмой аэропорт - только с ICAO
+            'iata_code': '' if number % 7 == 0 else _code(number, 3),
+            'keywords': f"ключ{number}"
+        })
+
+    # Не аэропорт - пропускается при разборе
+    rows.append({**rows[-1], 'ident': 'HELI', 'type': 'heliport', 'icao_code': 'HELI', 'iata_code': 'HLP'})
+    return rows
+
+
+class Replica:
+    """Минимальная реплика рейсов: словарь и слушатели изменений"""
+
+    def __init__(self):
+        self.flights = {}
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def get(self, flight_id):
+        return self.flights.get(flight_id)
+
+    def put(self, flight_id, flight_data):
+        change_type = 'MODIFIED' if flight_id in self.flights else 'ADDED'
+        self.flights[flight_id] = flight_data
+        for callback in self.listeners:
+            callback(change_type, flight_id, flight_data)
+
+    def remove(self, flight_id):
+        flight_data = self.flights.pop(flight_id)
+        for callback in self.listeners:
+            callback('REMOVED', flight_id, flight_data)
+
+
+@pytest.fixture
+def replica():
+    return Replica()
+
+
+@pytest.fixture(scope='session')
+def airports_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('airports') / 'airports.csv'
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(synthetic_airports())
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def airport_db(airports_csv):
+    return AirportDatabase.from_file(airports_csv)
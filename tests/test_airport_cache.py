@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from utils import airport_cache
+from utils.airport_cache import AirportCache
+
+AIRPORT = {'name': 'Шереметьево', 'iata': 'SVO', 'icao': 'UUEE'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(airport_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = AirportCache(str(tmp_path / 'cache.sqlite3'), max_size=2,
+                         positive_ttl=100, negative_ttl=10)
+    yield cache
+    cache.close()
+
+
+def test_miss_then_hit(cache):
+    async def scenario():
+        assert await cache.get('code:SVO') == (False, None)
+        await cache.set('code:SVO', AIRPORT)
+        assert await cache.get('code:SVO') == (True, AIRPORT)
+
+    asyncio.run(scenario())
+    assert cache.stats['misses'] == 1
+    assert cache.stats['memory_hits'] == 1
+
+
+def test_negative_result_is_cached(cache):
+    async def scenario():
+        await cache.set('name:нигде', None)
+        return await cache.get('name:нигде')
+
+    # Закэшированное "не найдено" отличается от промаха флагом found
+    assert asyncio.run(scenario()) == (True, None)
+    assert cache.stats['negative_hits'] == 1
+    assert cache.stats['misses'] == 0
+
+
+def test_negative_ttl_is_shorter(cache, clock):
+    async def scenario():
+        await cache.set('code:SVO', AIRPORT)
+        await cache.set('name:нигде', None)
+        clock[0] += 11
+        return await cache.get('code:SVO'), await cache.get('name:нигде')
+
+    assert asyncio.run(scenario()) == ((True, AIRPORT), (False, None))
+
+
+def test_positive_entry_expires(cache, clock):
+    async def scenario():
+        await cache.set('code:SVO', AIRPORT)
+        clock[0] += 99
+        fresh = await cache.get('code:SVO')
+        clock[0] += 2
+        return fresh, await cache.get('code:SVO')
+
+    assert asyncio.run(scenario()) == ((True, AIRPORT), (False, None))
+    # Просрочена и запись в памяти, и запись на диске
+    assert cache.stats['expired'] == 2
+
+
+def test_disk_survives_restart(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite3')
+
+    async def scenario():
+        first = AirportCache(path)
+        await first.set('code:SVO', AIRPORT)
+        await first.set('name:нигде', None)
+        first.close()
+
+        second = AirportCache(path)
+        try:
+            return await second.get('code:SVO'), await second.get('name:нигде'), second.stats
+        finally:
+            second.close()
+
+    airport, missing, stats = asyncio.run(scenario())
+    assert airport == (True, AIRPORT)
+    assert missing == (True, None)
+    assert stats['disk_hits'] == 2
+    assert stats['negative_hits'] == 1
+
+
+def test_memory_is_lru_bounded(cache):
+    async def scenario():
+        await cache.set('a', {'iata': 'AAA'})
+        await cache.set('b', {'iata': 'BBB'})
+        await cache.get('a')
+        await cache.set('c', {'iata': 'CCC'})
+
+    asyncio.run(scenario())
+    assert len(cache) == 2
+    assert list(cache._memory) == ['a', 'c']
+    assert cache.stats['evictions'] == 1
+
+
+def test_purge_expired(cache, clock):
+    async def scenario():
+        await cache.set('code:SVO', AIRPORT)
+        await cache.set('name:нигде', None)
+        clock[0] += 50
+        await cache.purge_expired()
+
+    asyncio.run(scenario())
+    assert cache._disk_get('name:нигде') is None
+    assert cache._disk_get('code:SVO') is not None
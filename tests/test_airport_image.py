@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from utils.airport_image import (
+    HEADER, IMAGE_MAGIC, MappedAirportTable, MappedSearchIndex, MappedSpatialIndex,
+    open_airport_table, write_airport_image
+)
+
+
+@pytest.fixture
+def image_path(tmp_path, airport_db):
+    path = str(tmp_path / 'airports.bin')
+    write_airport_image(airport_db, path)
+    return path
+
+
+@pytest.fixture
+def table(image_path):
+    table = MappedAirportTable(image_path)
+    yield table
+    table.close()
+
+
+def test_records_round_trip(airport_db, table):
+    assert len(table) == len(airport_db) == 600
+    for index in range(len(airport_db)):
+        assert table.record(index) == airport_db.record(index)
+
+
+def test_columns_round_trip(airport_db, table):
+    for column in ('iata_codes', 'icao_codes', 'countries', 'types', 'latitudes',
+                   'longitudes', 'names', 'cities', 'keywords'):
+        assert list(getattr(table, column)) == list(getattr(airport_db, column)), column
+
+
+def test_code_indexes(airport_db, table):
+    assert len(table.by_iata) == len(airport_db.by_iata)
+    assert len(table.by_icao) == len(airport_db.by_icao)
+    for code, index in airport_db.by_iata.items():
+        assert table.by_iata.get(code) == index
+        assert code in table.by_iata
+    for code, index in airport_db.by_icao.items():
+        assert table.by_icao.get(code) == index
+
+    assert table.by_iata.get('HLP') is None
+    assert 'HELI' not in table.by_icao
+    assert table.by_iata.get('ZZZZ', -1) == -1
+
+
+def test_get_by_code(airport_db, table):
+    for code in ('AAB', 'ABMN', 'abd', 'NOPE', ''):
+        assert table.get_by_code(code) == airport_db.get_by_code(code)
+
+
+def test_row_out_of_range(table):
+    with pytest.raises(IndexError):
+        table.record(len(table))
+
+
+def test_indexes_on_mapped_table(airport_db, table):
+    table.build_indexes()
+    assert len(table.spatial_index) == len(airport_db.spatial_index)
+    assert table.search('Город 42') == airport_db.search('Город 42')
+    assert table.nearest(55.75, 37.62, 5) == airport_db.nearest(55.75, 37.62, 5)
+
+
+def test_indexes_are_read_from_image(airport_db, table):
+    table.build_indexes()
+    assert isinstance(table.search_index, MappedSearchIndex)
+    assert isinstance(table.spatial_index, MappedSpatialIndex)
+    assert len(table.search_index) == len(airport_db.search_index)
+
+    for query in ('Город 1', 'город 42', 'Аэропорт 5', 'AAB', 'abmn', 'гор', 'xyz', ''):
+        assert table.search(query, limit=10) == airport_db.search(query, limit=10), query
+        assert table.search_index.resolve(query) == airport_db.search_index.resolve(query), query
+
+    for latitude, longitude in ((55.75, 37.62), (-33.9, 151.2), (89.9, 179.9), (0.0, -179.9)):
+        assert table.nearest(latitude, longitude, 10) == airport_db.nearest(latitude, longitude, 10)
+        assert (table.spatial_index.within_radius(latitude, longitude, 800)
+                == airport_db.spatial_index.within_radius(latitude, longitude, 800))
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'broken.bin'
+    path.write_bytes(b'\0' * HEADER.size)
+    with pytest.raises(ValueError):
+        MappedAirportTable(str(path))
+
+
+def test_open_rebuilds_stale_image(tmp_path, airports_csv):
+    image_path = str(tmp_path / 'airports.bin')
+
+    table = open_airport_table(airports_csv, image_path)
+    assert len(table) == 600
+    table.close()
+    built = os.path.getmtime(image_path)
+
+    # Образ свежее CSV - не пересобирается
+    table = open_airport_table(airports_csv, image_path)
+    table.close()
+    assert os.path.getmtime(image_path) == built
+
+    # CSV обновился - образ собирается заново
+    csv_mtime = os.path.getmtime(airports_csv)
+    os.utime(image_path, (csv_mtime - 10, csv_mtime - 10))
+    table = open_airport_table(airports_csv, image_path)
+    table.close()
+    assert os.path.getmtime(image_path) >= csv_mtime
+
+
+def test_open_rebuilds_old_format(tmp_path, airports_csv):
+    image_path = str(tmp_path / 'airports.bin')
+    open_airport_table(airports_csv, image_path).close()
+
+    # Образ прежней версии формата свежее CSV, но все равно пересобирается
+    with open(image_path, 'r+b') as f:
+        f.write(HEADER.pack(IMAGE_MAGIC, 1, 0, 0, 0, 0, 0, 0, 0, 0.0))
+    table = open_airport_table(airports_csv, image_path)
+    assert len(table) == 600
+    table.close()
@@ -0,0 +1,129 @@
+import pytest
+
+from utils.airport_db import AirportDatabase
+from utils.airport_search import AirportSearchIndex, normalize
+
+AIRPORTS = [
+    # название, город, страна, IATA, ICAO, широта, долгота, ключевые слова, тип
+    ('Sheremetyevo International Airport', 'Moscow', 'RU', 'SVO', 'UUEE', 55.97, 37.41,
+     'Шереметьево', 'large_airport'),
+    ('Domodedovo International Airport', 'Moscow', 'RU', 'DME', 'UUDD', 55.41, 37.91,
+     'Домодедово', 'large_airport'),
+    ('Vnukovo International Airport', 'Moscow', 'RU', 'VKO', 'UUWW', 55.59, 37.26,
+     'Внуково', 'large_airport'),
+    ('Pulkovo Airport', 'St. Petersburg', 'RU', 'LED', 'ULLI', 59.80, 30.26,
+     'Пулково', 'large_airport'),
+    ('Koltsovo Airport', 'Yekaterinburg', 'RU', 'SVX', 'USSS', 56.74, 60.80,
+     'Кольцово', 'large_airport'),
+    ('Mosul International Airport', 'Mosul', 'IQ', 'OSM', 'ORBM', 36.31, 43.15,
+     '', 'medium_airport'),
+    ('Heathrow Airport', 'London', 'GB', 'LHR', 'EGLL', 51.47, -0.45, 'LON', 'large_airport'),
+    ('Gatwick Airport', 'London', 'GB', 'LGW', 'EGKK', 51.15, -0.19, 'LON', 'large_airport'),
+    # Без IATA - в нечеткий индекс не попадает
+    ('Pulkovo Heliport', 'St. Petersburg', 'RU', '', 'ZZPH', 59.81, 30.27, '', 'small_airport'),
+]
+SVO, DME, VKO, LED, SVX, OSM, LHR, LGW, HELIPORT = range(len(AIRPORTS))
+
+
+@pytest.fixture(scope='module')
+def index():
+    db = AirportDatabase()
+    for name, city, country, iata, icao, latitude, longitude, keywords, airport_type in AIRPORTS:
+        db._append(name, city, country, iata, icao, latitude, longitude, keywords, airport_type)
+    return AirportSearchIndex(db)
+
+
+def ranked(index, query, limit=5):
+    return [row for _, row in index.search(query, limit)]
+
+
+@pytest.mark.parametrize('text, tokens', [
+    ('Москва', ['moscow']),
+    ('Санкт-Петербург', ['st', 'petersburg']),
+    ('Екатеринбург', ['yekaterinburg']),
+    ('Хитроу', ['heathrow']),
+    ('Международный аэропорт', []),
+    ('Zürich Airport', ['zurich']),
+])
+def test_normalize_transliterates_exonyms(text, tokens):
+    assert normalize(text) == tokens
+
+
+def test_skips_rows_without_both_codes(index):
+    assert len(index) == len(AIRPORTS) - 1
+    assert HELIPORT not in ranked(index, 'Pulkovo Heliport')
+
+
+@pytest.mark.parametrize('query, row', [
+    ('Шереметьево', SVO),
+    ('Sheremetyevo', SVO),
+    ('Домодедово', DME),
+    ('Пулково', LED),
+    ('Санкт-Петербург', LED),
+    ('Екатеринбург', SVX),
+    ('Хитроу', LHR),
+    ('Moscow Domodedovo', DME),
+])
+def test_resolves_unambiguous_names(index, query, row):
+    assert index.resolve(query) == row
+
+
+@pytest.mark.parametrize('query', ['SVO', 'uuee', 'led'])
+def test_exact_code_comes_first(index, query):
+    row = index.resolve(query)
+    assert row is not None
+    assert ranked(index, query)[0] == row
+
+
+def test_city_with_several_airports_is_ambiguous(index):
+    # Три аэропорта Москвы: выбирает пользователь
+    assert set(ranked(index, 'Москва', limit=3)) == {SVO, DME, VKO}
+    assert index.resolve('Москва') is None
+    assert index.resolve('Лондон') is None
+
+
+def test_exonym_beats_similar_spelling(index):
+    # Без замены "moskva" -> "moscow" ближе всего оказался бы Мосул
+    assert OSM not in ranked(index, 'Москва', limit=3)
+
+
+def test_weak_match_is_not_resolved(index):
+    scores = index.search('Моск', limit=1)
+    assert scores and scores[0][0] < AirportSearchIndex.MIN_CONFIDENCE
+    assert index.resolve('Моск') is None
+    assert index.resolve('Владивосток') is None
+
+
+def test_prefix_finds_name_being_typed(index):
+    assert ranked(index, 'шере')[0] == SVO
+    assert ranked(index, 'pulk')[0] == LED
+    assert ranked(index, 'кольц')[0] == SVX
+
+
+def test_exact_token_ranks_above_prefix_and_trigrams(index):
+    scores = dict((row, score) for score, row in index.search('Vnukovo Moscow', limit=5))
+    assert max(scores, key=scores.get) == VKO
+    # Совпадает только "moscow" - на 0.5 за токен меньше
+    assert scores[VKO] - scores[SVO] > AirportSearchIndex.MIN_MARGIN
+
+
+def test_confidence_and_margin_thresholds(index, monkeypatch):
+    (best, _), (second, _) = index.search('Moscow Domodedovo', limit=2)
+    assert best >= AirportSearchIndex.MIN_CONFIDENCE
+    assert best - second >= AirportSearchIndex.MIN_MARGIN
+    assert index.resolve('Moscow Domodedovo') == DME
+
+    # Оценка ниже порога уверенности
+    monkeypatch.setattr(index, 'MIN_CONFIDENCE', best + 0.01)
+    assert index.resolve('Moscow Domodedovo') is None
+    monkeypatch.undo()
+
+    # Второй вариант слишком близко
+    monkeypatch.setattr(index, 'MIN_MARGIN', best - second + 0.01)
+    assert index.resolve('Moscow Domodedovo') is None
+
+
+def test_empty_and_unknown_queries(index):
+    assert index.search('') == []
+    assert index.search('!!!') == []
+    assert index.resolve('Qwxyzzy') is None
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from cogs.airport_service import AirportService  # noqa: E402
+from utils.airport_cache import AirportCache  # noqa: E402
+
+AIRPORT = {'name': 'Шереметьево', 'iata': 'SVO', 'icao': 'UUEE'}
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = AirportService(bot=None)
+    service.cache = AirportCache(str(tmp_path / 'cache.sqlite3'))
+    yield service
+    service.cache.close()
+
+
+def slow_api(service, monkeypatch, result=AIRPORT, error=None):
+    """Подменить запрос к API: отвечает через паузу, считает вызовы"""
+    calls = []
+
+    async def query(endpoint, code, code_type):
+        calls.append((endpoint['name'], code))
+        await asyncio.sleep(0.01)
+        if error:
+            raise error
+        return result
+
+    monkeypatch.setattr(service, '_query_api_by_code', query)
+    return calls
+
+
+def test_concurrent_lookups_share_one_request(service, monkeypatch):
+    calls = slow_api(service, monkeypatch)
+
+    async def scenario():
+        return await asyncio.gather(*(service.search_airport_by_code('svo') for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [AIRPORT] * 5
+    # Один поиск - по одному запросу к каждому API, остальные ждут его
+    assert len(calls) == len(service.api_endpoints)
+    assert service.lookup_stats['lookups'] == 1
+    assert service.lookup_stats['coalesced'] == 4
+    assert service._inflight == {}
+
+
+def test_different_keys_are_not_coalesced(service, monkeypatch):
+    slow_api(service, monkeypatch)
+
+    async def scenario():
+        await asyncio.gather(service.search_airport_by_code('SVO'), service.search_airport_by_code('UUEE'))
+
+    asyncio.run(scenario())
+    assert service.lookup_stats['lookups'] == 2
+    assert service.lookup_stats['coalesced'] == 0
+
+
+def test_result_is_cached_after_lookup(service, monkeypatch):
+    calls = slow_api(service, monkeypatch)
+
+    async def scenario():
+        await service.search_airport_by_code('SVO')
+        first_calls = len(calls)
+        assert await service.search_airport_by_code('SVO') == AIRPORT
+        return first_calls
+
+    first_calls = asyncio.run(scenario())
+    assert len(calls) == first_calls
+
+
+def test_cancelled_waiter_does_not_cancel_lookup(service, monkeypatch):
+    slow_api(service, monkeypatch)
+
+    async def scenario():
+        first = asyncio.ensure_future(service.search_airport_by_code('SVO'))
+        second = asyncio.ensure_future(service.search_airport_by_code('SVO'))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == AIRPORT
+
+
+def test_failed_lookup_is_shared_and_not_cached(service, monkeypatch):
+    calls = slow_api(service, monkeypatch, error=RuntimeError('timeout'))
+
+    async def scenario():
+        results = await asyncio.gather(*(service.search_airport_by_code('QQQ') for _ in range(3)))
+        return results, await service.cache.get('code:QQQ')
+
+    results, cached = asyncio.run(scenario())
+    assert results == [None] * 3
+    assert len(calls) == len(service.api_endpoints)
+    # Ответ "не найдено" при ошибках API не кэшируется
+    assert cached == (False, None)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from utils.airport_spatial import MAX_DISTANCE_KM, AirportSpatialIndex
+from utils.route_geometry import great_circle_km
+
+_rng = random.Random(19)
+# Москва, (0, 0), полюса, обе стороны 180-го меридиана и случайные точки
+QUERIES = [(55.75, 37.62), (0.0, 0.0), (89.5, 10.0), (-89.9, -120.0), (10.0, 179.8), (-35.0, -179.9)] + [
+    (_rng.uniform(-90, 90), _rng.uniform(-180, 180)) for _ in range(20)
+]
+
+
+def brute_force(db, latitude, longitude, require_iata=True):
+    results = []
+    for index in range(len(db)):
+        if require_iata and not db.iata_codes[index]:
+            continue
+        if db.latitudes[index] == 0 and db.longitudes[index] == 0:
+            continue
+        distance = great_circle_km(latitude, longitude, db.latitudes[index], db.longitudes[index])
+        results.append((distance, index))
+    results.sort()
+    return results
+
+
+def test_size_skips_missing_iata_and_coordinates(airport_db):
+    assert len(AirportSpatialIndex(airport_db)) == len(brute_force(airport_db, 0, 0))
+    assert len(AirportSpatialIndex(airport_db, require_iata=False)) == len(brute_force(airport_db, 0, 0, False))
+
+
+@pytest.mark.parametrize('latitude,longitude', QUERIES)
+@pytest.mark.parametrize('radius_km', [50, 500, 2500, 9000])
+def test_within_radius_matches_brute_force(airport_db, latitude, longitude, radius_km):
+    expected = [hit for hit in brute_force(airport_db, latitude, longitude) if hit[0] <= radius_km]
+    assert airport_db.spatial_index.within_radius(latitude, longitude, radius_km) == expected
+
+
+@pytest.mark.parametrize('latitude,longitude', QUERIES)
+@pytest.mark.parametrize('k', [1, 5, 40])
+def test_nearest_matches_brute_force(airport_db, latitude, longitude, k):
+    expected = brute_force(airport_db, latitude, longitude)[:k]
+    assert airport_db.spatial_index.nearest(latitude, longitude, k) == expected
+
+
+def test_nearest_more_than_indexed(airport_db):
+    everything = brute_force(airport_db, 12.0, 34.0)
+    assert airport_db.spatial_index.nearest(12.0, 34.0, len(everything) + 10) == everything
+    assert airport_db.spatial_index.within_radius(12.0, 34.0, MAX_DISTANCE_KM * 2) == everything
@@ -0,0 +1,117 @@
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker('test', failure_threshold=3, error_rate_threshold=0.5,
+                          min_calls=10, reset_timeout=60)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        breaker.record_failure(10)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure(10)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats['opened'] == 1
+    assert breaker.stats['skipped'] == 1
+
+
+def test_success_resets_consecutive_failures(breaker):
+    for _ in range(3):
+        breaker.record_failure(10)
+        breaker.record_failure(10)
+        breaker.record_success(10)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # Подряд только одна ошибка, но в окне из 10 вызовов их 7
+    breaker.record_failure(10)
+    assert breaker.error_rate() == pytest.approx(0.7)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_error_rate_needs_min_calls(clock):
+    breaker = CircuitBreaker('test', failure_threshold=100, min_calls=10)
+    for _ in range(4):
+        breaker.record_failure(10)
+        breaker.record_success(10)
+    breaker.record_success(10)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # Десятый вызов: окно набрано, ошибок 5 из 10
+    breaker.record_failure(10)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure(10)
+
+    clock[0] += 59
+    assert not breaker.allow()
+    assert breaker.snapshot()['retry_in'] == pytest.approx(1)
+
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Пока пробный запрос не завершился, остальные пропускаются
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure(10)
+    clock[0] += 60
+    assert breaker.allow()
+
+    breaker.record_success(10)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.error_rate() == 0.0
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure(10)
+    clock[0] += 60
+    assert breaker.allow()
+
+    breaker.record_failure(10)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats['opened'] == 2
+    assert not breaker.allow()
+
+    # Таймаут отсчитывается заново от повторного размыкания
+    clock[0] += 60
+    assert breaker.allow()
+
+
+def test_released_probe_frees_slot(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure(10)
+    clock[0] += 60
+    assert breaker.allow()
+
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_latency_metrics(breaker):
+    for latency in (10, 60, 120, 300, 20000):
+        breaker.record_success(latency)
+    assert breaker.percentile(50) == 120
+    assert breaker.histogram() == [1, 1, 1, 1, 0, 0, 0, 0, 1]
@@ -0,0 +1,151 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.flight_index import FlightAutocompleteIndex, FlightSearchIndex
+
+START = datetime(2026, 5, 1, 6, 0)
+AIRPORTS = {'SVO': 'Шереметьево', 'LED': 'Пулково', 'KZN': 'Казань', 'AER': 'Сочи'}
+STATUSES = ['scheduled', 'boarding', 'delayed', 'departed', 'completed', 'cancelled']
+
+
+def make_flight(departure_code, arrival_code, minute, flight_number='SU100', status='scheduled'):
+    departure = START + timedelta(minutes=minute)
+    return {
+        'departure_code': departure_code,
+        'arrival_code': arrival_code,
+        'departure_airport': AIRPORTS.get(departure_code, 'Неизвестно'),
+        'arrival_airport': AIRPORTS.get(arrival_code, 'Неизвестно'),
+        'departure_datetime': departure.isoformat(),
+        'departure_date': departure.strftime("%d.%m.%Y"),
+        'flight_number': flight_number,
+        'status': status
+    }
+
+
+@pytest.fixture
+def search_index(replica):
+    return FlightSearchIndex(replica)
+
+
+@pytest.fixture
+def autocomplete(replica):
+    return FlightAutocompleteIndex(replica)
+
+
+def ids(results):
+    return [flight_id for flight_id, _ in results]
+
+
+def test_added_flights_are_searchable(replica, search_index):
+    replica.put('late', make_flight('SVO', 'LED', 120))
+    replica.put('early', make_flight('SVO', 'LED', 0))
+    replica.put('other', make_flight('KZN', 'AER', 60))
+
+    assert len(search_index) == 3
+    assert ids(search_index.search()) == ['early', 'other', 'late']
+    assert ids(search_index.search(departure='svo', arrival='led')) == ['early', 'late']
+    assert ids(search_index.search(arrival='AER')) == ['other']
+
+
+def test_modified_flight_moves_between_postings(replica, search_index):
+    replica.put('a', make_flight('SVO', 'LED', 0, flight_number='SU100'))
+    replica.put('a', make_flight('KZN', 'LED', 1500, flight_number='SU200'))
+
+    assert len(search_index) == 1
+    assert search_index.search(departure='SVO') == []
+    assert search_index.search(flight_number='SU100') == []
+    assert ids(search_index.search(departure='KZN', flight_number='su 200')) == ['a']
+    assert search_index.search(date=START.strftime("%d.%m.%Y")) == []
+    assert ids(search_index.search(date=(START + timedelta(days=1)).strftime("%d.%m.%Y"))) == ['a']
+
+
+def test_status_change_removes_and_restores(replica, search_index):
+    replica.put('a', make_flight('SVO', 'LED', 0))
+    replica.put('a', make_flight('SVO', 'LED', 0, status='departed'))
+    assert len(search_index) == 0
+    assert search_index.search() == []
+
+    replica.put('a', make_flight('SVO', 'LED', 0, status='delayed'))
+    assert ids(search_index.search(departure='SVO')) == ['a']
+
+
+def test_removed_flight_leaves_no_postings(replica, search_index):
+    replica.put('a', make_flight('SVO', 'LED', 0))
+    replica.put('b', make_flight('SVO', 'LED', 0))
+    replica.remove('a')
+    assert ids(search_index.search(departure='SVO')) == ['b']
+
+    replica.remove('b')
+    assert len(search_index) == 0
+    assert dict(search_index._postings) == {}
+
+
+def test_search_matches_brute_force_after_random_events(replica, search_index):
+    rng = random.Random(11)
+    codes = list(AIRPORTS)
+    for _ in range(400):
+        flight_id = f"f{rng.randrange(40)}"
+        if flight_id in replica.flights and rng.random() < 0.25:
+            replica.remove(flight_id)
+            continue
+        departure, arrival = rng.sample(codes, 2)
+        replica.put(flight_id, make_flight(departure, arrival, rng.randrange(3 * 1440),
+                                           flight_number=f"SU{rng.randrange(5)}",
+                                           status=rng.choice(STATUSES)))
+
+    dates = {flight['departure_date'] for flight in replica.flights.values()}
+    for filters in ({}, {'departure': 'SVO'}, {'arrival': 'LED'}, {'departure': 'KZN', 'arrival': 'AER'},
+                    {'flight_number': 'SU3'}, *({'date': date} for date in dates),
+                    {'date': min(dates), 'departure': 'LED', 'flight_number': 'SU1'}):
+        expected = sorted(
+            (flight['departure_datetime'], flight_id) for flight_id, flight in replica.flights.items()
+            if flight['status'] in FlightSearchIndex.SEARCHABLE_STATUSES
+            and FlightSearchIndex.matches(flight, **filters)
+        )
+        assert ids(search_index.search(**filters)) == [flight_id for _, flight_id in expected], filters
+
+
+def test_autocomplete_counts_follow_events(replica, autocomplete):
+    replica.put('a', make_flight('SVO', 'LED', 0, flight_number='SU100'))
+    replica.put('b', make_flight('SVO', 'KZN', 0, flight_number='SU102'))
+    replica.put('c', make_flight('LED', 'KZN', 0, flight_number='FV200'))
+
+    assert autocomplete.airports('') == [('SVO', 'Шереметьево', 2), ('LED', 'Пулково', 1)]
+    assert autocomplete.airports('', role='arrival') == [('KZN', 'Казань', 2), ('LED', 'Пулково', 1)]
+    assert autocomplete.flight_numbers('su') == [('SU100', 1), ('SU102', 1)]
+
+    replica.put('b', make_flight('SVO', 'KZN', 0, flight_number='SU102', status='cancelled'))
+    assert autocomplete.airports('') == [('LED', 'Пулково', 1), ('SVO', 'Шереметьево', 1)]
+    assert autocomplete.flight_numbers('SU1') == [('SU100', 1)]
+
+    replica.remove('a')
+    assert autocomplete.airports('') == [('LED', 'Пулково', 1)]
+    assert len(autocomplete) == 1
+
+
+def test_autocomplete_route_and_names(replica, autocomplete):
+    replica.put('a', make_flight('SVO', 'LED', 0))
+    replica.put('b', make_flight('KZN', 'LED', 0))
+    replica.put('c', make_flight('SVO', 'AER', 0))
+
+    # Подсказки связаны с уже выбранным концом маршрута
+    assert [code for code, _, _ in autocomplete.airports('', role='arrival', other='svo')] == ['AER', 'LED']
+    assert [code for code, _, _ in autocomplete.airports('', role='departure', other='LED')] == ['KZN', 'SVO']
+    # Поиск по названию аэропорта (кириллица и транслит)
+    assert [code for code, _, _ in autocomplete.airports('Пулк', role='arrival')] == ['LED']
+    assert [code for code, _, _ in autocomplete.airports('kaz')] == ['KZN']
+
+    # Аэропорт пропал из рейсов - название тоже забыто
+    replica.remove('b')
+    assert autocomplete.airport_name('KZN') is None
+    assert autocomplete.airport_name('LED') == 'Пулково'
+
+
+def test_modified_flight_number_updates_autocomplete(replica, autocomplete):
+    replica.put('a', make_flight('SVO', 'LED', 0, flight_number='SU100'))
+    replica.put('a', make_flight('SVO', 'AER', 0, flight_number='SU101'))
+
+    assert autocomplete.flight_numbers('SU') == [('SU101', 1)]
+    assert [code for code, _, _ in autocomplete.airports('', role='arrival')] == ['AER']
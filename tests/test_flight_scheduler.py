@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from utils.flight_scheduler import next_transition, parse_flight_datetime  # noqa: E402
+
+DEPARTURE = datetime(2026, 3, 14, 15, 30)
+
+
+def flight(**fields):
+    data = {
+        'status': 'scheduled',
+        'departure_datetime': DEPARTURE.isoformat(),
+        'departure_date': DEPARTURE.strftime("%d.%m.%Y"),
+        'flight_time': 90
+    }
+    data.update(fields)
+    return data
+
+
+def test_scheduled_boards_when_checkin_closes():
+    assert next_transition(flight(checkin_close='15:00')) == (datetime(2026, 3, 14, 15, 0), 'boarding')
+
+
+def test_scheduled_departs_without_checkin_close():
+    assert next_transition(flight()) == (DEPARTURE, 'departed')
+
+
+@pytest.mark.parametrize('checkin_close', ['15:30', '16:10', 'не указано'])
+def test_scheduled_ignores_late_or_invalid_checkin_close(checkin_close):
+    assert next_transition(flight(checkin_close=checkin_close)) == (DEPARTURE, 'departed')
+
+
+def test_boarding_departs_at_departure_time():
+    assert next_transition(flight(status='boarding', checkin_close='15:00')) == (DEPARTURE, 'departed')
+
+
+def test_departed_completes_after_flight_time():
+    assert next_transition(flight(status='departed')) == (DEPARTURE + timedelta(minutes=90), 'completed')
+
+
+def test_departed_counts_from_actual_departure():
+    actual = DEPARTURE + timedelta(minutes=25)
+    data = flight(status='departed', actual_departure=actual.isoformat())
+    assert next_transition(data) == (actual + timedelta(minutes=90), 'completed')
+
+
+def test_departed_defaults_to_two_hours():
+    data = flight(status='departed')
+    del data['flight_time']
+    assert next_transition(data) == (DEPARTURE + timedelta(minutes=120), 'completed')
+
+
+def test_departed_accepts_flight_time_as_string():
+    data = flight(status='departed', flight_time='45')
+    assert next_transition(data) == (DEPARTURE + timedelta(minutes=45), 'completed')
+
+
+@pytest.mark.parametrize('flight_time', ['полтора часа', None, '', [90]])
+def test_departed_ignores_invalid_flight_time(flight_time):
+    data = flight(status='departed', flight_time=flight_time)
+    assert next_transition(data) == (DEPARTURE + timedelta(minutes=120), 'completed')
+
+
+@pytest.mark.parametrize('status', ['completed', 'cancelled', 'delayed', None])
+def test_no_transition_for_other_statuses(status):
+    assert next_transition(flight(status=status)) is None
+
+
+def test_no_transition_without_departure_time():
+    assert next_transition(flight(departure_datetime='')) is None
+    assert next_transition(flight(departure_datetime='вчера')) is None
+
+
+def test_parse_flight_datetime_converts_aware_to_local():
+    parsed = parse_flight_datetime('2026-03-14T12:30:00Z')
+    expected = datetime.fromisoformat('2026-03-14T12:30:00+00:00').astimezone().replace(tzinfo=None)
+    assert parsed == expected
+    assert parsed.tzinfo is None
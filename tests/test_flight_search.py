@@ -0,0 +1,228 @@
+import asyncio
+import functools
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.flight_search import DESCENDING, AirlineFlightSearch
+
+NOW = datetime.now().replace(microsecond=0)
+AIRPORTS = ['SVO', 'LED', 'KZN']
+
+
+class Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Query:
+    """Запрос Firestore в памяти: where/order_by, исполняется в Database.fetch_page"""
+
+    OPS = {
+        '==': lambda a, b: a == b,
+        '>=': lambda a, b: a >= b,
+        '<': lambda a, b: a < b
+    }
+
+    def __init__(self, docs, filters=(), orders=()):
+        self.docs = docs
+        self.filters = tuple(filters)
+        self.orders = tuple(orders)
+
+    def where(self, field, op, value):
+        return Query(self.docs, self.filters + ((field, op, value),), self.orders)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return Query(self.docs, self.filters, self.orders + ((field, direction),))
+
+    def run(self):
+        docs = [doc for doc in self.docs
+                if all(self.OPS[op](doc._data[field], value) for field, op, value in self.filters)]
+        for field, direction in reversed(self.orders):
+            docs.sort(key=lambda doc: doc._data[field], reverse=direction == DESCENDING)
+        return docs
+
+
+class Database:
+    def __init__(self, docs):
+        self.docs = docs
+        self.shapes = set()
+
+    def collection(self, name):
+        assert name == 'flights'
+        return Query(self.docs)
+
+    async def fetch_page(self, query, limit, start_after=None):
+        # Форма запроса: поля равенств и сортировки (то, что определяет индекс)
+        equalities = tuple(sorted(field for field, op, _ in query.filters if op == '=='))
+        self.shapes.add((equalities, query.orders))
+
+        docs = query.run()
+        if start_after is not None:
+            docs = docs[docs.index(start_after) + 1:]
+        return docs[:limit]
+
+
+def run_async(test):
+    """Асинхронный тест без плагинов pytest"""
+    @functools.wraps(test)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(test(*args, **kwargs))
+    return wrapper
+
+
+def make_docs(count=120, seed=3):
+    rng = random.Random(seed)
+    docs = []
+    for number in range(count):
+        departure = NOW + timedelta(hours=rng.randrange(-200, 200) or 1, minutes=rng.choice([15, 30, 45]))
+        docs.append(Doc(f"f{number}", {
+            'airline_id': rng.choice(['A', 'A', 'B']),
+            'flight_number': rng.choice(['SU1', 'SU12', 'SU120', 'SU2', 'FV5']) + str(number % 3),
+            'departure_code': rng.choice(AIRPORTS),
+            'arrival_code': rng.choice(AIRPORTS),
+            'departure_datetime': departure.isoformat()
+        }))
+    return docs
+
+
+def expected(docs, airline_id, flight_number=None, departure=None, arrival=None, date_from=None, date_to=None):
+    """Ожидаемый порядок результатов перебором всех рейсов"""
+    now = NOW.isoformat()
+    date_from = date_from.isoformat() if date_from else None
+    date_to = date_to.isoformat() if date_to else None
+
+    matched = []
+    for doc in docs:
+        data = doc._data
+        if data['airline_id'] != airline_id:
+            continue
+        if departure and data['departure_code'] != departure:
+            continue
+        if arrival and data['arrival_code'] != arrival:
+            continue
+        if flight_number and not data['flight_number'].startswith(flight_number):
+            continue
+        if date_from and data['departure_datetime'] < date_from:
+            continue
+        if date_to and data['departure_datetime'] >= date_to:
+            continue
+        matched.append(doc)
+
+    if flight_number:
+        matched.sort(key=lambda doc: (doc._data['flight_number'], doc._data['departure_datetime']))
+        return [doc.id for doc in matched]
+
+    upcoming = sorted((doc for doc in matched if doc._data['departure_datetime'] >= now),
+                      key=lambda doc: doc._data['departure_datetime'])
+    past = sorted((doc for doc in matched if doc._data['departure_datetime'] < now),
+                  key=lambda doc: doc._data['departure_datetime'], reverse=True)
+    return [doc.id for doc in upcoming + past]
+
+
+async def read_all(search):
+    ids = []
+    page = 0
+    while True:
+        flights, has_next = await search.get_page(page)
+        ids += [flight_id for flight_id, _ in flights]
+        if not has_next:
+            return ids
+        page += 1
+
+
+CASES = [
+    {},
+    {'departure': 'svo'},
+    {'arrival': 'LED'},
+    {'departure': 'KZN', 'arrival': 'SVO'},
+    {'flight_number': 'su1'},
+    {'flight_number': 'SU12', 'departure': 'LED'},
+    {'flight_number': 'SU2', 'arrival': 'KZN'},
+    {'flight_number': 'FV', 'departure': 'SVO', 'arrival': 'LED'},
+    {'date_from': NOW - timedelta(days=2), 'date_to': NOW + timedelta(days=3)},
+    {'date_from': NOW + timedelta(days=1)},
+    {'date_to': NOW - timedelta(days=1)},
+    {'flight_number': 'SU', 'date_from': NOW - timedelta(days=1), 'date_to': NOW + timedelta(days=1)},
+]
+
+
+@pytest.mark.parametrize('filters', CASES)
+@pytest.mark.parametrize('batch_size', [3, 20])
+@run_async
+async def test_pages_match_brute_force(filters, batch_size):
+    docs = make_docs()
+    search = AirlineFlightSearch(Database(docs), 'A', page_size=4, **filters)
+    search.BATCH_SIZE = batch_size
+
+    # Коды и номер рейса поиск приводит к верхнему регистру
+    normalized = {key: value.upper() if isinstance(value, str) else value for key, value in filters.items()}
+    expected_ids = expected(docs, 'A', **normalized)
+    assert await read_all(search) == expected_ids
+    assert search.found == len(expected_ids)
+    assert search.exhausted and not search.truncated
+
+
+@run_async
+async def test_reads_only_what_the_page_needs():
+    db = Database(make_docs(300))
+    search = AirlineFlightSearch(db, 'A', page_size=5)
+    flights, has_next = await search.get_page(0)
+    assert len(flights) == 5 and has_next
+    assert search.stats == {'fetches': 1, 'scanned': AirlineFlightSearch.BATCH_SIZE}
+
+    # Страница из уже прочитанного не обращается к базе
+    await search.get_page(1)
+    assert search.stats['fetches'] == 1
+
+
+@run_async
+async def test_stops_at_max_scanned():
+    docs = make_docs(300)
+    search = AirlineFlightSearch(Database(docs), 'A', flight_number='ZZ', page_size=5)
+    search.MAX_SCANNED = 40
+    assert await read_all(search) == []
+
+    search = AirlineFlightSearch(Database(docs), 'A', page_size=5)
+    search.BATCH_SIZE = 5
+    search.MAX_SCANNED = 20
+    ids = await read_all(search)
+    assert search.truncated
+    assert ids == expected(docs, 'A')[:len(ids)]
+    assert search.stats['scanned'] == 20
+
+
+def test_skips_empty_segments():
+    db = Database([])
+    assert len(AirlineFlightSearch(db, 'A')._segments) == 2
+    assert len(AirlineFlightSearch(db, 'A', date_from=NOW + timedelta(days=1))._segments) == 1
+    assert len(AirlineFlightSearch(db, 'A', date_to=NOW - timedelta(days=1))._segments) == 1
+    assert len(AirlineFlightSearch(db, 'A', flight_number='SU')._segments) == 1
+
+
+@run_async
+async def test_query_shapes_are_declared_indexes():
+    """Каждая форма запроса поиска есть в firestore.indexes.json"""
+    # Порядок полей равенств в индексе не важен, порядок сортировок - важен
+    sort_fields = ('flight_number', 'departure_datetime')
+    with open(os.path.join(os.path.dirname(__file__), '..', 'firestore.indexes.json'), encoding='utf-8') as f:
+        declared = set()
+        for index in json.load(f)['indexes']:
+            fields = [(field['fieldPath'], field['order']) for field in index['fields']]
+            declared.add((frozenset(name for name, _ in fields if name not in sort_fields),
+                          tuple(field for field in fields if field[0] in sort_fields)))
+
+    db = Database(make_docs())
+    for filters in CASES:
+        await read_all(AirlineFlightSearch(db, 'A', **filters))
+
+    assert len(db.shapes) == 12
+    for equalities, orders in db.shapes:
+        assert (frozenset(equalities), orders) in declared, (equalities, orders)
@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.itinerary import ItineraryIndex, MIN_CONNECTION_MINUTES, SEARCH_HORIZON_HOURS
+
+START = datetime(2026, 5, 1, 6, 0)
+AIRPORTS = ['SVO', 'LED', 'KZN', 'AER', 'OVB', 'SVX']
+
+
+def make_flight(departure_code, arrival_code, departure_minute, duration, status='scheduled'):
+    departure = START + timedelta(minutes=departure_minute)
+    return {
+        'departure_code': departure_code,
+        'arrival_code': arrival_code,
+        'departure_datetime': departure.isoformat(),
+        'arrival_datetime': (departure + timedelta(minutes=duration)).isoformat(),
+        'status': status
+    }
+
+
+def times(flight_data):
+    departure = datetime.fromisoformat(flight_data['departure_datetime'])
+    return departure, datetime.fromisoformat(flight_data['arrival_datetime'])
+
+
+def brute_force(flights, origin, destination, start, max_legs):
+    """Парето-набор (число перелетов, прилет) перебором всех цепочек рейсов"""
+    horizon = start + timedelta(hours=SEARCH_HORIZON_HOURS)
+    best = {}
+
+    def extend(airport, ready, legs):
+        if legs == max_legs:
+            return
+        for flight_data in flights.values():
+            departure, arrival = times(flight_data)
+            if flight_data['departure_code'] != airport or departure < ready or arrival > horizon:
+                continue
+            if flight_data['arrival_code'] == destination:
+                best[legs + 1] = min(best.get(legs + 1, arrival), arrival)
+            extend(flight_data['arrival_code'], arrival + timedelta(minutes=MIN_CONNECTION_MINUTES), legs + 1)
+
+    extend(origin, start, 0)
+
+    pareto = []
+    for legs in sorted(best):
+        if not pareto or best[legs] < pareto[-1][1]:
+            pareto.append((legs, best[legs]))
+    return pareto
+
+
+def summarize(itineraries):
+    return [(len(itinerary), times(itinerary[-1][1])[1]) for itinerary in itineraries]
+
+
+def assert_valid(itinerary, origin, destination, start):
+    assert itinerary[0][1]['departure_code'] == origin
+    assert itinerary[-1][1]['arrival_code'] == destination
+    assert times(itinerary[0][1])[0] >= start
+    for (_, previous), (_, following) in zip(itinerary, itinerary[1:]):
+        assert previous['arrival_code'] == following['departure_code']
+    assert all(minutes >= MIN_CONNECTION_MINUTES for minutes in ItineraryIndex.connection_minutes(itinerary))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_matches_brute_force(seed, replica):
+    rng = random.Random(seed)
+    index = ItineraryIndex(replica)
+    for number in range(45):
+        departure_code, arrival_code = rng.sample(AIRPORTS, 2)
+        replica.put(f"f{number}", make_flight(departure_code, arrival_code,
+                                              rng.randrange(0, 36 * 60, 5), rng.randrange(45, 300, 5)))
+
+    for _ in range(10):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        start = START + timedelta(minutes=rng.randrange(0, 12 * 60, 15))
+        found = index.search(origin, destination, start)
+        assert summarize(found) == brute_force(replica.flights, origin, destination, start, 3)
+        for itinerary in found:
+            assert_valid(itinerary, origin, destination, start)
+
+
+def test_returns_connection_only_if_it_arrives_earlier(replica):
+    index = ItineraryIndex(replica)
+    replica.put('a', make_flight('SVO', 'KZN', 0, 60))
+    replica.put('b', make_flight('KZN', 'LED', 120, 60))
+    replica.put('direct', make_flight('SVO', 'LED', 30, 90))
+
+    found = index.search('SVO', 'LED', START)
+    assert [[flight_id for flight_id, _ in itinerary] for itinerary in found] == [['direct']]
+
+    # Прямой рейс прилетает позже стыковки - в ответе оба варианта
+    replica.put('direct', make_flight('SVO', 'LED', 200, 90))
+    found = index.search('SVO', 'LED', START)
+    assert [[flight_id for flight_id, _ in itinerary] for itinerary in found] == [['direct'], ['a', 'b']]
+
+
+def test_respects_minimum_connection(replica):
+    index = ItineraryIndex(replica)
+    replica.put('a', make_flight('SVO', 'KZN', 0, 60))
+    replica.put('b', make_flight('KZN', 'LED', 60 + MIN_CONNECTION_MINUTES - 5, 60))
+    assert index.search('SVO', 'LED', START) == []
+
+    replica.put('b', make_flight('KZN', 'LED', 60 + MIN_CONNECTION_MINUTES, 60))
+    assert len(index.search('SVO', 'LED', START)) == 1
+
+
+def test_follows_replica_changes(replica):
+    index = ItineraryIndex(replica)
+    replica.put('a', make_flight('SVO', 'LED', 0, 90))
+    replica.put('b', make_flight('SVO', 'LED', 60, 90))
+    assert len(index) == 2
+
+    replica.put('a', make_flight('SVO', 'LED', 0, 90, status='cancelled'))
+    assert [itinerary[0][0] for itinerary in index.search('SVO', 'LED', START)] == ['b']
+
+    replica.remove('b')
+    assert len(index) == 0
+    assert index.search('SVO', 'LED', START) == []
+
+
+def test_skips_flights_before_start_and_bad_rows(replica):
+    index = ItineraryIndex(replica)
+    replica.put('early', make_flight('SVO', 'LED', 0, 90))
+    replica.put('loop', make_flight('SVO', 'SVO', 30, 90))
+    replica.put('broken', {**make_flight('SVO', 'LED', 30, 90), 'departure_datetime': 'завтра'})
+    assert len(index) == 1
+    assert index.search('SVO', 'LED', START + timedelta(minutes=1)) == []
+    assert index.search('svo', 'svo', START) == []
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from utils.stats_snapshot import StatsSnapshot
+
+
+class Loader:
+    """Загрузка снимка: считает вызовы, отвечает через паузу"""
+
+    def __init__(self, data=None, fail=False):
+        self.calls = 0
+        self.data = data or {'total_flights': 10, 'total_airlines': 2, 'bot_version': '1.0'}
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError('unavailable')
+        return dict(self.data)
+
+
+def test_get_loads_once_within_budget():
+    loader = Loader()
+    snapshot = StatsSnapshot(loader, max_age=600)
+
+    async def scenario():
+        first = await snapshot.get()
+        second = await snapshot.get()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == loader.data
+    assert loader.calls == 1
+
+
+def test_stale_snapshot_is_reloaded():
+    loader = Loader()
+    snapshot = StatsSnapshot(loader, max_age=600)
+
+    async def scenario():
+        await snapshot.get()
+        snapshot._updated_at = datetime.now() - timedelta(seconds=601)
+        await snapshot.get()
+        # Свой бюджет у вызывающего: max_age=0 - всегда свежие цифры
+        await snapshot.get(max_age=0)
+
+    asyncio.run(scenario())
+    assert loader.calls == 3
+
+
+def test_concurrent_refreshes_share_one_load():
+    loader = Loader()
+    snapshot = StatsSnapshot(loader)
+
+    async def scenario():
+        return await asyncio.gather(*(snapshot.refresh() for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert results == [loader.data] * 5
+    assert loader.calls == 1
+    assert snapshot.stats['coalesced'] == 4
+
+
+def test_adjust_and_set_between_loads():
+    snapshot = StatsSnapshot(Loader())
+    asyncio.run(snapshot.refresh())
+
+    snapshot.adjust('total_flights')
+    snapshot.adjust('total_airlines', -1)
+    # Неизвестный и нечисловой ключи не меняются
+    snapshot.adjust('pending_applications')
+    snapshot.adjust('bot_version')
+    snapshot.set('active_flights', 3)
+
+    assert snapshot.peek() == {'total_flights': 11, 'total_airlines': 1,
+                               'bot_version': '1.0', 'active_flights': 3}
+    assert snapshot.stats['adjustments'] == 3
+
+
+def test_peek_returns_copy():
+    snapshot = StatsSnapshot(Loader())
+    asyncio.run(snapshot.refresh())
+    snapshot.peek()['total_flights'] = 0
+    assert snapshot.peek()['total_flights'] == 10
+
+
+def test_failed_load_keeps_previous_snapshot():
+    loader = Loader()
+    snapshot = StatsSnapshot(loader)
+    assert snapshot.age() == float('inf')
+
+    asyncio.run(snapshot.refresh())
+    updated_at = snapshot.updated_at
+    loader.fail = True
+    assert asyncio.run(snapshot.refresh()) == loader.data
+    assert snapshot.updated_at == updated_at
+    assert snapshot.stats['loads'] == 1
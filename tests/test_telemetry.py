@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from utils.telemetry import TelemetryBuffer
+
+
+class DatabaseHandler:
+    """Пакетная запись: запоминает пакеты, может падать"""
+
+    MAX_BATCH_OPS = 3
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def add_documents(self, chunk):
+        if self.fail:
+            raise RuntimeError('quota exceeded')
+        self.batches.append(list(chunk))
+
+
+def command(number):
+    return 'commands', {'command': f"cmd{number}"}
+
+
+def error(number):
+    return 'errors', {'error': f"err{number}"}
+
+
+@pytest.fixture
+def db():
+    return DatabaseHandler()
+
+
+def test_record_does_not_write(db):
+    buffer = TelemetryBuffer(db, max_size=10, flush_size=5)
+    buffer.record(*command(1))
+    buffer.record(*error(1))
+    assert len(buffer) == 2
+    assert buffer.stats['queued'] == 2
+    assert db.batches == []
+
+
+def test_flush_writes_in_batches(db):
+    buffer = TelemetryBuffer(db, max_size=10, flush_size=100)
+    for number in range(7):
+        buffer.record(*command(number))
+
+    asyncio.run(buffer.flush())
+    assert [len(batch) for batch in db.batches] == [3, 3, 1]
+    assert [data['command'] for batch in db.batches for _, data in batch] == [f"cmd{n}" for n in range(7)]
+    assert buffer.stats['written'] == 7
+    assert buffer.stats['flushes'] == 3
+    assert len(buffer) == 0
+
+
+def test_overflow_drops_new_commands(db):
+    buffer = TelemetryBuffer(db, max_size=3, flush_size=100)
+    for number in range(5):
+        buffer.record(*command(number))
+    assert [data['command'] for _, data in buffer._queue] == ['cmd0', 'cmd1', 'cmd2']
+    assert buffer.stats['dropped'] == {'commands': 2, 'errors': 0}
+
+
+def test_error_evicts_oldest_command(db):
+    buffer = TelemetryBuffer(db, max_size=3, flush_size=100)
+    buffer.record(*error(0))
+    buffer.record(*command(1))
+    buffer.record(*command(2))
+
+    buffer.record(*error(3))
+    assert list(buffer._queue) == [error(0), command(2), error(3)]
+    assert buffer.stats['dropped'] == {'commands': 1, 'errors': 0}
+
+
+def test_errors_dropped_only_when_queue_is_all_errors(db):
+    buffer = TelemetryBuffer(db, max_size=2, flush_size=100)
+    buffer.record(*error(0))
+    buffer.record(*error(1))
+    buffer.record(*error(2))
+    assert list(buffer._queue) == [error(0), error(1)]
+    assert buffer.stats['dropped'] == {'commands': 0, 'errors': 1}
+
+
+def test_failed_batch_is_not_requeued():
+    db = DatabaseHandler(fail=True)
+    buffer = TelemetryBuffer(db, max_size=10, flush_size=100)
+    for number in range(4):
+        buffer.record(*command(number))
+
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 0
+    assert buffer.stats['failed'] == 4
+    assert buffer.stats['written'] == 0
+
+
+def test_flush_size_wakes_background_task(db):
+    async def scenario():
+        buffer = TelemetryBuffer(db, max_size=10, flush_size=2, flush_interval=60)
+        buffer.start()
+        buffer.record(*command(0))
+        await asyncio.sleep(0.01)
+        assert db.batches == []
+
+        buffer.record(*command(1))
+        await asyncio.sleep(0.01)
+        assert db.batches == [[command(0), command(1)]]
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+
+def test_flush_interval_writes_partial_queue(db):
+    async def scenario():
+        buffer = TelemetryBuffer(db, max_size=10, flush_size=100, flush_interval=0.01)
+        buffer.start()
+        buffer.record(*error(0))
+        await asyncio.sleep(0.05)
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert db.batches == [[error(0)]]
+
+
+def test_close_flushes_remaining_records(db):
+    async def scenario():
+        buffer = TelemetryBuffer(db, max_size=10, flush_size=100, flush_interval=60)
+        buffer.start()
+        for number in range(4):
+            buffer.record(*command(number))
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert buffer._task is None
+    assert len(buffer) == 0
+    assert sum(len(batch) for batch in db.batches) == 4
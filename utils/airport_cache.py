@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+
+# Файл постоянного кэша результатов поиска аэропортов
+AIRPORT_CACHE_PATH = os.environ.get('AIRPORT_CACHE', os.path.join('data', 'airport_cache.sqlite3'))
+
+
+class AirportCache:
+    """Двухуровневый кэш результатов поиска аэропортов.
+
+    Первый уровень - LRU в памяти ограниченного размера, второй - SQLite
+    на диске, который переживает перезапуск. Отрицательные результаты
+    ("не найдено") тоже кэшируются, но с более коротким сроком, поэтому
+    повторный ввод того же неверного названия не уходит во внешние API.
+    """
+
+    def __init__(self, path: str = AIRPORT_CACHE_PATH, max_size: int = 1024,
+                 positive_ttl: float = 7 * 86400, negative_ttl: float = 6 * 3600):
+        self.path = path
+        self.max_size = max_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'disk_errors': 0
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS airport_cache ('
+                'key TEXT PRIMARY KEY, data TEXT, expires_at REAL NOT NULL)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    # Диск (блокирующие вызовы - выполняются в потоке)
+    def _disk_get(self, key: str) -> Optional[Tuple[Optional[str], float]]:
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT data, expires_at FROM airport_cache WHERE key = ?', (key,)
+            ).fetchone()
+        return row
+
+    def _disk_set(self, key: str, data: Optional[str], expires_at: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO airport_cache (key, data, expires_at) VALUES (?, ?, ?)',
+                (key, data, expires_at)
+            )
+            conn.commit()
+
+    def _disk_purge(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute('DELETE FROM airport_cache WHERE expires_at < ?', (time.time(),)).rowcount
+            conn.commit()
+        return deleted
+
+    # Память
+    def _remember(self, key: str, value: Optional[Dict[str, Any]], expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    async def get(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(найдено в кэше, значение); значение None - кэшированное "не найдено" """
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                if value is None:
+                    self.stats['negative_hits'] += 1
+                return True, value
+            del self._memory[key]
+            self.stats['expired'] += 1
+
+        try:
+            row = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            self.stats['disk_errors'] += 1
+            print(f"Ошибка чтения кэша аэропортов: {e}")
+            row = None
+
+        if row is not None:
+            data, expires_at = row
+            if expires_at > now:
+                value = json.loads(data) if data else None
+                self._remember(key, value, expires_at)
+                self.stats['disk_hits'] += 1
+                if value is None:
+                    self.stats['negative_hits'] += 1
+                return True, value
+            self.stats['expired'] += 1
+
+        self.stats['misses'] += 1
+        return False, None
+
+    async def set(self, key: str, value: Optional[Dict[str, Any]]):
+        """Сохранить результат (None - аэропорт не найден)"""
+        ttl = self.positive_ttl if value is not None else self.negative_ttl
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+
+        try:
+            data = json.dumps(value, ensure_ascii=False) if value is not None else None
+            await asyncio.to_thread(self._disk_set, key, data, expires_at)
+        except Exception as e:
+            self.stats['disk_errors'] += 1
+            print(f"Ошибка записи кэша аэропортов: {e}")
+
+    async def purge_expired(self):
+        """Удалить просроченные записи с диска"""
+        try:
+            deleted = await asyncio.to_thread(self._disk_purge)
+            if deleted:
+                print(f"🧹 Кэш аэропортов: удалено {deleted} просроченных записей")
+        except Exception as e:
+            self.stats['disk_errors'] += 1
+            print(f"Ошибка очистки кэша аэропортов: {e}")
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def hit_rate(self) -> float:
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,195 @@
+import csv
+import io
+import os
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+
+from utils.airport_search import AirportSearchIndex
+from utils.airport_spatial import AirportSpatialIndex
+
+# Файл базы аэропортов OurAirports (обновляется в фоне, не на пути запроса)
+AIRPORTS_CSV_URL = 'https://davidmegginson.github.io/ourairports-data/airports.csv'
+AIRPORTS_CSV_PATH = os.environ.get('AIRPORTS_CSV', os.path.join('data', 'airports.csv'))
+AIRPORTS_MAX_AGE = timedelta(days=30)
+
+# Типы объектов OurAirports, которые считаем аэропортами
+AIRPORT_TYPES = {'large_airport', 'medium_airport', 'small_airport'}
+
+
+class AirportDatabase:
+    """Локальная база аэропортов.
+
+    CSV OurAirports разбирается один раз в таблицу из параллельных колонок
+    (строки - списки, координаты - array('d')). Поиск по IATA и ICAO идет
+    через словари "код -> номер строки" без обращений к сети.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.cities: List[str] = []
+        self.countries: List[str] = []
+        self.iata_codes: List[str] = []
+        self.icao_codes: List[str] = []
+        self.keywords: List[str] = []
+        self.types: List[str] = []
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+
+        self.by_iata: Dict[str, int] = {}
+        self.by_icao: Dict[str, int] = {}
+        self.search_index: Optional[AirportSearchIndex] = None
+        self.spatial_index: Optional[AirportSpatialIndex] = None
+        self.loaded_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    # Загрузка
+    @staticmethod
+    def is_stale(path: str = AIRPORTS_CSV_PATH) -> bool:
+        """Файл отсутствует или старше AIRPORTS_MAX_AGE"""
+        if not os.path.exists(path):
+            return True
+        modified = datetime.fromtimestamp(os.path.getmtime(path))
+        return datetime.now() - modified > AIRPORTS_MAX_AGE
+
+    @classmethod
+    def from_file(cls, path: str = AIRPORTS_CSV_PATH) -> 'AirportDatabase':
+        """Разобрать CSV с диска (блокирующий вызов - запускать в потоке)"""
+        with open(path, encoding='utf-8', newline='') as f:
+            return cls.from_csv(f)
+
+    @classmethod
+    def from_csv(cls, stream: io.TextIOBase, build_index: bool = True) -> 'AirportDatabase':
+        db = cls()
+        for row in csv.DictReader(stream):
+            if row.get('type') not in AIRPORT_TYPES:
+                continue
+
+            iata = (row.get('iata_code') or '').strip().upper()
+            icao = (row.get('icao_code') or row.get('gps_code') or '').strip().upper()
+            if not icao and len(row.get('ident', '')) == 4:
+                icao = row['ident'].upper()
+            if not iata and not icao:
+                continue
+
+            try:
+                latitude = float(row.get('latitude_deg') or 0)
+                longitude = float(row.get('longitude_deg') or 0)
+            except ValueError:
+                latitude = longitude = 0.0
+
+            db._append(row.get('name', ''), row.get('municipality', ''), row.get('iso_country', ''),
+                       iata, icao, latitude, longitude,
+                       keywords=row.get('keywords', ''), airport_type=row.get('type', ''))
+
+        if build_index:
+            db.build_indexes()
+        db.loaded_at = datetime.now()
+        return db
+
+    def _append(self, name: str, city: str, country: str, iata: str, icao: str,
+                latitude: float, longitude: float, keywords: str = '', airport_type: str = ''):
+        index = len(self.names)
+        self.names.append(name)
+        self.cities.append(city)
+        self.countries.append(country)
+        self.iata_codes.append(iata)
+        self.icao_codes.append(icao)
+        self.keywords.append(keywords)
+        self.types.append(airport_type)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+
+        # Один ICAO-код бывает у нескольких записей - предпочитаем запись с IATA
+        if iata and iata not in self.by_iata:
+            self.by_iata[iata] = index
+        if icao and (icao not in self.by_icao or not self.iata_codes[self.by_icao[icao]]):
+            self.by_icao[icao] = index
+
+    def build_indexes(self):
+        """Построить нечеткий индекс названий и пространственный индекс (блокирующий вызов)"""
+        self.search_index = AirportSearchIndex(self)
+        self.spatial_index = AirportSpatialIndex(self)
+
+    @staticmethod
+    async def download(session, path: str = AIRPORTS_CSV_PATH):
+        """Скачать свежий CSV и атомарно заменить файл на диске"""
+        async with session.get(AIRPORTS_CSV_URL) as response:
+            response.raise_for_status()
+            data = await response.read()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # Поиск
+    def record(self, index: int) -> Dict[str, Any]:
+        """Строка таблицы в формате AirportService"""
+        return {
+            'name': self.names[index],
+            'city': self.cities[index],
+            'country': self.countries[index],
+            'iata': self.iata_codes[index] or None,
+            'icao': self.icao_codes[index] or None,
+            'latitude': self.latitudes[index],
+            'longitude': self.longitudes[index]
+        }
+
+    def get_by_iata(self, code: str) -> Optional[Dict[str, Any]]:
+        index = self.by_iata.get(code.upper())
+        return self.record(index) if index is not None else None
+
+    def get_by_icao(self, code: str) -> Optional[Dict[str, Any]]:
+        index = self.by_icao.get(code.upper())
+        return self.record(index) if index is not None else None
+
+    def get_by_code(self, code: str) -> Optional[Dict[str, Any]]:
+        """Поиск по IATA (3 символа) или ICAO (4 символа)"""
+        code = code.upper().strip()
+        if len(code) == 3:
+            return self.get_by_iata(code)
+        if len(code) == 4:
+            return self.get_by_icao(code)
+        return None
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Нечеткий поиск по названию/городу с ранжированием (с транслитерацией)"""
+        if not self.search_index:
+            return []
+        return [self.record(index) for _, index in self.search_index.search(query, limit)]
+
+    def find_by_name(self, query: str) -> Optional[Dict[str, Any]]:
+        """Аэропорт с IATA и ICAO для введенного названия, если выбор однозначный"""
+        if not self.search_index:
+            return None
+        index = self.search_index.resolve(query)
+        return self.record(index) if index is not None else None
+
+    def _with_distance(self, hits) -> List[Dict[str, Any]]:
+        results = []
+        for distance, index in hits:
+            airport = self.record(index)
+            airport['distance_km'] = distance
+            results.append(airport)
+        return results
+
+    def nearest(self, latitude: float, longitude: float, limit: int = 10) -> List[Dict[str, Any]]:
+        """Ближайшие аэропорты (с IATA) с полем distance_km"""
+        if not self.spatial_index:
+            return []
+        return self._with_distance(self.spatial_index.nearest(latitude, longitude, limit))
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Аэропорты (с IATA) в радиусе radius_km, ближайшие первыми"""
+        if not self.spatial_index:
+            return []
+        return self._with_distance(self.spatial_index.within_radius(latitude, longitude, radius_km)[:limit])
@@ -0,0 +1,491 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from utils.airport_db import AirportDatabase, AIRPORTS_CSV_PATH
+from utils.airport_search import AirportSearchIndex
+from utils.airport_spatial import AirportSpatialIndex, CELL_DEGREES
+
+# Двоичный образ таблицы аэропортов (строится один раз, читается через mmap)
+AIRPORTS_IMAGE_PATH = os.environ.get('AIRPORTS_IMAGE', os.path.join('data', 'airports.bin'))
+
+IMAGE_MAGIC = b'AVAP'
+IMAGE_VERSION = 2
+
+# magic, версия, строк, записей IATA, записей ICAO, смещения: записи, IATA, ICAO, строки; время сборки
+HEADER = struct.Struct('<4sHxxIIIIIIId')
+# IATA, ICAO, страна, тип, широта, долгота, (смещение, длина) названия, города, ключевых слов
+RECORD_FIELDS = ['3s', '4s', '2s', 'B', 'd', 'd', 'I', 'H', 'I', 'H', 'I', 'H']
+RECORD = struct.Struct('<' + ''.join(RECORD_FIELDS))
+IATA_ENTRY = struct.Struct('<3sI')
+ICAO_ENTRY = struct.Struct('<4sI')
+
+# Разделы индексов (смещение, число элементов) - см. INDEX_SECTIONS; строк в нечетком индексе
+INDEX_SECTIONS = (
+    'gram_starts',     # uint32 x (GRAM_SLOTS + 1): начало списка строк триграммы в postings
+    'postings',        # uint32: номера строк
+    'tokens',          # TOKEN: токены нечеткого индекса, отсортированные по (токен, строка)
+    'row_starts',      # uint32 x (строк + 1): начало токенов строки в token_ids
+    'row_trigrams',    # uint16 x строк: число триграмм строки (0 - строки нет в индексе)
+    'token_ids',       # uint32: номера записей tokens
+    'cell_starts',     # uint32 x (CELL_SLOTS + 1): начало точек ячейки сетки в points
+    'points',          # POINT: (широта, долгота, строка)
+)
+INDEX_HEADER = struct.Struct('<' + 'II' * len(INDEX_SECTIONS) + 'I')
+# (смещение, длина) токена в строках образа, номер строки
+TOKEN = struct.Struct('<IHI')
+POINT = struct.Struct('<ddI')
+# Элемент раздела: формат массива (memoryview.cast) или запись struct
+SECTION_ITEMS = {
+    'gram_starts': 'I', 'postings': 'I', 'tokens': TOKEN, 'row_starts': 'I',
+    'row_trigrams': 'H', 'token_ids': 'I', 'cell_starts': 'I', 'points': POINT,
+}
+DOUBLE = struct.Struct('<d')
+SPAN = struct.Struct('<IH')
+
+# Триграмма -> ячейка плотной таблицы (токены после normalize - только [a-z0-9], отступы - пробелы)
+GRAM_ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789'
+_GRAM_CODES = {ch: code for code, ch in enumerate(GRAM_ALPHABET)}
+GRAM_SLOTS = len(GRAM_ALPHABET) ** 3
+
+# Ячейки сетки пространственного индекса в плотной таблице: широта -90..90, долгота 0..LON_CELLS-1
+LAT_SHIFT = int(90 // CELL_DEGREES)
+LAT_CELLS = 2 * LAT_SHIFT + 1
+CELL_SLOTS = LAT_CELLS * AirportSpatialIndex.LON_CELLS
+
+AIRPORT_TYPE_IDS = {'': 0, 'large_airport': 1, 'medium_airport': 2, 'small_airport': 3}
+AIRPORT_TYPE_NAMES = {type_id: name for name, type_id in AIRPORT_TYPE_IDS.items()}
+
+# Номера полей RECORD и их смещения в записи
+_IATA, _ICAO, _COUNTRY, _TYPE, _LAT, _LON, _NAME, _CITY, _KEYWORDS = 0, 1, 2, 3, 4, 5, 6, 8, 10
+_FIELD_OFFSETS = [struct.calcsize('<' + ''.join(RECORD_FIELDS[:i])) for i in range(len(RECORD_FIELDS))]
+_CODE_WIDTHS = {_IATA: 3, _ICAO: 4, _COUNTRY: 2}
+
+
+def _gram_slot(gram: str) -> Optional[int]:
+    slot = 0
+    for ch in gram:
+        code = _GRAM_CODES.get(ch)
+        if code is None:
+            return None
+        slot = slot * len(GRAM_ALPHABET) + code
+    return slot
+
+
+def _cell_slot(lat_cell: int, lon_cell: int) -> Optional[int]:
+    row = lat_cell + LAT_SHIFT
+    if not 0 <= row < LAT_CELLS:
+        return None
+    return row * AirportSpatialIndex.LON_CELLS + lon_cell
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _index_sections(db: AirportDatabase, pooled) -> Tuple[List[Tuple[bytes, int]], int]:
+    """Нечеткий и пространственный индексы таблицы -> [(байты раздела, элементов)], строк в нечетком индексе"""
+    search_index = db.search_index or AirportSearchIndex(db)
+    spatial_index = db.spatial_index or AirportSpatialIndex(db)
+
+    postings_by_slot = {_gram_slot(gram): rows for gram, rows in search_index._trigram_postings.items()}
+    gram_starts = array('I', bytes(4 * (GRAM_SLOTS + 1)))
+    postings = array('I')
+    for slot in range(GRAM_SLOTS):
+        gram_starts[slot] = len(postings)
+        postings.extend(postings_by_slot.get(slot, ()))
+    gram_starts[GRAM_SLOTS] = len(postings)
+
+    tokens = bytearray()
+    token_positions: Dict[Tuple[str, int], int] = {}
+    for position, (token, row) in enumerate(search_index._sorted_tokens):
+        tokens += TOKEN.pack(*pooled(token), row)
+        token_positions[(token, row)] = position
+
+    row_starts = array('I')
+    row_trigrams = array('H')
+    token_ids = array('I')
+    for index in range(len(db)):
+        row_starts.append(len(token_ids))
+        row_tokens = search_index._row_tokens.get(index, ())
+        row_trigrams.append(search_index._row_trigrams.get(index, 0))
+        token_ids.extend(token_positions[(token, index)] for token in sorted(row_tokens))
+    row_starts.append(len(token_ids))
+
+    points_by_slot = {_cell_slot(*cell): entries for cell, entries in spatial_index._cells.items()}
+    cell_starts = array('I', bytes(4 * (CELL_SLOTS + 1)))
+    points = bytearray()
+    count = 0
+    for slot in range(CELL_SLOTS):
+        cell_starts[slot] = count
+        for entry in points_by_slot.get(slot, ()):
+            points += POINT.pack(*entry)
+            count += 1
+    cell_starts[CELL_SLOTS] = count
+
+    sections = [
+        (_little_endian(gram_starts), len(gram_starts)),
+        (_little_endian(postings), len(postings)),
+        (bytes(tokens), len(token_positions)),
+        (_little_endian(row_starts), len(row_starts)),
+        (_little_endian(row_trigrams), len(row_trigrams)),
+        (_little_endian(token_ids), len(token_ids)),
+        (_little_endian(cell_starts), len(cell_starts)),
+        (bytes(points), count),
+    ]
+    return sections, len(search_index)
+
+
+def write_airport_image(db: AirportDatabase, path: str = AIRPORTS_IMAGE_PATH):
+    """Записать таблицу в двоичный образ (атомарно: tmp-файл + замена)"""
+    strings = bytearray()
+    pooled_tokens: Dict[str, Tuple[int, int]] = {}
+
+    def pooled(text: str):
+        data = text.encode('utf-8')[:0xFFFF]
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    def pooled_token(token: str):
+        if token not in pooled_tokens:
+            pooled_tokens[token] = pooled(token)
+        return pooled_tokens[token]
+
+    records = bytearray()
+    for index in range(len(db)):
+        name = pooled(db.names[index])
+        city = pooled(db.cities[index])
+        keywords = pooled(db.keywords[index])
+        records += RECORD.pack(
+            db.iata_codes[index].encode('ascii', 'ignore'),
+            db.icao_codes[index].encode('ascii', 'ignore'),
+            db.countries[index].encode('ascii', 'ignore'),
+            AIRPORT_TYPE_IDS.get(db.types[index], 0),
+            db.latitudes[index], db.longitudes[index],
+            *name, *city, *keywords
+        )
+
+    # В индексы попадают только коды, помещающиеся в поле фиксированной ширины
+    iata_items = sorted((code, row) for code, row in db.by_iata.items() if len(code) <= 3)
+    icao_items = sorted((code, row) for code, row in db.by_icao.items() if len(code) <= 4)
+    iata_index = b''.join(IATA_ENTRY.pack(code.encode('ascii', 'ignore'), row) for code, row in iata_items)
+    icao_index = b''.join(ICAO_ENTRY.pack(code.encode('ascii', 'ignore'), row) for code, row in icao_items)
+
+    # Индексы строятся один раз здесь, процессы бота читают их из образа
+    sections, indexed_rows = _index_sections(db, pooled_token)
+
+    records_offset = HEADER.size + INDEX_HEADER.size
+    iata_offset = records_offset + len(records)
+    icao_offset = iata_offset + len(iata_index)
+
+    # Разделы индексов выровнены по 8 байт - они читаются через memoryview.cast
+    body = bytearray(records + iata_index + icao_index)
+    section_fields = []
+    for data, count in sections:
+        body += bytes(-(records_offset + len(body)) % 8)
+        section_fields += [records_offset + len(body), count]
+        body += data
+    strings_offset = records_offset + len(body)
+    built_at = (db.loaded_at or datetime.now()).timestamp()
+
+    header = HEADER.pack(IMAGE_MAGIC, IMAGE_VERSION, len(db), len(iata_items), len(icao_items),
+                         records_offset, iata_offset, icao_offset, strings_offset, built_at)
+    index_header = INDEX_HEADER.pack(*section_fields, indexed_rows)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(index_header)
+        f.write(body)
+        f.write(strings)
+    os.replace(tmp_path, path)
+
+
+def is_image_fresh(image_path: str = AIRPORTS_IMAGE_PATH, csv_path: str = AIRPORTS_CSV_PATH) -> bool:
+    """Образ есть и собран не раньше текущего CSV"""
+    if not os.path.exists(image_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(image_path) >= os.path.getmtime(csv_path)
+
+
+def build_airport_image(csv_path: str = AIRPORTS_CSV_PATH, image_path: str = AIRPORTS_IMAGE_PATH):
+    """CSV -> двоичный образ (блокирующий вызов - запускать в потоке)"""
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        db = AirportDatabase.from_csv(f, build_index=False)
+    write_airport_image(db, image_path)
+
+
+def open_airport_table(csv_path: str = AIRPORTS_CSV_PATH,
+                       image_path: str = AIRPORTS_IMAGE_PATH) -> 'MappedAirportTable':
+    """Открыть образ, пересобрав его из CSV, если он устарел (блокирующий вызов)"""
+    if not is_image_fresh(image_path, csv_path):
+        build_airport_image(csv_path, image_path)
+    try:
+        return MappedAirportTable(image_path)
+    except ValueError:
+        # Образ прежней версии формата
+        build_airport_image(csv_path, image_path)
+        return MappedAirportTable(image_path)
+
+
+class _Column:
+    """Колонка таблицы, читаемая из образа по требованию"""
+
+    def __init__(self, table: 'MappedAirportTable', field: int):
+        self._table = table
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, index: int):
+        return self._table._value(index, self._field)
+
+
+class _CodeIndex:
+    """Отсортированный индекс "код -> строка" в образе, поиск бинарный"""
+
+    def __init__(self, buffer, offset: int, count: int, entry: struct.Struct, width: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._entry = entry
+        self._width = width
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, position: int) -> bytes:
+        start = self._offset + position * self._entry.size
+        return bytes(self._buffer[start:start + self._width])
+
+    def get(self, code: str, default=None) -> Optional[int]:
+        key = code.encode('ascii', 'ignore').ljust(self._width, b'\0')
+        if len(key) > self._width:
+            return default
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(lo) == key:
+            return self._entry.unpack_from(self._buffer, self._offset + lo * self._entry.size)[1]
+        return default
+
+    def __contains__(self, code: str) -> bool:
+        return self.get(code) is not None
+
+
+class _MappedPostings:
+    """Списки строк по триграммам: срезы общего массива postings"""
+
+    def __init__(self, starts: memoryview, postings: memoryview):
+        self._starts = starts
+        self._postings = postings
+
+    def get(self, gram: str, default=None):
+        slot = _gram_slot(gram)
+        if slot is None:
+            return default
+        start, end = self._starts[slot], self._starts[slot + 1]
+        if start == end:
+            return default
+        return self._postings[start:end]
+
+
+class _MappedTokens:
+    """Отсортированные пары (токен, строка) для bisect по префиксу"""
+
+    def __init__(self, table: 'MappedAirportTable', offset: int, count: int):
+        self._table = table
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> Tuple[str, int]:
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        offset, length, row = TOKEN.unpack_from(self._table._buffer, self._offset + position * TOKEN.size)
+        return self._table._string(offset, length), row
+
+
+class _MappedRowTokens:
+    """Множество токенов строки таблицы"""
+
+    def __init__(self, tokens: _MappedTokens, starts: memoryview, token_ids: memoryview, count: int):
+        self._tokens = tokens
+        self._starts = starts
+        self._token_ids = token_ids
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Set[str]:
+        ids = self._token_ids[self._starts[index]:self._starts[index + 1]]
+        return {self._tokens[position][0] for position in ids}
+
+
+class _MappedCells:
+    """Точки ячеек сетки: срезы общего массива points"""
+
+    def __init__(self, starts: memoryview, points: memoryview):
+        self._starts = starts
+        self._points = points
+
+    def get(self, cell: Tuple[int, int], default=()):
+        slot = _cell_slot(*cell)
+        if slot is None:
+            return default
+        start, end = self._starts[slot], self._starts[slot + 1]
+        if start == end:
+            return default
+        return POINT.iter_unpack(self._points[start * POINT.size:end * POINT.size])
+
+
+class MappedSearchIndex(AirportSearchIndex):
+    """Нечеткий индекс, прочитанный из образа (без построения)"""
+
+    def __init__(self, table: 'MappedAirportTable'):
+        self.db = table
+        self._trigram_postings = _MappedPostings(table._section('gram_starts'),
+                                                 table._section('postings'))
+        self._row_trigrams = table._section('row_trigrams')
+        self._sorted_tokens = _MappedTokens(table, *table._sections['tokens'])
+        self._row_tokens = _MappedRowTokens(self._sorted_tokens, table._section('row_starts'),
+                                            table._section('token_ids'), table._indexed_rows)
+
+
+class MappedSpatialIndex(AirportSpatialIndex):
+    """Пространственный индекс, прочитанный из образа (без построения)"""
+
+    def __init__(self, table: 'MappedAirportTable'):
+        self.db = table
+        self._cells = _MappedCells(table._section('cell_starts'), table._section('points'))
+        self._size = table._sections['points'][1]
+
+
+class MappedAirportTable(AirportDatabase):
+    """Таблица аэропортов поверх общего двоичного образа (mmap, только чтение).
+
+    Записи фиксированной ширины и отсортированные индексы IATA/ICAO читаются
+    прямо из отображенного файла: открытие почти мгновенное, а страницы
+    файла делят между собой все процессы бота через page cache. Нечеткий
+    и пространственный индексы тоже лежат в образе: build_indexes только
+    подключает их разделы, ничего не перестраивая.
+    """
+
+    def __init__(self, path: str = AIRPORTS_IMAGE_PATH):
+        super().__init__()
+        self.path = path
+        self._file = open(path, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views: List[memoryview] = []
+
+        (magic, version, count, iata_count, icao_count, self._records_offset,
+         iata_offset, icao_offset, self._strings_offset, built_at) = HEADER.unpack_from(self._buffer, 0)
+        if magic != IMAGE_MAGIC or version != IMAGE_VERSION:
+            self.close()
+            raise ValueError(f"Неподдерживаемый образ базы аэропортов: {path}")
+
+        index_header = INDEX_HEADER.unpack_from(self._buffer, HEADER.size)
+        self._sections = {name: index_header[2 * i:2 * i + 2] for i, name in enumerate(INDEX_SECTIONS)}
+        self._indexed_rows = index_header[-1]
+
+        self._count = count
+        self.iata_codes = _Column(self, _IATA)
+        self.icao_codes = _Column(self, _ICAO)
+        self.countries = _Column(self, _COUNTRY)
+        self.types = _Column(self, _TYPE)
+        self.latitudes = _Column(self, _LAT)
+        self.longitudes = _Column(self, _LON)
+        self.names = _Column(self, _NAME)
+        self.cities = _Column(self, _CITY)
+        self.keywords = _Column(self, _KEYWORDS)
+        self.by_iata = _CodeIndex(self._buffer, iata_offset, iata_count, IATA_ENTRY, 3)
+        self.by_icao = _CodeIndex(self._buffer, icao_offset, icao_count, ICAO_ENTRY, 4)
+        self.loaded_at = datetime.fromtimestamp(built_at)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _row(self, index: int) -> tuple:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return RECORD.unpack_from(self._buffer, self._records_offset + index * RECORD.size)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return self._buffer[start:start + length].decode('utf-8', 'ignore')
+
+    def _value(self, index: int, field: int):
+        """Одно поле записи - без распаковки всей записи"""
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start = self._records_offset + index * RECORD.size + _FIELD_OFFSETS[field]
+        if field in _CODE_WIDTHS:
+            return self._buffer[start:start + _CODE_WIDTHS[field]].rstrip(b'\0').decode('ascii')
+        if field == _TYPE:
+            return AIRPORT_TYPE_NAMES.get(self._buffer[start], '')
+        if field in (_LAT, _LON):
+            return DOUBLE.unpack_from(self._buffer, start)[0]
+        return self._string(*SPAN.unpack_from(self._buffer, start))
+
+    def _section(self, name: str) -> memoryview:
+        """Раздел индекса как memoryview (массивы - уже приведенные к своему формату)"""
+        offset, count = self._sections[name]
+        item = SECTION_ITEMS[name]
+        size = item.size if isinstance(item, struct.Struct) else struct.calcsize(item)
+        view = memoryview(self._buffer)[offset:offset + count * size]
+        if not isinstance(item, struct.Struct):
+            view = view.cast(item)
+        self._views.append(view)
+        return view
+
+    def build_indexes(self):
+        """Подключить индексы из образа (на big-endian машинах - построить заново)"""
+        if sys.byteorder != 'little':
+            super().build_indexes()
+            return
+        self.search_index = MappedSearchIndex(self)
+        self.spatial_index = MappedSpatialIndex(self)
+
+    def record(self, index: int) -> Dict[str, Any]:
+        row = self._row(index)
+        iata = row[_IATA].rstrip(b'\0').decode('ascii')
+        icao = row[_ICAO].rstrip(b'\0').decode('ascii')
+        return {
+            'name': self._string(row[_NAME], row[_NAME + 1]),
+            'city': self._string(row[_CITY], row[_CITY + 1]),
+            'country': row[_COUNTRY].rstrip(b'\0').decode('ascii'),
+            'iata': iata or None,
+            'icao': icao or None,
+            'latitude': row[_LAT],
+            'longitude': row[_LON]
+        }
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        try:
+            self._buffer.close()
+        except BufferError:
+            # Срез индекса еще используется - отображение освободится вместе с ним
+            pass
+        self._file.close()
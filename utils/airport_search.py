@@ -0,0 +1,189 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+# Транслитерация кириллицы в латиницу (упрощенная, близкая к написанию в OurAirports)
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u',
+}
+
+# Слова, которые есть почти в каждом названии и не помогают поиску
+STOP_WORDS = {
+    'airport', 'international', 'intl', 'air', 'base', 'airfield', 'aerodrome',
+    'regional', 'municipal', 'field', 'aeroport', 'aeroporto', 'aeropuerto',
+    'mezhdunarodnyy', 'mezhdunarodnyi', 'of', 'the', 'de', 'i', 'im', 'imeni',
+}
+
+# Русские названия городов и аэропортов после транслитерации -> написание
+# в OurAirports. Триграммы "moskva" и "moscow" почти не пересекаются, поэтому
+# без замены "Москва" находит Мосул, а не Шереметьево.
+EXONYMS = {
+    'moskva': 'moscow', 'sankt': 'st', 'saint': 'st', 'peterburg': 'petersburg',
+    'piter': 'petersburg', 'ekaterinburg': 'yekaterinburg', 'nizhniy': 'nizhny',
+    'donu': 'don', 'kiev': 'kyiv', 'kiyev': 'kyiv', 'erevan': 'yerevan',
+    'varshava': 'warsaw', 'praga': 'prague', 'vena': 'vienna', 'rim': 'rome',
+    'parizh': 'paris', 'afiny': 'athens', 'stambul': 'istanbul', 'dubay': 'dubai',
+    'kair': 'cairo', 'venetsiya': 'venice', 'barselona': 'barcelona',
+    'myunkhen': 'munich', 'zheneva': 'geneva', 'tsyurikh': 'zurich',
+    'bryussel': 'brussels', 'kopengagen': 'copenhagen', 'stokgolm': 'stockholm',
+    'khelsinki': 'helsinki', 'vilnyus': 'vilnius', 'tallin': 'tallinn',
+    'pekin': 'beijing', 'tokio': 'tokyo', 'seul': 'seoul', 'deli': 'delhi',
+    'nyu': 'new', 'khitrou': 'heathrow', 'gatvik': 'gatwick',
+}
+
+_non_word = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text: str) -> List[str]:
+    """Текст -> список латинских токенов без диакритики и стоп-слов"""
+    text = ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text.lower())
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return [EXONYMS.get(token, token) for token in _non_word.split(text) if token and token not in STOP_WORDS]
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AirportSearchIndex:
+    """Нечеткий поиск аэропортов по названию, городу и ключевым словам.
+
+    Все тексты приводятся к латинице, поэтому "Шереметьево", "Sheremetyevo"
+    и "Москва" попадают в одни и те же триграммы. Кандидаты набираются по
+    инвертированному индексу триграмм и префиксов токенов, затем
+    ранжируются по сходству, точным совпадениям и размеру аэропорта.
+    """
+
+    # Слишком частые триграммы не дают кандидатов
+    MAX_POSTINGS = 3000
+
+    # Автовыбор аэропорта: минимальная оценка и отрыв от второго варианта
+    MIN_CONFIDENCE = 0.8
+    MIN_MARGIN = 0.25
+
+    def __init__(self, airport_db):
+        self.db = airport_db
+        self._trigram_postings: Dict[str, List[int]] = defaultdict(list)
+        self._row_trigrams: Dict[int, int] = {}
+        self._row_tokens: Dict[int, Set[str]] = {}
+        self._sorted_tokens: List[Tuple[str, int]] = []
+        self._build()
+
+    def _build(self):
+        db = self.db
+        token_pairs = []
+        for index in range(len(db)):
+            # Для бота нужны аэропорты с обоими кодами
+            if not (db.iata_codes[index] and db.icao_codes[index]):
+                continue
+
+            tokens = set(normalize(f"{db.names[index]} {db.cities[index]} {db.keywords[index]}"))
+            if not tokens:
+                continue
+
+            row_grams = set()
+            for token in tokens:
+                row_grams |= trigrams(token)
+                token_pairs.append((token, index))
+            for gram in row_grams:
+                self._trigram_postings[gram].append(index)
+
+            self._row_trigrams[index] = len(row_grams)
+            self._row_tokens[index] = tokens
+
+        self._sorted_tokens = sorted(token_pairs)
+
+    def __len__(self) -> int:
+        return len(self._row_tokens)
+
+    def _prefix_rows(self, prefix: str, limit: int = 200) -> Set[int]:
+        rows = set()
+        pos = bisect_left(self._sorted_tokens, (prefix, -1))
+        while pos < len(self._sorted_tokens) and len(rows) < limit:
+            token, index = self._sorted_tokens[pos]
+            if not token.startswith(prefix):
+                break
+            rows.add(index)
+            pos += 1
+        return rows
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, int]]:
+        """Лучшие совпадения [(оценка, номер строки)] по убыванию оценки"""
+        db = self.db
+        results: Dict[int, float] = {}
+
+        # Точное совпадение кода - всегда первым
+        code = query.strip().upper()
+        if code.isalpha() and len(code) in (3, 4):
+            index = db.by_iata.get(code) if len(code) == 3 else db.by_icao.get(code)
+            if index is not None:
+                results[index] = 10.0
+
+        tokens = normalize(query)
+        if not tokens:
+            return sorted(((score, i) for i, score in results.items()), reverse=True)[:limit]
+
+        query_grams = set()
+        for token in tokens:
+            query_grams |= trigrams(token)
+
+        hits: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            postings = self._trigram_postings.get(gram)
+            if postings and len(postings) <= self.MAX_POSTINGS:
+                for index in postings:
+                    hits[index] += 1
+
+        # Префиксы токенов (ввод по мере набора: "шере", "pulk")
+        prefix_rows: Set[int] = set()
+        for token in tokens:
+            if len(token) >= 2:
+                prefix_rows |= self._prefix_rows(token)
+        for index in prefix_rows:
+            hits.setdefault(index, 0)
+
+        for index, common in hits.items():
+            row_tokens = self._row_tokens[index]
+            # Сходство Жаккара по триграммам
+            score = common / (len(query_grams) + self._row_trigrams[index] - common)
+
+            for token in tokens:
+                if token in row_tokens:
+                    score += 0.5
+                elif any(row_token.startswith(token) for row_token in row_tokens):
+                    score += 0.3
+
+            size = db.types[index]
+            if size == 'large_airport':
+                score += 0.15
+            elif size == 'medium_airport':
+                score += 0.05
+
+            results[index] = max(results.get(index, 0.0), score)
+
+        ranked = sorted(((score, index) for index, score in results.items()), reverse=True)
+        return [(score, index) for score, index in ranked[:limit] if score >= 0.2]
+
+    def resolve(self, query: str) -> Optional[int]:
+        """Строка аэропорта, если совпадение однозначное, иначе None.
+
+        Несколько близких вариантов ("Москва", "Лондон") или слабое
+        совпадение - не повод выбирать за пользователя.
+        """
+        ranked = self.search(query, limit=2)
+        if not ranked:
+            return None
+        best_score, best_index = ranked[0]
+        if best_score < self.MIN_CONFIDENCE:
+            return None
+        if len(ranked) > 1 and best_score - ranked[1][0] < self.MIN_MARGIN:
+            return None
+        return best_index
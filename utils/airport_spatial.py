@@ -0,0 +1,88 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from utils.route_geometry import great_circle_km
+
+# Размер ячейки сетки в градусах и длина градуса широты в км
+CELL_DEGREES = 1.0
+KM_PER_DEGREE = 111.195
+MAX_DISTANCE_KM = 20038  # половина окружности Земли
+
+
+class AirportSpatialIndex:
+    """Пространственный индекс аэропортов на сетке широта/долгота.
+
+    Аэропорты разложены по ячейкам CELL_DEGREES x CELL_DEGREES. Запрос по
+    радиусу просматривает только ячейки, пересекающие окружность (с учетом
+    сужения меридианов к полюсам и перехода через 180-й меридиан), и
+    проверяет кандидатов точным расстоянием по большому кругу.
+    Ближайшие k ищутся расширением радиуса, пока не наберется k точек.
+    """
+
+    LON_CELLS = int(360 / CELL_DEGREES)
+
+    def __init__(self, airport_db, require_iata: bool = True):
+        self.db = airport_db
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, int]]] = defaultdict(list)
+        self._size = 0
+
+        for index in range(len(airport_db)):
+            if require_iata and not airport_db.iata_codes[index]:
+                continue
+            latitude = airport_db.latitudes[index]
+            longitude = airport_db.longitudes[index]
+            if latitude == 0 and longitude == 0:
+                continue
+            self._cells[self._cell(latitude, longitude)].append((latitude, longitude, index))
+            self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (int(math.floor(latitude / CELL_DEGREES)),
+                int(math.floor(longitude / CELL_DEGREES)) % self.LON_CELLS)
+
+    def within_radius(self, latitude: float, longitude: float,
+                      radius_km: float) -> List[Tuple[float, int]]:
+        """Аэропорты не дальше radius_km: [(расстояние км, номер строки)] по возрастанию"""
+        radius_km = min(radius_km, MAX_DISTANCE_KM)
+        dlat = radius_km / KM_PER_DEGREE
+        lat_min = max(-90.0, latitude - dlat)
+        lat_max = min(90.0, latitude + dlat)
+
+        # Ширина полосы по долготе - по самой "узкой" широте диапазона
+        widest = max(abs(lat_min), abs(lat_max))
+        if widest >= 89.9:
+            lon_cells = range(self.LON_CELLS)
+        else:
+            dlon = dlat / math.cos(math.radians(widest))
+            if dlon >= 180:
+                lon_cells = range(self.LON_CELLS)
+            else:
+                first = int(math.floor((longitude - dlon) / CELL_DEGREES))
+                last = int(math.floor((longitude + dlon) / CELL_DEGREES))
+                lon_cells = [cell % self.LON_CELLS for cell in range(first, last + 1)]
+
+        results = []
+        for lat_cell in range(int(math.floor(lat_min / CELL_DEGREES)), int(math.floor(lat_max / CELL_DEGREES)) + 1):
+            for lon_cell in lon_cells:
+                for point_lat, point_lon, index in self._cells.get((lat_cell, lon_cell), ()):
+                    distance = great_circle_km(latitude, longitude, point_lat, point_lon)
+                    if distance <= radius_km:
+                        results.append((distance, index))
+
+        results.sort()
+        return results
+
+    def nearest(self, latitude: float, longitude: float, k: int = 10,
+                start_radius_km: float = 100) -> List[Tuple[float, int]]:
+        """k ближайших аэропортов: [(расстояние км, номер строки)]"""
+        radius = start_radius_km
+        while True:
+            results = self.within_radius(latitude, longitude, radius)
+            # Все точки в радиусе найдены, значит k-я по счету - точно k-я ближайшая
+            if len(results) >= k or radius >= MAX_DISTANCE_KM:
+                return results[:k]
+            radius *= 2
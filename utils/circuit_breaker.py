@@ -0,0 +1,131 @@
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+
+class CircuitBreaker:
+    """Предохранитель и метрики одного внешнего источника.
+
+    closed - запросы идут как обычно. После failure_threshold ошибок подряд
+    или доли ошибок выше error_rate_threshold в скользящем окне цепь
+    размыкается (open): запросы к источнику пропускаются мгновенно.
+    Через reset_timeout секунд пропускается один пробный запрос
+    (half_open): успех замыкает цепь, ошибка снова размыкает.
+
+    Для последних window_size вызовов хранятся задержки - из них строится
+    гистограмма и перцентили для проверки здоровья и админ-панели.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    # Границы корзин гистограммы задержек, мс
+    LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, name: str, failure_threshold: int = 3, error_rate_threshold: float = 0.5,
+                 min_calls: int = 10, reset_timeout: float = 60, window_size: int = 100):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._window: deque = deque(maxlen=window_size)  # (задержка мс, успех)
+        self.stats = {
+            'calls': 0,
+            'failures': 0,
+            'skipped': 0,
+            'opened': 0
+        }
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к источнику"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.stats['skipped'] += 1
+        return False
+
+    def record_success(self, latency_ms: float):
+        self._consecutive_failures = 0
+        if self.state == self.HALF_OPEN:
+            # Окно с ошибками до размыкания иначе сразу разомкнуло бы цепь снова
+            self._window.clear()
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+        self._record(latency_ms, True)
+
+    def record_failure(self, latency_ms: float):
+        self._record(latency_ms, False)
+        self.stats['failures'] += 1
+        self._consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self._should_open():
+            self._open()
+
+    def release(self):
+        """Вызов отменен (ответ пришел от другого источника) - не ошибка"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _record(self, latency_ms: float, ok: bool):
+        self.stats['calls'] += 1
+        self._window.append((latency_ms, ok))
+
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= self.failure_threshold:
+            return True
+        return len(self._window) >= self.min_calls and self.error_rate() >= self.error_rate_threshold
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.stats['opened'] += 1
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    # Метрики
+    def error_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return sum(1 for _, ok in self._window if not ok) / len(self._window)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._window:
+            return None
+        latencies = sorted(latency for latency, _ in self._window)
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    def histogram(self) -> List[int]:
+        """Число вызовов по корзинам LATENCY_BUCKETS (последняя - больше максимума)"""
+        counts = [0] * (len(self.LATENCY_BUCKETS) + 1)
+        for latency, _ in self._window:
+            counts[bisect_left(self.LATENCY_BUCKETS, latency)] += 1
+        return counts
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return {
+            'state': self.state,
+            'error_rate': self.error_rate(),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'histogram': self.histogram(),
+            'retry_in': retry_in,
+            **self.stats
+        }
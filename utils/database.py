@@ -1,21 +1,306 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import firestore
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+# Напоминания, на которые подписывается пассажир по умолчанию
+DEFAULT_NOTIFICATIONS = ['24h', '6h', '1h', '30min', 'server_open']
+
+# Статусы рейса в агрегированной статистике авиакомпании
+FLIGHT_STATUSES = ('scheduled', 'boarding', 'departed', 'delayed', 'cancelled', 'completed')
+
 
 class DatabaseHandler:
-    def __init__(self, db):
+    """Асинхронный шлюз к Firestore.
+
+    Клиент firebase_admin синхронный, поэтому каждый сетевой вызов
+    выполняется в собственном пуле потоков, а не в event loop.
+    Коги не должны вызывать .get()/.stream()/.update() напрямую -
+    только через методы этого класса.
+    """
+
+    # Лимит операций в одном WriteBatch Firestore
+    MAX_BATCH_OPS = 500
+
+    def __init__(self, db, max_workers: int = 16):
         self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='firestore'
+        )
         self._airline_cache = {}
         self._partners_cache = None
         self._cache_time = {}
+        # Обратный индекс: ID пользователя -> ID авиакомпании (владелец и сотрудники)
+        self._member_index: Dict[str, str] = {}
+        self._member_index_ready = False
+        # Метрики пакетной записи
+        self.batch_stats = {
+            'batches': 0,
+            'operations': 0,
+            'max_batch_size': 0,
+            'failed_batches': 0,
+            'last_latency_ms': 0.0,
+            'total_latency_ms': 0.0
+        }
 
     def _is_cache_valid(self, key, ttl=300):
         if key not in self._cache_time:
             return False
         return (datetime.now() - self._cache_time[key]).total_seconds() < ttl
 
+    # Базовые операции
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить блокирующий вызов Firestore в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def collection(self, name: str):
+        """Ссылка на коллекцию (без сетевого запроса)"""
+        return self.db.collection(name)
+
+    async def fetch(self, query) -> List[Any]:
+        """Выполнить запрос и вернуть список документов"""
+        return list(await self.run(query.get))
+
+    async def stream(self, query) -> List[Any]:
+        """Прочитать поток документов целиком"""
+        return await self.run(lambda: list(query.stream()))
+
+    async def fetch_page(self, query, limit: int, start_after=None) -> List[Any]:
+        """Страница запроса: не больше limit документов после курсора (снимка документа)"""
+        if start_after is not None:
+            query = query.start_after(start_after)
+        return await self.fetch(query.limit(limit))
+
+    async def count(self, query) -> int:
+        """Подсчет документов через aggregation-запрос"""
+        result = await self.run(query.count().get)
+        return result[0][0].value if result else 0
+
+    async def get_document(self, collection: str, doc_id: str):
+        """Получить снимок документа"""
+        return await self.run(self.db.collection(collection).document(doc_id).get)
+
+    async def add_document(self, collection: str, data: Dict) -> str:
+        """Добавить документ и вернуть его ID"""
+        _, doc_ref = await self.run(self.db.collection(collection).add, data)
+        return doc_ref.id
+
+    async def set_document(self, collection: str, doc_id: str, data: Dict, merge: bool = False):
+        """Записать документ целиком"""
+        await self.run(self.db.collection(collection).document(doc_id).set, data, merge=merge)
+
+    async def update_document(self, collection: str, doc_id: str, data: Dict):
+        """Частично обновить документ"""
+        await self.run(self.db.collection(collection).document(doc_id).update, data)
+        if collection == 'airlines':
+            self._invalidate_airline(doc_id)
+
+    async def delete_document(self, collection: str, doc_id: str):
+        """Удалить документ"""
+        await self.run(self.db.collection(collection).document(doc_id).delete)
+        if collection == 'airlines':
+            self._invalidate_airline(doc_id)
+            self._unindex_airline(doc_id)
+
+    async def commit_updates(self, updates: List[Tuple[str, str, Dict]],
+                             merges: Optional[List[Tuple[str, str, Dict]]] = None) -> List[Tuple[str, str]]:
+        """Частичные обновления пакетами WriteBatch (до MAX_BATCH_OPS операций).
+
+        updates применяются через update (документ должен существовать),
+        merges - через set(merge=True) с вложенными словарями.
+        Если пакет не применился (например, документ удален), его операции
+        повторяются по одной. Возвращает (коллекция, ID) неудавшихся записей.
+        """
+        operations = [(False, op) for op in updates] + [(True, op) for op in merges or []]
+        failed = []
+        for start in range(0, len(operations), self.MAX_BATCH_OPS):
+            chunk = operations[start:start + self.MAX_BATCH_OPS]
+            batch = self.db.batch()
+            for merge, (collection, doc_id, data) in chunk:
+                ref = self.db.collection(collection).document(doc_id)
+                if merge:
+                    batch.set(ref, data, merge=True)
+                else:
+                    batch.update(ref, data)
+
+            started = time.perf_counter()
+            try:
+                await self.run(batch.commit)
+            except Exception as e:
+                self.batch_stats['failed_batches'] += 1
+                print(f"Ошибка пакетной записи ({len(chunk)} операций), пишем по одной: {e}")
+                results = await asyncio.gather(
+                    *(
+                        self.set_document(collection, doc_id, data, merge=True) if merge
+                        else self.update_document(collection, doc_id, data)
+                        for merge, (collection, doc_id, data) in chunk
+                    ),
+                    return_exceptions=True
+                )
+                failed.extend(
+                    (collection, doc_id)
+                    for (_, (collection, doc_id, _)), result in zip(chunk, results)
+                    if isinstance(result, Exception)
+                )
+                continue
+
+            self._record_batch(len(chunk), started)
+
+            for _, (collection, doc_id, _) in chunk:
+                if collection == 'airlines':
+                    self._invalidate_airline(doc_id)
+
+        return failed
+
+    async def add_documents(self, documents: List[Tuple[str, Dict]]):
+        """Добавить документы (коллекция, данные) с автоматическими ID пакетами WriteBatch"""
+        for start in range(0, len(documents), self.MAX_BATCH_OPS):
+            chunk = documents[start:start + self.MAX_BATCH_OPS]
+            batch = self.db.batch()
+            for collection, data in chunk:
+                batch.set(self.db.collection(collection).document(), data)
+
+            started = time.perf_counter()
+            try:
+                await self.run(batch.commit)
+            except Exception:
+                self.batch_stats['failed_batches'] += 1
+                raise
+            self._record_batch(len(chunk), started)
+
+    def _record_batch(self, size: int, started: float):
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.batch_stats['batches'] += 1
+        self.batch_stats['operations'] += size
+        self.batch_stats['max_batch_size'] = max(self.batch_stats['max_batch_size'], size)
+        self.batch_stats['last_latency_ms'] = round(latency_ms, 1)
+        self.batch_stats['total_latency_ms'] += latency_ms
+
+    def close(self):
+        """Остановка пула потоков"""
+        self._executor.shutdown(wait=False)
+
     # Авиакомпании
+    def _invalidate_airline(self, airline_id: str):
+        """Сбросить кэш авиакомпании после записи"""
+        self._airline_cache.pop(f"id_{airline_id}", None)
+        for key, cached in list(self._airline_cache.items()):
+            if key.startswith('owner_') and cached and cached.get('id') == airline_id:
+                self._airline_cache.pop(key, None)
+
+    @staticmethod
+    def member_ids_of(airline_data: Dict) -> List[str]:
+        """ID всех участников авиакомпании: владелец и сотрудники"""
+        members = []
+        owner_id = airline_data.get('owner_id')
+        if owner_id:
+            members.append(str(owner_id))
+        for emp in airline_data.get('employees', []):
+            user_id = emp.get('user_id')
+            if user_id and str(user_id) not in members:
+                members.append(str(user_id))
+        return members
+
+    def _index_airline(self, airline_id: str, airline_data: Dict):
+        """Обновить обратный индекс для одной авиакомпании"""
+        members = self.member_ids_of(airline_data)
+        for user_id, indexed_id in list(self._member_index.items()):
+            if indexed_id == airline_id and user_id not in members:
+                del self._member_index[user_id]
+
+        # Владелец всегда важнее членства сотрудником в другой авиакомпании
+        owner_id = str(airline_data.get('owner_id', ''))
+        for user_id in members:
+            if user_id == owner_id:
+                self._member_index[user_id] = airline_id
+            else:
+                self._member_index.setdefault(user_id, airline_id)
+
+    def _unindex_airline(self, airline_id: str):
+        """Удалить авиакомпанию из обратного индекса"""
+        for user_id, indexed_id in list(self._member_index.items()):
+            if indexed_id == airline_id:
+                del self._member_index[user_id]
+
+    async def build_member_index(self):
+        """Построить индекс участников одним проходом по airlines.
+
+        Заодно дописывает поле member_ids в документы, созданные до его
+        появления, чтобы запасной запрос array_contains видел все авиакомпании.
+        """
+        airlines = await self.stream(self.db.collection('airlines'))
+        self._member_index.clear()
+
+        # Сначала сотрудники, затем владельцы - владелец перезапишет запись
+        owners = []
+        for doc in airlines:
+            data = doc.to_dict()
+            members = self.member_ids_of(data)
+            for user_id in members:
+                self._member_index.setdefault(user_id, doc.id)
+            if data.get('owner_id'):
+                owners.append((str(data['owner_id']), doc.id))
+            if data.get('member_ids') != members:
+                await self.run(doc.reference.update, {'member_ids': members})
+        for owner_id, airline_id in owners:
+            self._member_index[owner_id] = airline_id
+
+        self._member_index_ready = True
+        return len(self._member_index)
+
+    async def get_airline_by_member(self, user_id: str) -> Optional[Dict]:
+        """Получить авиакомпанию, где пользователь владелец или сотрудник"""
+        user_id = str(user_id)
+        if self._member_index_ready:
+            airline_id = self._member_index.get(user_id)
+            if airline_id:
+                airline = await self.get_airline_by_id(airline_id)
+                if airline:
+                    return airline
+                # Авиакомпании уже нет - запись индекса устарела
+                self._unindex_airline(airline_id)
+
+        # Индекс не построен или не знает пользователя (изменения из другого
+        # процесса, ручные правки) - запрос по денормализованному полю
+        query = self.db.collection('airlines').where(
+            'member_ids', 'array_contains', user_id
+        ).limit(1)
+        results = await self.fetch(query)
+        if not results:
+            return None
+        data = results[0].to_dict()
+        data['id'] = results[0].id
+        if self._member_index_ready:
+            self._index_airline(results[0].id, data)
+        return data
+
+    async def create_airline(self, airline_data: Dict) -> str:
+        """Создать авиакомпанию и внести ее в индекс участников"""
+        airline_data['member_ids'] = self.member_ids_of(airline_data)
+        airline_id = await self.add_document('airlines', airline_data)
+        self._index_airline(airline_id, airline_data)
+        await self.bump_daily_counter('airlines_created')
+        return airline_id
+
+    async def update_airline_employees(self, airline_id: str, airline_data: Dict, employees: List[Dict]):
+        """Записать список сотрудников вместе с member_ids"""
+        airline_data = {**airline_data, 'employees': employees}
+        members = self.member_ids_of(airline_data)
+        await self.update_document('airlines', airline_id, {
+            'employees': employees,
+            'member_ids': members
+        })
+        self._index_airline(airline_id, airline_data)
+
     async def get_airline_by_owner(self, owner_id: str) -> Optional[Dict]:
         """Получить авиакомпанию по ID владельца"""
         cache_key = f"owner_{owner_id}"
@@ -24,7 +309,7 @@ class DatabaseHandler:
 
         airlines_ref = self.db.collection('airlines')
         query = airlines_ref.where('owner_id', '==', str(owner_id)).limit(1)
-        results = query.get()
+        results = await self.fetch(query)
 
         if len(results) > 0:
             data = results[0].to_dict()
@@ -40,8 +325,7 @@ class DatabaseHandler:
         if self._is_cache_valid(cache_key):
             return self._airline_cache.get(cache_key)
 
-        airline_ref = self.db.collection('airlines').document(airline_id)
-        airline = airline_ref.get()
+        airline = await self.get_document('airlines', airline_id)
 
         if airline.exists:
             data = airline.to_dict()
@@ -53,75 +337,187 @@ class DatabaseHandler:
 
     async def update_airline_stats(self, airline_id: str, stats_update: Dict):
         """Обновить статистику авиакомпании"""
-        airline_ref = self.db.collection('airlines').document(airline_id)
-
         # Инвалидируем кэш
         self._airline_cache.pop(f"id_{airline_id}", None)
         # Нам сложно найти ключ по owner_id без запроса, поэтому просто очистим или подождем TTL
 
-        # Получаем текущие статистики
-        airline = airline_ref.get()
-        if airline.exists:
-            current_stats = airline.to_dict().get('statistics', {})
+        updates = {
+            f'statistics.{key}': firestore.Increment(value)
+            for key, value in stats_update.items()
+        }
+        updates['updated_at'] = datetime.now().isoformat()
+        await self.update_document('airlines', airline_id, updates)
 
-            # Обновляем статистики
-            for key, value in stats_update.items():
-                if key in current_stats:
-                    current_stats[key] += value
-                else:
-                    current_stats[key] = value
+    # Дневные счетчики (коллекция stats, документы daily_ГГГГ-ММ-ДД)
+    async def bump_daily_counter(self, field: str, amount: int = 1):
+        """Увеличить дневной счетчик за сегодня"""
+        day = datetime.now().strftime("%Y-%m-%d")
+        try:
+            await self.set_document('stats', f'daily_{day}', {
+                'date': day,
+                field: firestore.Increment(amount)
+            }, merge=True)
+        except Exception as e:
+            print(f"Ошибка обновления дневного счетчика {field}: {e}")
 
-            # Сохраняем
-            airline_ref.update({
-                'statistics': current_stats,
-                'updated_at': datetime.now().isoformat()
+    async def get_daily_counters(self, day: Optional[str] = None) -> Dict:
+        """Дневные счетчики одним чтением документа"""
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        doc = await self.get_document('stats', f'daily_{day}')
+        return doc.to_dict() if doc.exists else {'date': day}
+
+    # Агрегированная статистика авиакомпаний (коллекция airline_stats)
+    @staticmethod
+    def airline_stats_delta(flights: int = 0, status_from: Optional[str] = None,
+                            status_to: Optional[str] = None, subscriptions: int = 0,
+                            created_at: Optional[str] = None) -> Dict:
+        """Инкременты документа airline_stats для set(merge=True)"""
+        delta = {'updated_at': datetime.now().isoformat()}
+        if flights:
+            delta['total_flights'] = firestore.Increment(flights)
+        status_counts = {}
+        if status_from:
+            status_counts[status_from] = firestore.Increment(-1)
+        if status_to:
+            status_counts[status_to] = firestore.Increment(1)
+        if status_counts:
+            delta['status_counts'] = status_counts
+        if subscriptions:
+            delta['total_subscriptions'] = firestore.Increment(subscriptions)
+        if created_at:
+            day = created_at[:10]
+            delta['daily_flights'] = {day: firestore.Increment(flights or 1)}
+        return delta
+
+    async def bump_airline_stats(self, airline_id: str, **delta):
+        """Инкрементально обновить статистику авиакомпании"""
+        await self.set_document('airline_stats', airline_id, self.airline_stats_delta(**delta), merge=True)
+
+    async def rebuild_airline_stats(self, airline_id: str) -> Dict:
+        """Пересчитать статистику авиакомпании по рейсам (один раз для старых данных)"""
+        flights = await self.fetch(
+            self.db.collection('flights').where('airline_id', '==', airline_id)
+        )
+
+        status_counts = {status: 0 for status in FLIGHT_STATUSES}
+        daily_flights = {}
+        total_subscriptions = 0
+        for flight in flights:
+            flight_data = flight.to_dict()
+            status = flight_data.get('status', 'scheduled')
+            if status in status_counts:
+                status_counts[status] += 1
+            total_subscriptions += flight_data.get('subscriptions', 0)
+            created_at = flight_data.get('created_at', '')
+            if created_at:
+                day = created_at[:10]
+                daily_flights[day] = daily_flights.get(day, 0) + 1
+
+        stats = {
+            'total_flights': len(flights),
+            'status_counts': status_counts,
+            'total_subscriptions': total_subscriptions,
+            'daily_flights': daily_flights,
+            'updated_at': datetime.now().isoformat(),
+            'rebuilt_at': datetime.now().isoformat()
+        }
+        await self.set_document('airline_stats', airline_id, stats)
+        return stats
+
+    async def get_airline_stats(self, airline_id: str) -> Dict:
+        """Статистика авиакомпании одним чтением документа.
+
+        Возвращает также recent_flights - рейсы, созданные за последние 30 дней.
+        """
+        doc = await self.get_document('airline_stats', airline_id)
+        stats = doc.to_dict() if doc.exists else None
+        # Документ без rebuilt_at собран только из инкрементов - старые рейсы в нем не учтены
+        if not stats or 'rebuilt_at' not in stats:
+            stats = await self.rebuild_airline_stats(airline_id)
+
+        cutoff = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        daily_flights = stats.get('daily_flights', {})
+        stats['recent_flights'] = sum(n for day, n in daily_flights.items() if day >= cutoff)
+
+        # Дни старше окна больше не нужны - убираем их из документа
+        expired = [day for day in daily_flights if day < cutoff]
+        if expired:
+            await self.update_document('airline_stats', airline_id, {
+                f'daily_flights.`{day}`': firestore.DELETE_FIELD for day in expired
             })
+        return stats
 
     # Рейсы
     async def create_flight(self, flight_data: Dict) -> str:
         """Создать новый рейс"""
-        flights_ref = self.db.collection('flights')
-        flight_doc = flights_ref.add(flight_data)
-        return flight_doc[1].id
+        flight_id = await self.add_document('flights', flight_data)
+        await self.bump_daily_counter('flights_created')
+        if flight_data.get('airline_id'):
+            await self.bump_airline_stats(
+                flight_data['airline_id'],
+                flights=1,
+                status_to=flight_data.get('status', 'scheduled'),
+                created_at=flight_data.get('created_at')
+            )
+        return flight_id
 
     async def get_flights_by_airline(self, airline_id: str) -> List[Dict]:
         """Получить все рейсы авиакомпании"""
         flights_ref = self.db.collection('flights')
         query = flights_ref.where('airline_id', '==', airline_id)
-        results = query.get()
+        results = await self.fetch(query)
 
         return [doc.to_dict() for doc in results]
 
-    async def update_flight_status(self, flight_id: str, status: str):
+    async def update_flight_status(self, flight_id: str, status: str,
+                                   previous_status: Optional[str] = None, airline_id: Optional[str] = None):
         """Обновить статус рейса"""
         try:
-            flight_ref = self.db.collection('flights').document(flight_id)
-            flight_ref.update({
+            await self.update_document('flights', flight_id, {
                 'status': status,
                 'updated_at': datetime.now().isoformat()
             })
+            if airline_id:
+                await self.bump_airline_stats(airline_id, status_from=previous_status, status_to=status)
         except Exception as e:
             print(f"Ошибка обновления статуса рейса {flight_id}: {e}")
 
     # Подписки
-    async def add_subscription(self, user_id: str, flight_id: str):
-        """Добавить подписку на уведомления о рейсе"""
+    async def add_subscription(self, user_id: str, flight_id: str, username: str = None) -> Optional[str]:
+        """Добавить подписку на уведомления о рейсе.
+
+        Возвращает ID новой подписки или None, если она уже существует.
+        """
         subs_ref = self.db.collection('subscriptions')
 
         # Проверяем, есть ли уже подписка
         query = subs_ref.where('user_id', '==', user_id).where('flight_id', '==', flight_id).limit(1)
-        existing = query.get()
+        existing = await self.fetch(query)
 
         if len(existing) == 0:
             subscription_data = {
                 'user_id': user_id,
+                'username': username,
                 'flight_id': flight_id,
                 'created_at': datetime.now().isoformat(),
+                'notifications': list(DEFAULT_NOTIFICATIONS),
                 'notifications_sent': []
             }
-            subs_ref.add(subscription_data)
-            return True
-        return False
+            # Документ подписки и счетчик подписок рейса - параллельно
+            subscription_id, _ = await asyncio.gather(
+                self.add_document('subscriptions', subscription_data),
+                self.update_document('flights', flight_id, {
+                    'subscriptions': firestore.Increment(1)
+                })
+            )
+            return subscription_id
+        return None
+
+    async def mark_notification_sent(self, subscription_id: str, notification_type: str):
+        """Отметить напоминание подписки как отправленное"""
+        await self.update_document('subscriptions', subscription_id, {
+            'notifications_sent': firestore.ArrayUnion([notification_type])
+        })
 
     # Партнеры
     async def get_all_partners(self) -> List[Dict]:
@@ -131,9 +527,13 @@ class DatabaseHandler:
 
         partners_ref = self.db.collection('partners')
         query = partners_ref.where('status', '==', 'active')
-        results = query.get()
+        results = await self.fetch(query)
 
-        data = [doc.to_dict() for doc in results]
+        data = []
+        for doc in results:
+            partner = doc.to_dict()
+            partner['id'] = doc.id
+            data.append(partner)
         self._partners_cache = data
         self._cache_time['partners'] = datetime.now()
         return data
@@ -143,6 +543,6 @@ class DatabaseHandler:
         """Получить все ожидающие заявки"""
         apps_ref = self.db.collection('airline_applications')
         query = apps_ref.where('status', '==', 'pending')
-        results = query.get()
+        results = await self.fetch(query)
 
-        return [(doc.id, doc.to_dict()) for doc in results]
\ No newline at end of file
+        return [(doc.id, doc.to_dict()) for doc in results]
@@ -0,0 +1,322 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+import discord
+from discord.ui import View, Select
+from firebase_admin import firestore
+
+from utils.flight_replica import FlightReplica
+
+# Не больше одной правки табло в канале за это время, секунды
+# (лимит Discord на изменение сообщений - 5 запросов за 5 секунд на канал)
+EDIT_INTERVAL = 5.0
+# Сколько рейсов показывать на табло
+MAX_ROWS = 20
+# Сколько уже вылетевших рейсов держать на табло, если хватает предстоящих
+MAX_DEPARTED_ROWS = 5
+
+STATUS_LABELS = {
+    'scheduled': '🟢 По расписанию',
+    'boarding': '🟡 Посадка',
+    'delayed': '🟠 Задержан',
+    'departed': '✈️ Вылетел'
+}
+
+
+class BoardSubscribeSelect(Select):
+    """Подписка на рейс прямо с табло вылетов"""
+
+    def __init__(self, options: List[discord.SelectOption]):
+        super().__init__(
+            placeholder="🔔 Подписаться на рейс с табло...",
+            options=options,
+            custom_id="departure_board:subscribe"
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        try:
+            await interaction.response.defer(ephemeral=True)
+        except discord.HTTPException:
+            return
+
+        data = interaction.client.data
+        flight_id = self.values[0]
+        flight_data = data.flight_replica.get(flight_id)
+        if flight_data is None:
+            await interaction.followup.send("❌ Рейс уже завершен или отменен.", ephemeral=True)
+            return
+
+        created = await data.add_subscription(str(interaction.user.id), flight_id, username=str(interaction.user))
+        flight_text = (f"**{flight_data.get('flight_number', 'N/A')}** {flight_data.get('departure_code', '???')} → "
+                       f"{flight_data.get('arrival_code', '???')}, {flight_data.get('departure_date', '')} "
+                       f"{flight_data.get('departure_time', '')}")
+        if not created:
+            await interaction.followup.send(f"ℹ️ Вы уже подписаны на рейс {flight_text}", ephemeral=True)
+            return
+        await interaction.followup.send(f"✅ Вы подписались на уведомления о рейсе {flight_text}", ephemeral=True)
+
+
+class _ChannelBoard:
+    """Табло в одном партнерском канале"""
+
+    def __init__(self, partner_id: str, channel_id: int, message_id: Optional[int] = None):
+        self.partner_id = partner_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.rendered: Optional[List[str]] = None  # строки, которые сейчас в сообщении
+        self.flight_ids: set = set()  # рейсы, которые уже были на табло
+        self.last_edit = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.dirty = False  # были изменения после начала текущей правки
+        self.disabled = False
+
+
+class DepartureBoards:
+    """Живые табло вылетов в каналах партнеров.
+
+    В каждом партнерском канале одно сообщение-табло, которое бот
+    редактирует, а не публикует заново. Строки табло собираются из реплики
+    активных рейсов; строка рейса перерисовывается, только если изменились
+    показанные поля. Изменения рейсов помечают каналы устаревшими, а правка
+    в канале выполняется не чаще раза в EDIT_INTERVAL секунд - все изменения
+    за это время попадают в одну правку. Если строки не изменились,
+    сообщение не трогается.
+
+    К сообщению прикреплен выбор рейса для подписки на уведомления.
+    Рейс, впервые появившийся на табло канала, засчитывается партнеру
+    в published_flights.
+    """
+
+    STATUSES = FlightReplica.ACTIVE_STATUSES
+
+    def __init__(self, bot, edit_interval: float = EDIT_INTERVAL):
+        self.bot = bot
+        self.data = bot.data
+        self.edit_interval = edit_interval
+        self._boards: Dict[int, _ChannelBoard] = {}
+        self._rows: Optional[List[str]] = None
+        self._flights: List[Tuple[str, Dict[str, Any]]] = []
+        self._visible: set = set()
+        self._row_cache: Dict[str, Tuple[tuple, str]] = {}
+        self._started = False
+        self.stats = {'edits': 0, 'sends': 0, 'coalesced': 0, 'unchanged': 0}
+        self.data.flight_replica.add_listener(self._on_flight_change)
+
+    async def start(self):
+        """Подключить каналы партнеров и отрисовать табло (после входа бота)"""
+        await self.bot.wait_until_ready()
+        self._started = True
+        await self.sync_partners()
+
+    def stop(self):
+        self._started = False
+        for board in self._boards.values():
+            if board.task and not board.task.done():
+                board.task.cancel()
+        self.data.flight_replica.remove_listener(self._on_flight_change)
+
+    async def sync_partners(self):
+        """Добавить табло для новых партнеров и убрать табло ушедших"""
+        try:
+            partners = await self.data.get_all_partners()
+        except Exception as e:
+            print(f"Ошибка загрузки партнеров для табло: {e}")
+            return
+
+        channel_ids = set()
+        for partner_data in partners:
+            try:
+                channel_id = int(partner_data.get('channel_id') or 0)
+            except (TypeError, ValueError):
+                continue
+            if not channel_id:
+                continue
+            channel_ids.add(channel_id)
+
+            if channel_id not in self._boards:
+                message_id = partner_data.get('board_message_id')
+                board = _ChannelBoard(partner_data['id'], channel_id, int(message_id) if message_id else None)
+                self._boards[channel_id] = board
+                self._schedule(board)
+
+        for channel_id in list(self._boards):
+            if channel_id not in channel_ids:
+                board = self._boards.pop(channel_id)
+                if board.task and not board.task.done():
+                    board.task.cancel()
+
+    def board_count(self) -> int:
+        """Сколько каналов показывают табло"""
+        return sum(1 for board in self._boards.values() if not board.disabled)
+
+    # Изменения рейсов
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        visible = flight_id in self._visible
+        relevant = change_type != 'REMOVED' and flight_data.get('status') in self.STATUSES
+        if not visible and not relevant:
+            return
+
+        self._rows = None
+        if self._started:
+            for board in self._boards.values():
+                self._schedule(board)
+
+    def _schedule(self, board: _ChannelBoard):
+        if board.disabled:
+            return
+        board.dirty = True
+        # Задача канала жива (ждет окна или правит сообщение) - она подхватит изменения
+        if board.task is not None and not board.task.done():
+            self.stats['coalesced'] += 1
+            return
+        board.task = asyncio.ensure_future(self._flush_loop(board))
+
+    async def _flush_loop(self, board: _ChannelBoard):
+        """Единственная задача правок канала: пока есть изменения - одна правка за окно"""
+        try:
+            while board.dirty and not board.disabled:
+                delay = board.last_edit + self.edit_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                board.dirty = False
+                # Окно отсчитывается от начала правки
+                board.last_edit = time.monotonic()
+
+                if not self.data.flight_replica.ready:
+                    board.dirty = True
+                    continue
+
+                try:
+                    await self._flush(board)
+                except Exception as e:
+                    print(f"Ошибка обновления табло в канале {board.channel_id}: {e}")
+        finally:
+            board.task = None
+
+    # Отрисовка
+    def _row_key(self, flight_data: Dict[str, Any]) -> tuple:
+        return (
+            flight_data.get('departure_date', ''),
+            flight_data.get('departure_time', ''),
+            flight_data.get('flight_number', ''),
+            flight_data.get('departure_code', ''),
+            flight_data.get('arrival_code', ''),
+            flight_data.get('status', 'scheduled')
+        )
+
+    def _render_row(self, key: tuple) -> str:
+        departure_date, departure_time, flight_number, departure_code, arrival_code, status = key
+        return (f"`{departure_date[:5]} {departure_time}` **{flight_number}** "
+                f"{departure_code} → {arrival_code} • {STATUS_LABELS.get(status, '❓ Неизвестно')}")
+
+    def current_rows(self) -> List[str]:
+        """Строки табло; перерисовываются только изменившиеся рейсы"""
+        if self._rows is not None:
+            return self._rows
+
+        flights = self._board_flights(self.data.flight_replica.active_flights(self.STATUSES))
+        rows = []
+        row_cache = {}
+        for flight_id, flight_data in flights:
+            key = self._row_key(flight_data)
+            cached = self._row_cache.get(flight_id)
+            line = cached[1] if cached and cached[0] == key else self._render_row(key)
+            row_cache[flight_id] = (key, line)
+            rows.append(line)
+
+        self._row_cache = row_cache
+        self._visible = set(row_cache)
+        self._flights = flights
+        self._rows = rows
+        return rows
+
+    @staticmethod
+    def _board_flights(flights: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Рейсы табло: предстоящие в первую очередь, из вылетевших - только последние"""
+        upcoming = [item for item in flights if item[1].get('status') != 'departed']
+        departed = [item for item in flights if item[1].get('status') == 'departed']
+
+        departed_rows = min(len(departed), max(MAX_DEPARTED_ROWS, MAX_ROWS - len(upcoming)))
+        shown = departed[len(departed) - departed_rows:] + upcoming[:MAX_ROWS - departed_rows]
+        shown.sort(key=lambda item: item[1].get('departure_datetime', ''))
+        return shown
+
+    @staticmethod
+    def _view(flights: List[Tuple[str, Dict[str, Any]]]) -> Optional[View]:
+        if not flights:
+            return None
+        options = []
+        for flight_id, flight_data in flights:
+            options.append(discord.SelectOption(
+                label=f"{flight_data.get('flight_number', 'N/A')} ({flight_data.get('departure_code', '???')} → {flight_data.get('arrival_code', '???')})"[:100],
+                description=f"{flight_data.get('departure_date', '')} {flight_data.get('departure_time', '')}"[:100],
+                value=flight_id,
+                emoji="✈️"
+            ))
+        view = View(timeout=None)
+        view.add_item(BoardSubscribeSelect(options))
+        return view
+
+    def _embed(self, rows: List[str]) -> discord.Embed:
+        embed = discord.Embed(
+            title="🛫 Табло вылетов",
+            description="\n".join(rows) if rows else "Активных рейсов нет",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        total = len(self.data.flight_replica)
+        if total > len(rows):
+            embed.set_footer(text=f"Показано {len(rows)} из {total} активных рейсов • /поиск")
+        else:
+            embed.set_footer(text="Aviasales Roblox • обновляется автоматически")
+        return embed
+
+    async def _flush(self, board: _ChannelBoard):
+        rows = self.current_rows()
+        flights = self._flights
+        if rows == board.rendered:
+            self.stats['unchanged'] += 1
+            return
+
+        channel = self.bot.get_channel(board.channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            return
+
+        embed = self._embed(rows)
+        view = self._view(flights)
+        try:
+            if board.message_id:
+                try:
+                    await channel.get_partial_message(board.message_id).edit(embed=embed, view=view)
+                    self.stats['edits'] += 1
+                except discord.NotFound:
+                    board.message_id = None
+
+            if not board.message_id:
+                message = await channel.send(embed=embed, view=view)
+                board.message_id = message.id
+                self.stats['sends'] += 1
+                await self.data.update_document('partners', board.partner_id, {
+                    'board_message_id': str(message.id)
+                })
+        except discord.Forbidden:
+            print(f"Нет прав на табло в канале {board.channel_id}")
+            board.disabled = True
+            return
+
+        # Первая отрисовка после запуска не считается публикацией
+        flight_ids = {flight_id for flight_id, _ in flights}
+        published = flight_ids - board.flight_ids if board.rendered is not None else set()
+        replica = self.data.flight_replica
+        board.flight_ids = {flight_id for flight_id in board.flight_ids | flight_ids
+                            if replica.get(flight_id) is not None}
+        board.rendered = rows
+
+        if published:
+            await self.data.update_document('partners', board.partner_id, {
+                'published_flights': firestore.Increment(len(published)),
+                'last_published': datetime.now().isoformat()
+            })
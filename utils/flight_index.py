@@ -0,0 +1,231 @@
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Any, Tuple
+
+from utils.airport_search import normalize
+
+
+class FlightAutocompleteIndex:
+    """Индекс для автодополнения команд поиска.
+
+    Держит в памяти аэропорты, из которых и в которые есть активные рейсы,
+    и номера этих рейсов. Обновляется инкрементно из реплики рейсов, поэтому
+    ответ на каждое нажатие клавиши не обращается к Firestore.
+    """
+
+    # Статусы рейсов, которые показывает /поиск
+    SEARCHABLE_STATUSES = ('scheduled', 'boarding', 'delayed')
+
+    # Discord показывает не больше 25 вариантов
+    MAX_CHOICES = 25
+
+    def __init__(self, replica):
+        self._entries: Dict[str, Tuple[str, str, str]] = {}
+        self._departures: Counter = Counter()
+        self._arrivals: Counter = Counter()
+        self._routes: Counter = Counter()
+        self._flight_numbers: Counter = Counter()
+        self._names: Dict[str, str] = {}
+        self._name_tokens: Dict[str, List[str]] = {}
+        replica.add_listener(self._on_flight_change)
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        self._remove(flight_id)
+        if change_type != 'REMOVED' and flight_data.get('status') in self.SEARCHABLE_STATUSES:
+            self._add(flight_id, flight_data)
+
+    def _add(self, flight_id: str, flight_data: Dict[str, Any]):
+        departure = (flight_data.get('departure_code') or '').upper()
+        arrival = (flight_data.get('arrival_code') or '').upper()
+        flight_number = (flight_data.get('flight_number') or '').upper()
+
+        self._entries[flight_id] = (departure, arrival, flight_number)
+        self._departures[departure] += 1
+        self._arrivals[arrival] += 1
+        self._routes[(departure, arrival)] += 1
+        self._flight_numbers[flight_number] += 1
+
+        for code, name in ((departure, flight_data.get('departure_airport')),
+                           (arrival, flight_data.get('arrival_airport'))):
+            if code and name and name != 'Неизвестно' and code not in self._names:
+                self._names[code] = name
+                self._name_tokens[code] = normalize(name)
+
+    def _remove(self, flight_id: str):
+        entry = self._entries.pop(flight_id, None)
+        if not entry:
+            return
+        departure, arrival, flight_number = entry
+        for counter, key in ((self._departures, departure), (self._arrivals, arrival),
+                             (self._routes, (departure, arrival)),
+                             (self._flight_numbers, flight_number)):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+        # Название больше не нужно, если аэропорт пропал из рейсов
+        for code in (departure, arrival):
+            if code not in self._departures and code not in self._arrivals:
+                self._names.pop(code, None)
+                self._name_tokens.pop(code, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def airport_name(self, code: str) -> Optional[str]:
+        return self._names.get(code)
+
+    def airports(self, current: str, role: str = 'departure',
+                 other: Optional[str] = None) -> List[Tuple[str, Optional[str], int]]:
+        """Аэропорты для подсказки: [(код, название, число рейсов)].
+
+        role - 'departure' или 'arrival'; other - уже выбранный аэропорт
+        на другом конце маршрута (тогда предлагаются только связанные).
+        """
+        other = (other or '').strip().upper()
+        if other:
+            if role == 'departure':
+                counts = Counter({dep: n for (dep, arr), n in self._routes.items() if arr == other})
+            else:
+                counts = Counter({arr: n for (dep, arr), n in self._routes.items() if dep == other})
+        else:
+            counts = self._departures if role == 'departure' else self._arrivals
+
+        query = current.strip()
+        code_prefix = query.upper()
+        query_tokens = normalize(query)
+
+        ranked = []
+        for code, count in counts.items():
+            if not code:
+                continue
+            if code.startswith(code_prefix):
+                rank = 0
+            elif query_tokens and all(
+                any(token.startswith(query_token) for token in self._name_tokens.get(code, ()))
+                for query_token in query_tokens
+            ):
+                rank = 1
+            else:
+                continue
+            ranked.append((rank, -count, code))
+
+        ranked.sort()
+        return [(code, self._names.get(code), -count) for _, count, code in ranked[:self.MAX_CHOICES]]
+
+    def flight_numbers(self, current: str) -> List[Tuple[str, int]]:
+        """Номера активных рейсов, начинающиеся с введенного текста"""
+        prefix = current.strip().upper().replace(' ', '')
+        matches = [
+            (number, count) for number, count in self._flight_numbers.items()
+            if number and number.startswith(prefix)
+        ]
+        matches.sort()
+        return matches[:self.MAX_CHOICES]
+
+
+class FlightSearchIndex:
+    """Составные индексы активных рейсов для /поиск.
+
+    Для вылета, прилета, пары вылет-прилет, даты и номера рейса хранится
+    отсортированный по времени вылета список (время, id). Списки обновляются
+    инкрементно из реплики рейсов, поэтому поиск берет самый короткий из
+    подходящих списков и проверяет по нему остальные условия - без полной
+    выборки и без сортировки на каждый запрос.
+    """
+
+    SEARCHABLE_STATUSES = FlightAutocompleteIndex.SEARCHABLE_STATUSES
+
+    def __init__(self, replica):
+        self.replica = replica
+        self._postings: Dict[tuple, List[Tuple[str, str]]] = defaultdict(list)
+        self._entries: Dict[str, Tuple[str, List[tuple]]] = {}
+        replica.add_listener(self._on_flight_change)
+
+    @staticmethod
+    def _keys(flight_data: Dict[str, Any]) -> List[tuple]:
+        departure = (flight_data.get('departure_code') or '').upper()
+        arrival = (flight_data.get('arrival_code') or '').upper()
+        return [
+            ('all',),
+            ('departure', departure),
+            ('arrival', arrival),
+            ('route', departure, arrival),
+            ('date', flight_data.get('departure_date') or ''),
+            ('flight', (flight_data.get('flight_number') or '').upper())
+        ]
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        self._remove(flight_id)
+        if change_type != 'REMOVED' and flight_data.get('status') in self.SEARCHABLE_STATUSES:
+            self._add(flight_id, flight_data)
+
+    def _add(self, flight_id: str, flight_data: Dict[str, Any]):
+        sort_key = (flight_data.get('departure_datetime') or '', flight_id)
+        keys = self._keys(flight_data)
+        for key in keys:
+            insort(self._postings[key], sort_key)
+        self._entries[flight_id] = (sort_key, keys)
+
+    def _remove(self, flight_id: str):
+        entry = self._entries.pop(flight_id, None)
+        if not entry:
+            return
+        sort_key, keys = entry
+        for key in keys:
+            postings = self._postings.get(key)
+            if not postings:
+                continue
+            position = bisect_left(postings, sort_key)
+            if position < len(postings) and postings[position] == sort_key:
+                del postings[position]
+            if not postings:
+                del self._postings[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def matches(flight_data: Dict[str, Any], date: Optional[str] = None, departure: Optional[str] = None,
+                arrival: Optional[str] = None, flight_number: Optional[str] = None) -> bool:
+        """Подходит ли рейс под фильтры /поиск"""
+        if date and flight_data.get('departure_date') != date:
+            return False
+        if departure and (flight_data.get('departure_code') or '').upper() != departure.upper():
+            return False
+        if arrival and (flight_data.get('arrival_code') or '').upper() != arrival.upper():
+            return False
+        if flight_number and (flight_data.get('flight_number') or '').upper() != flight_number.upper():
+            return False
+        return True
+
+    def search(self, date: Optional[str] = None, departure: Optional[str] = None,
+               arrival: Optional[str] = None, flight_number: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Рейсы [(id, data)] по фильтрам, отсортированные по времени вылета"""
+        departure = departure.strip().upper() if departure else None
+        arrival = arrival.strip().upper() if arrival else None
+        flight_number = flight_number.strip().upper().replace(' ', '') if flight_number else None
+        date = date.strip() if date else None
+
+        candidates = []
+        if departure and arrival:
+            candidates.append(('route', departure, arrival))
+        elif departure:
+            candidates.append(('departure', departure))
+        elif arrival:
+            candidates.append(('arrival', arrival))
+        if date:
+            candidates.append(('date', date))
+        if flight_number:
+            candidates.append(('flight', flight_number))
+        if not candidates:
+            candidates.append(('all',))
+
+        # Самый короткий список - остальные условия проверяем по нему
+        key = min(candidates, key=lambda k: len(self._postings.get(k, ())))
+        results = []
+        for _, flight_id in self._postings.get(key, ()):
+            flight_data = self.replica.get(flight_id)
+            if flight_data and self.matches(flight_data, date, departure, arrival, flight_number):
+                results.append((flight_id, flight_data))
+        return results
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple
+
+logger = logging.getLogger('aviasales_bot')
+
+
+class FlightReplica:
+    """Локальная реплика активных рейсов.
+
+    Один раз загружает рейсы в нетерминальных статусах и дальше получает
+    только изменения через on_snapshot. Коги читают рейсы из памяти, а
+    количество чтений Firestore зависит от числа изменений, а не запросов.
+    """
+
+    ACTIVE_STATUSES = ('scheduled', 'boarding', 'delayed', 'departed')
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self._flights: Dict[str, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[str, str, Optional[Dict]], Any]] = []
+        self._watch = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = asyncio.Event()
+        self.stats = {
+            'snapshots': 0,
+            'changes': 0,
+            'last_snapshot': None
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    async def start(self, timeout: float = 30):
+        """Подписаться на изменения и дождаться первого снимка"""
+        if self._watch is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        query = self.db_handler.collection('flights').where(
+            'status', 'in', list(self.ACTIVE_STATUSES)
+        )
+        self._watch = await self.db_handler.run(query.on_snapshot, self._on_snapshot)
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            logger.info(f"✈️ Реплика рейсов готова: {len(self._flights)} активных рейсов")
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Реплика рейсов не получила первый снимок вовремя")
+
+    def stop(self):
+        """Отписаться от изменений"""
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception as e:
+                logger.error(f"Ошибка остановки реплики рейсов: {e}")
+            self._watch = None
+
+    def add_listener(self, callback: Callable[[str, str, Optional[Dict]], Any]):
+        """Подписать обработчик на изменения: callback(change_type, flight_id, data)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, str, Optional[Dict]], Any]):
+        """Отписать обработчик изменений"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Вызывается в потоке Firestore - разбираем документы здесь,
+        # а применяем изменения уже в event loop
+        deltas = []
+        for change in changes:
+            doc = change.document
+            data = doc.to_dict() if change.type.name != 'REMOVED' else None
+            deltas.append((change.type.name, doc.id, data))
+
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._apply, deltas)
+
+    def _apply(self, deltas: List[Tuple[str, str, Optional[Dict]]]):
+        for change_type, flight_id, data in deltas:
+            if change_type == 'REMOVED':
+                self._flights.pop(flight_id, None)
+            else:
+                self._flights[flight_id] = data
+
+            for callback in self._listeners:
+                try:
+                    result = callback(change_type, flight_id, data)
+                    if asyncio.iscoroutine(result):
+                        asyncio.ensure_future(result)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика реплики рейсов: {e}")
+
+        self.stats['snapshots'] += 1
+        self.stats['changes'] += len(deltas)
+        self.stats['last_snapshot'] = datetime.now()
+        self._ready.set()
+
+    # Чтение
+    def get(self, flight_id: str) -> Optional[Dict[str, Any]]:
+        """Данные рейса или None, если рейс не активен"""
+        return self._flights.get(flight_id)
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def active_flights(self, statuses: Optional[Iterable[str]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Активные рейсы [(id, data)], отсортированные по времени вылета.
+
+        Словари общие с репликой - их нельзя изменять.
+        """
+        if statuses is None:
+            items = list(self._flights.items())
+        else:
+            statuses = set(statuses)
+            items = [
+                (flight_id, data) for flight_id, data in self._flights.items()
+                if data.get('status') in statuses
+            ]
+        items.sort(key=lambda x: x[1].get('departure_datetime', ''))
+        return items
@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+
+from firebase_admin import firestore
+
+logger = logging.getLogger('aviasales_bot')
+
+
+def parse_flight_datetime(value: Optional[str]) -> Optional[datetime]:
+    """ISO-строка рейса -> наивное локальное время"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def next_transition(flight_data: Dict[str, Any]) -> Optional[Tuple[datetime, str]]:
+    """Ближайший переход статуса рейса: (время, новый статус) или None"""
+    status = flight_data.get('status')
+    departure_time = parse_flight_datetime(flight_data.get('departure_datetime'))
+
+    if status == 'scheduled' and departure_time:
+        # Регистрация закрывается - начинается посадка
+        checkin_close_str = flight_data.get('checkin_close')
+        departure_date_str = flight_data.get('departure_date')
+        if checkin_close_str and departure_date_str:
+            try:
+                close_hour, close_minute = map(int, checkin_close_str.split(':'))
+                dep_date = datetime.strptime(departure_date_str, "%d.%m.%Y")
+                checkin_close_time = dep_date.replace(hour=close_hour, minute=close_minute)
+                if checkin_close_time < departure_time:
+                    return checkin_close_time, 'boarding'
+            except ValueError:
+                pass
+        return departure_time, 'departed'
+
+    if status == 'boarding' and departure_time:
+        return departure_time, 'departed'
+
+    if status == 'departed':
+        actual_departure = parse_flight_datetime(flight_data.get('actual_departure')) or departure_time
+        if actual_departure:
+            try:
+                flight_time = int(flight_data.get('flight_time') or 120)
+            except (TypeError, ValueError):
+                flight_time = 120
+            return actual_departure + timedelta(minutes=flight_time), 'completed'
+
+    return None
+
+
+class FlightStatusScheduler:
+    """Событийный планировщик статусов рейсов.
+
+    Для каждого рейса хранится только ближайший переход в куче по времени.
+    Задача спит до первого срока и просыпается раньше, если появился более
+    ранний переход. Новые сроки приходят из реплики рейсов: после записи
+    статуса снимок с изменением сам ставит следующий переход.
+
+    Все переходы, наступившие к моменту пробуждения, записываются одним
+    проходом через WriteBatch, а счетчики авиакомпаний суммируются заранее.
+    """
+
+    RETRY_DELAY = 60  # секунд до повторной попытки после ошибки записи
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self._heap: List[Tuple[datetime, int, str, str]] = []
+        self._pending: Dict[str, Tuple[datetime, str, int]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'transitions': 0,
+            'errors': 0,
+            'max_lag': 0.0,
+            'passes': 0,
+            'last_pass_size': 0,
+            'max_pass_size': 0
+        }
+
+    def start(self):
+        """Загрузить рейсы из реплики и запустить таймер"""
+        replica = self.db_handler.flight_replica
+        for flight_id, flight_data in replica.active_flights():
+            self.schedule(flight_id, flight_data)
+        replica.add_listener(self._on_flight_change)
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Остановить таймер и отписаться от реплики"""
+        self.db_handler.flight_replica.remove_listener(self._on_flight_change)
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        if change_type == 'REMOVED':
+            self.cancel(flight_id)
+        else:
+            self.schedule(flight_id, flight_data)
+
+    def schedule(self, flight_id: str, flight_data: Dict[str, Any]):
+        """Поставить (или заменить) ближайший переход рейса"""
+        transition = next_transition(flight_data)
+        if transition is None:
+            self.cancel(flight_id)
+            return
+
+        due, new_status = transition
+        current = self._pending.get(flight_id)
+        if current and current[0] == due and current[1] == new_status:
+            return
+
+        seq = next(self._counter)
+        self._pending[flight_id] = (due, new_status, seq)
+        heapq.heappush(self._heap, (due, seq, flight_id, new_status))
+
+        # Новый срок раньше текущего - будим таймер
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, flight_id: str):
+        """Снять рейс с расписания (запись в куче станет устаревшей)"""
+        self._pending.pop(flight_id, None)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _pop_due(self, now: datetime) -> List[Tuple[str, str, datetime]]:
+        due_items = []
+        while self._heap and self._heap[0][0] <= now:
+            due, seq, flight_id, new_status = heapq.heappop(self._heap)
+            current = self._pending.get(flight_id)
+            if not current or current[2] != seq:
+                continue  # устаревшая запись
+            del self._pending[flight_id]
+            due_items.append((flight_id, new_status, due))
+        return due_items
+
+    def _next_delay(self) -> Optional[float]:
+        # Выбрасываем устаревшие записи с вершины кучи
+        while self._heap:
+            due, seq, flight_id, _ = self._heap[0]
+            current = self._pending.get(flight_id)
+            if current and current[2] == seq:
+                return max(0.0, (due - datetime.now()).total_seconds())
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._next_delay()
+                self._wakeup.clear()
+                if delay is None or delay > 0:
+                    try:
+                        # Не спим дольше часа - страховка от перевода часов
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay or 3600, 3600))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                now = datetime.now()
+                due_items = self._pop_due(now)
+                if due_items:
+                    await self._apply(due_items, now)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике статусов рейсов: {e}")
+                await asyncio.sleep(1)
+
+    async def _apply(self, due_items: List[Tuple[str, str, datetime]], now: datetime):
+        """Записать все наступившие переходы пакетно"""
+        updates = []
+        statuses = {}
+        completed_by_airline = Counter()
+        status_deltas: Dict[str, Counter] = {}
+
+        for flight_id, new_status, due in due_items:
+            self.stats['max_lag'] = max(self.stats['max_lag'], (now - due).total_seconds())
+            flight_update = {
+                'status': new_status,
+                'updated_at': now.isoformat()
+            }
+            if new_status == 'departed':
+                flight_update['actual_departure'] = now.isoformat()
+            updates.append(('flights', flight_id, flight_update))
+            statuses[flight_id] = new_status
+
+            flight_data = self.db_handler.flight_replica.get(flight_id) or {}
+            airline_id = flight_data.get('airline_id')
+            if airline_id:
+                deltas = status_deltas.setdefault(airline_id, Counter())
+                deltas[flight_data.get('status', 'scheduled')] -= 1
+                deltas[new_status] += 1
+                if new_status == 'completed':
+                    completed_by_airline[airline_id] += 1
+
+        # Одно инкрементное обновление на авиакомпанию за проход
+        for airline_id, completed in completed_by_airline.items():
+            updates.append(('airlines', airline_id, {
+                'statistics.flights_completed': firestore.Increment(completed),
+                'updated_at': now.isoformat()
+            }))
+
+        # Счетчики статусов в airline_stats - тоже одной записью на авиакомпанию
+        merges = []
+        for airline_id, deltas in status_deltas.items():
+            status_counts = {
+                status: firestore.Increment(delta)
+                for status, delta in deltas.items() if delta
+            }
+            if status_counts:
+                merges.append(('airline_stats', airline_id, {
+                    'status_counts': status_counts,
+                    'updated_at': now.isoformat()
+                }))
+
+        try:
+            failed = await self.db_handler.commit_updates(updates, merges)
+        except Exception as e:
+            logger.error(f"Ошибка записи статусов рейсов: {e}")
+            failed = [('flights', flight_id) for flight_id in statuses]
+
+        failed_flights = {doc_id for collection, doc_id in failed if collection == 'flights'}
+        self.stats['transitions'] += len(statuses) - len(failed_flights)
+        self.stats['errors'] += len(failed)
+        self.stats['passes'] += 1
+        self.stats['last_pass_size'] = len(updates) + len(merges)
+        self.stats['max_pass_size'] = max(self.stats['max_pass_size'], self.stats['last_pass_size'])
+
+        # Повторим позже, если рейс все еще ждет этого перехода
+        for flight_id in failed_flights:
+            seq = next(self._counter)
+            due = now + timedelta(seconds=self.RETRY_DELAY)
+            self._pending[flight_id] = (due, statuses[flight_id], seq)
+            heapq.heappush(self._heap, (due, seq, flight_id, statuses[flight_id]))
@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+# Верхняя граница для диапазона "начинается с" в строковых полях Firestore
+PREFIX_END = '\uf8ff'
+# Направление сортировки (значение firestore.Query.DESCENDING)
+DESCENDING = 'DESCENDING'
+
+
+class AirlineFlightSearch:
+    """Поиск по рейсам авиакомпании на стороне Firestore.
+
+    Фильтры по коду вылета и прилета - равенства, номер рейса - диапазон
+    по префиксу, даты - диапазон по departure_datetime. Результаты идут
+    в порядке ранжирования и читаются пачками через курсоры start_after,
+    пока не наберется запрошенная страница - полный список рейсов
+    авиакомпании в память не загружается.
+
+    Ранжирование:
+    - с номером рейса: точное совпадение номера, затем остальные номера
+      с этим префиксом, внутри номера - по времени вылета;
+    - без номера: сначала предстоящие рейсы (ближайшие первыми), затем
+      прошедшие (от последних к более ранним).
+
+    Firestore допускает диапазон только по одному полю, поэтому при
+    поиске по номеру диапазон дат проверяется на прочитанных документах.
+
+    Форм запросов ровно двенадцать: равенства airline_id [+ departure_code]
+    [+ arrival_code] и одна из сортировок - flight_number + departure_datetime,
+    departure_datetime по возрастанию или по убыванию. Для каждой нужен
+    составной индекс из firestore.indexes.json.
+    """
+
+    BATCH_SIZE = 20
+    # Предел прочитанных документов на один поиск
+    MAX_SCANNED = 400
+
+    def __init__(self, db_handler, airline_id: str, flight_number: Optional[str] = None,
+                 departure: Optional[str] = None, arrival: Optional[str] = None,
+                 date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                 page_size: int = 5):
+        self.db_handler = db_handler
+        self.airline_id = airline_id
+        self.flight_number = (flight_number or '').strip().upper().replace(' ', '') or None
+        self.departure = (departure or '').strip().upper() or None
+        self.arrival = (arrival or '').strip().upper() or None
+        # Границы дат: [date_from, date_to)
+        self.date_from = date_from.isoformat() if date_from else None
+        self.date_to = date_to.isoformat() if date_to else None
+        self.page_size = page_size
+
+        self._segments = self._build_segments()
+        self._segment = 0
+        self._cursor: Optional[Any] = None
+        self._results: List[Tuple[str, Dict[str, Any]]] = []
+        self.exhausted = not self._segments
+        self.truncated = False
+        self.stats = {'fetches': 0, 'scanned': 0}
+
+    def _base_query(self):
+        query = self.db_handler.collection('flights').where('airline_id', '==', self.airline_id)
+        if self.departure:
+            query = query.where('departure_code', '==', self.departure)
+        if self.arrival:
+            query = query.where('arrival_code', '==', self.arrival)
+        return query
+
+    def _build_segments(self) -> List[Tuple[Any, Optional[Callable[[Dict[str, Any]], bool]]]]:
+        """Запросы в порядке ранжирования: [(запрос, доп. проверка документа)]"""
+        query = self._base_query()
+
+        if self.flight_number:
+            query = query.where('flight_number', '>=', self.flight_number) \
+                         .where('flight_number', '<', self.flight_number + PREFIX_END) \
+                         .order_by('flight_number').order_by('departure_datetime')
+            check = self._in_date_range if self.date_from or self.date_to else None
+            return [(query, check)]
+
+        now = datetime.now().isoformat()
+        segments = []
+
+        # Предстоящие: [max(now, from), to) по возрастанию
+        upcoming_from = max(now, self.date_from) if self.date_from else now
+        if not self.date_to or upcoming_from < self.date_to:
+            upcoming = query.where('departure_datetime', '>=', upcoming_from)
+            if self.date_to:
+                upcoming = upcoming.where('departure_datetime', '<', self.date_to)
+            segments.append((upcoming.order_by('departure_datetime'), None))
+
+        # Прошедшие: [from, min(now, to)) по убыванию
+        past_to = min(now, self.date_to) if self.date_to else now
+        if not self.date_from or self.date_from < past_to:
+            past = query.where('departure_datetime', '<', past_to)
+            if self.date_from:
+                past = past.where('departure_datetime', '>=', self.date_from)
+            segments.append((past.order_by('departure_datetime', direction=DESCENDING), None))
+
+        return segments
+
+    def _in_date_range(self, flight_data: Dict[str, Any]) -> bool:
+        departure = flight_data.get('departure_datetime') or ''
+        if self.date_from and departure < self.date_from:
+            return False
+        if self.date_to and departure >= self.date_to:
+            return False
+        return True
+
+    async def _fetch_batch(self):
+        query, check = self._segments[self._segment]
+        docs = await self.db_handler.fetch_page(query, self.BATCH_SIZE, self._cursor)
+        self.stats['fetches'] += 1
+        self.stats['scanned'] += len(docs)
+
+        for doc in docs:
+            flight_data = doc.to_dict()
+            if check is None or check(flight_data):
+                self._results.append((doc.id, flight_data))
+
+        if len(docs) < self.BATCH_SIZE:
+            self._segment += 1
+            self._cursor = None
+            if self._segment >= len(self._segments):
+                self.exhausted = True
+        else:
+            self._cursor = docs[-1]
+
+        if not self.exhausted and self.stats['scanned'] >= self.MAX_SCANNED:
+            self.exhausted = True
+            self.truncated = True
+
+    async def get_page(self, page: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+        """([(id, data)] страницы, есть ли следующая страница)"""
+        start = page * self.page_size
+        end = start + self.page_size
+        # На один документ больше страницы - чтобы знать, есть ли следующая
+        while len(self._results) <= end and not self.exhausted:
+            await self._fetch_batch()
+        return self._results[start:end], len(self._results) > end
+
+    @property
+    def found(self) -> int:
+        """Сколько результатов уже найдено (все, если exhausted и не truncated)"""
+        return len(self._results)
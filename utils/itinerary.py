@@ -0,0 +1,178 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+
+from utils.flight_index import FlightAutocompleteIndex
+
+# Минимальное время стыковки в аэропорту пересадки, минуты
+MIN_CONNECTION_MINUTES = 60
+# Максимум перелетов в одном маршруте
+MAX_LEGS = 3
+# Сколько после начала поиска может длиться поездка, часы
+SEARCH_HORIZON_HOURS = 72
+
+
+def _to_minutes(value: datetime) -> int:
+    return int(value.timestamp() // 60)
+
+
+class ItineraryIndex:
+    """Поиск маршрутов с пересадками по активным рейсам.
+
+    Каждый рейс - ребро расписания (вылет, прилет, аэропорты, время),
+    все ребра держатся в списке, отсортированном по времени вылета, и
+    обновляются инкрементно из реплики рейсов. Запрос - алгоритм
+    сканирования рейсов (Connection Scan): один проход по рейсам после
+    времени начала с метками "самый ранний прилет" отдельно для каждого
+    числа перелетов. Так за один проход находятся и самый ранний прилет,
+    и маршруты с меньшим числом пересадок.
+    """
+
+    BOOKABLE_STATUSES = FlightAutocompleteIndex.SEARCHABLE_STATUSES
+
+    def __init__(self, replica, min_connection: int = MIN_CONNECTION_MINUTES):
+        self.replica = replica
+        self.min_connection = min_connection
+        # (вылет мин, прилет мин, откуда, куда, id рейса)
+        self._connections: List[Tuple[int, int, str, str, str]] = []
+        self._entries: Dict[str, Tuple[int, int, str, str, str]] = {}
+        self.stats = {'queries': 0, 'scanned': 0}
+        replica.add_listener(self._on_flight_change)
+
+    @staticmethod
+    def _connection(flight_id: str, flight_data: Dict[str, Any]) -> Optional[Tuple[int, int, str, str, str]]:
+        departure_code = (flight_data.get('departure_code') or '').upper()
+        arrival_code = (flight_data.get('arrival_code') or '').upper()
+        if not departure_code or not arrival_code or departure_code == arrival_code:
+            return None
+
+        try:
+            departure = datetime.fromisoformat(flight_data['departure_datetime'])
+            if flight_data.get('arrival_datetime'):
+                arrival = datetime.fromisoformat(flight_data['arrival_datetime'])
+            else:
+                arrival = departure + timedelta(minutes=int(flight_data.get('flight_time') or 0))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        if departure.tzinfo is not None:
+            departure = departure.astimezone().replace(tzinfo=None)
+        if arrival.tzinfo is not None:
+            arrival = arrival.astimezone().replace(tzinfo=None)
+        if arrival <= departure:
+            return None
+        return _to_minutes(departure), _to_minutes(arrival), departure_code, arrival_code, flight_id
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        self._remove(flight_id)
+        if change_type != 'REMOVED' and flight_data.get('status') in self.BOOKABLE_STATUSES:
+            connection = self._connection(flight_id, flight_data)
+            if connection:
+                insort(self._connections, connection)
+                self._entries[flight_id] = connection
+
+    def _remove(self, flight_id: str):
+        connection = self._entries.pop(flight_id, None)
+        if not connection:
+            return
+        position = bisect_left(self._connections, connection)
+        if position < len(self._connections) and self._connections[position] == connection:
+            del self._connections[position]
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def search(self, origin: str, destination: str, start: Optional[datetime] = None,
+               max_legs: int = MAX_LEGS) -> List[List[Tuple[str, Dict[str, Any]]]]:
+        """Маршруты из origin в destination с вылетом не раньше start.
+
+        Возвращает оптимальные по Парето варианты "прилет / число
+        перелетов": самый быстрый прямой рейс, затем маршрут с одной
+        пересадкой, если он прилетает раньше, и т.д. Каждый вариант -
+        список [(id рейса, данные)] в порядке перелетов.
+        """
+        origin = origin.strip().upper()
+        destination = destination.strip().upper()
+        if not origin or not destination or origin == destination:
+            return []
+
+        start_minute = _to_minutes(start or datetime.now())
+        horizon = start_minute + SEARCH_HORIZON_HOURS * 60
+        connections = self._connections
+
+        # arrivals[k][аэропорт] = самый ранний прилет ровно за k перелетов
+        arrivals: List[Dict[str, int]] = [{} for _ in range(max_legs + 1)]
+        # parents[k][аэропорт] = рейс, которым достигнут этот прилет
+        parents: List[Dict[str, Tuple[int, int, str, str, str]]] = [{} for _ in range(max_legs + 1)]
+        arrivals[0][origin] = start_minute - self.min_connection
+        # limits[k] = лучший прилет в destination не более чем за k перелетов
+        limits = [horizon] * (max_legs + 1)
+
+        scanned = 0
+        for position in range(bisect_left(connections, (start_minute,)), len(connections)):
+            connection = connections[position]
+            departure, arrival, from_code, to_code, _ = connection
+            # Рейсы после лучшего прилета (даже прямого) уже не улучшат ответ
+            if departure >= limits[1]:
+                break
+            scanned += 1
+            if arrival > horizon:
+                continue
+
+            ready = departure - self.min_connection
+            for legs in range(1, max_legs + 1):
+                # За legs и больше перелетов уже есть прилет раньше этого вылета
+                if departure >= limits[legs]:
+                    break
+                reached = arrivals[legs - 1].get(from_code)
+                if reached is None or reached > ready:
+                    continue
+                if arrival < arrivals[legs].get(to_code, horizon + 1):
+                    arrivals[legs][to_code] = arrival
+                    parents[legs][to_code] = connection
+                    if to_code == destination:
+                        for more_legs in range(legs, max_legs + 1):
+                            limits[more_legs] = min(limits[more_legs], arrival)
+
+        self.stats['queries'] += 1
+        self.stats['scanned'] += scanned
+
+        itineraries = []
+        best_arrival = None
+        for legs in range(1, max_legs + 1):
+            arrival = arrivals[legs].get(destination)
+            if arrival is None or (best_arrival is not None and arrival >= best_arrival):
+                continue
+            best_arrival = arrival
+            itinerary = self._unwind(parents, legs, destination)
+            if itinerary:
+                itineraries.append(itinerary)
+        return itineraries
+
+    def _unwind(self, parents, legs: int, destination: str) -> List[Tuple[str, Dict[str, Any]]]:
+        path = []
+        airport = destination
+        while legs > 0 and airport in parents[legs]:
+            connection = parents[legs][airport]
+            path.append(connection)
+            airport = connection[2]
+            legs -= 1
+
+        itinerary = []
+        for connection in reversed(path):
+            flight_data = self.replica.get(connection[4])
+            if flight_data is None:
+                return []
+            itinerary.append((connection[4], flight_data))
+        return itinerary
+
+    @staticmethod
+    def connection_minutes(itinerary: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Время стыковок маршрута, минуты"""
+        result = []
+        for (_, previous), (_, following) in zip(itinerary, itinerary[1:]):
+            arrival = ItineraryIndex._connection('', previous)
+            departure = ItineraryIndex._connection('', following)
+            if arrival and departure:
+                result.append(departure[0] - arrival[1])
+        return result
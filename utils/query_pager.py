@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+
+class QueryPager:
+    """Постраничное чтение упорядоченного запроса через курсоры start_after.
+
+    Каждая страница читается отдельным запросом limit(page_size + 1): лишний
+    документ показывает, есть ли следующая страница. Для перехода вперед
+    хранится только последний снимок каждой просмотренной страницы, сами
+    страницы - в небольшом LRU-кэше, поэтому "Назад" обычно не читает базу.
+    """
+
+    def __init__(self, db_handler, query, page_size: int = 5, cache_pages: int = 4):
+        self.db_handler = db_handler
+        self.query = query
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self._cursors: List[Any] = []  # последний документ страницы i
+        self._pages: "OrderedDict[int, Tuple[List[Tuple[str, Dict[str, Any]]], bool]]" = OrderedDict()
+        self.stats = {'fetches': 0, 'cache_hits': 0}
+
+    def can_open(self, page: int) -> bool:
+        """Страница доступна: первая или известен курсор предыдущей"""
+        return page == 0 or page - 1 < len(self._cursors)
+
+    async def get_page(self, page: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+        """([(id, data)] страницы, есть ли следующая страница)"""
+        if page in self._pages:
+            self._pages.move_to_end(page)
+            self.stats['cache_hits'] += 1
+            return self._pages[page]
+
+        if not self.can_open(page):
+            raise IndexError(page)
+
+        start_after: Optional[Any] = self._cursors[page - 1] if page > 0 else None
+        docs = await self.db_handler.fetch_page(self.query, self.page_size + 1, start_after)
+        self.stats['fetches'] += 1
+
+        has_next = len(docs) > self.page_size
+        docs = docs[:self.page_size]
+        if docs and page == len(self._cursors):
+            self._cursors.append(docs[-1])
+
+        result = ([(doc.id, doc.to_dict()) for doc in docs], has_next)
+        self._pages[page] = result
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return result
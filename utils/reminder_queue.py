@@ -0,0 +1,324 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Tuple
+
+from utils.database import DEFAULT_NOTIFICATIONS
+from utils.flight_scheduler import parse_flight_datetime
+
+logger = logging.getLogger('aviasales_bot')
+
+# Напоминания относительно вылета: тип -> (минут до вылета, текст)
+REMINDER_OFFSETS = {
+    '24h': (24 * 60, "24 часа"),
+    '6h': (6 * 60, "6 часов"),
+    '1h': (60, "1 час"),
+    '30min': (30, "30 минут"),
+}
+
+
+def reminder_fire_time(reminder_type: str, flight_data: Dict[str, Any]) -> Optional[datetime]:
+    """Время срабатывания напоминания по текущим данным рейса"""
+    if reminder_type in REMINDER_OFFSETS:
+        departure_time = parse_flight_datetime(flight_data.get('departure_datetime'))
+        if not departure_time:
+            return None
+        return departure_time - timedelta(minutes=REMINDER_OFFSETS[reminder_type][0])
+
+    if reminder_type == 'server_open':
+        server_open = flight_data.get('server_open')
+        departure_date = flight_data.get('departure_date')
+        if not server_open or not departure_date:
+            return None
+        try:
+            hour, minute = map(int, server_open.split(':'))
+            return datetime.strptime(departure_date, "%d.%m.%Y").replace(hour=hour, minute=minute)
+        except ValueError:
+            return None
+
+    return None
+
+
+class ReminderQueue:
+    """Очередь напоминаний о рейсах по времени срабатывания.
+
+    Сроки считаются один раз при создании подписки и сохраняются в
+    коллекции reminders, поэтому после перезапуска очередь восстанавливается
+    одним запросом. Задача спит до ближайшего срока вместо ежеминутного
+    обхода всех подписок.
+    """
+
+    COLLECTION = 'reminders'
+    # Ограничение Firestore на число значений в фильтре 'in'
+    IN_QUERY_LIMIT = 30
+    # Напоминания, просроченные дольше этого (например, бот был выключен), не отправляются
+    GRACE_PERIOD = timedelta(minutes=30)
+    # Повторы отправки после ошибки: задержка удваивается, затем напоминание снимается
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = timedelta(minutes=1)
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._pending: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sender: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[bool]]] = None
+        # Поля рейса, от которых зависят сроки напоминаний: flight_id -> значения
+        self._flight_times: Dict[str, tuple] = {}
+        # Неудачные попытки отправки: reminder_id -> число попыток
+        self._attempts: Dict[str, int] = {}
+        self.stats = {
+            'sent': 0,
+            'dropped': 0,
+            'rescheduled': 0,
+            'backfilled': 0,
+            'retried': 0,
+            'errors': 0
+        }
+
+    async def start(self, sender: Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[bool]]):
+        """Восстановить очередь из Firestore и запустить таймер.
+
+        sender(reminder, flight_data) отправляет напоминание и возвращает True при успехе.
+        """
+        self._sender = sender
+        if self._task:
+            return
+
+        docs = await self.db_handler.fetch(
+            self.db_handler.collection(self.COLLECTION).order_by('fire_at')
+        )
+        for doc in docs:
+            self._push(doc.id, doc.to_dict())
+
+        # Подписки, созданные до очереди напоминаний, в reminders не попали
+        try:
+            await self._backfill()
+        except Exception as e:
+            logger.error(f"Ошибка восстановления напоминаний старых подписок: {e}")
+
+        # Перенос вылета пересчитывает сроки сразу, а не в момент старого срока
+        self.db_handler.flight_replica.add_listener(self._on_flight_change)
+
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"⏰ Очередь напоминаний восстановлена: {len(self._pending)} напоминаний "
+                    f"(дописано по старым подпискам: {self.stats['backfilled']})")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            self.db_handler.flight_replica.remove_listener(self._on_flight_change)
+
+    async def _backfill(self):
+        """Поставить в очередь недостающие напоминания подписок на активные рейсы.
+
+        Повторный запуск безопасен: пропускаются отправленные напоминания
+        (notifications_sent), уже стоящие в очереди и те, чей срок прошел.
+        """
+        flights = dict(await self.db_handler.get_active_flights())
+        flight_ids = list(flights)
+        for flight_id, flight_data in flights.items():
+            self._flight_times[flight_id] = self._timing_key(flight_data)
+        subscriptions = self.db_handler.collection('subscriptions')
+
+        for start in range(0, len(flight_ids), self.IN_QUERY_LIMIT):
+            chunk = flight_ids[start:start + self.IN_QUERY_LIMIT]
+            docs = await self.db_handler.fetch(subscriptions.where('flight_id', 'in', chunk))
+            for doc in docs:
+                subscription = doc.to_dict()
+                flight_id = subscription.get('flight_id')
+                sent = set(subscription.get('notifications_sent') or [])
+                missing = [
+                    reminder_type for reminder_type in subscription.get('notifications') or DEFAULT_NOTIFICATIONS
+                    if reminder_type not in sent and f"{doc.id}_{reminder_type}" not in self._pending
+                ]
+                if missing and flight_id in flights:
+                    self.stats['backfilled'] += await self.schedule_subscription(
+                        doc.id, subscription.get('user_id'), flight_id, flights[flight_id], missing
+                    )
+
+    @staticmethod
+    def _timing_key(flight_data: Dict[str, Any]) -> tuple:
+        return (flight_data.get('departure_datetime'), flight_data.get('departure_date'),
+                flight_data.get('server_open'))
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        if change_type == 'REMOVED':
+            self._flight_times.pop(flight_id, None)
+            return
+
+        key = self._timing_key(flight_data)
+        previous = self._flight_times.get(flight_id)
+        self._flight_times[flight_id] = key
+        if previous is None or previous == key:
+            return
+
+        for reminder_id, (_, reminder) in list(self._pending.items()):
+            if reminder.get('flight_id') != flight_id:
+                continue
+            fire_at = reminder_fire_time(reminder['type'], flight_data)
+            if not fire_at or fire_at.isoformat() == reminder.get('fire_at'):
+                continue
+
+            reminder['fire_at'] = fire_at.isoformat()
+            self._push(reminder_id, reminder)
+            self.stats['rescheduled'] += 1
+            asyncio.ensure_future(self._save_fire_at(reminder_id, reminder['fire_at']))
+
+    async def _save_fire_at(self, reminder_id: str, fire_at: str):
+        try:
+            await self.db_handler.update_document(self.COLLECTION, reminder_id, {'fire_at': fire_at})
+        except Exception as e:
+            logger.error(f"Ошибка переноса напоминания {reminder_id}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def schedule_subscription(self, subscription_id: str, user_id: str,
+                                    flight_id: str, flight_data: Dict[str, Any],
+                                    reminder_types: List[str]) -> int:
+        """Рассчитать и сохранить напоминания подписки; возвращает их число"""
+        now = datetime.now()
+        writes = []
+        for reminder_type in reminder_types:
+            fire_at = reminder_fire_time(reminder_type, flight_data)
+            if not fire_at or fire_at <= now:
+                continue  # срок уже прошел
+
+            reminder_id = f"{subscription_id}_{reminder_type}"
+            reminder = {
+                'subscription_id': subscription_id,
+                'user_id': user_id,
+                'flight_id': flight_id,
+                'type': reminder_type,
+                'fire_at': fire_at.isoformat(),
+                'created_at': now.isoformat()
+            }
+            writes.append(self.db_handler.set_document(self.COLLECTION, reminder_id, reminder))
+            self._push(reminder_id, reminder)
+
+        if writes:
+            await asyncio.gather(*writes)
+        return len(writes)
+
+    def _push(self, reminder_id: str, reminder: Dict[str, Any]):
+        fire_at = parse_flight_datetime(reminder.get('fire_at'))
+        if not fire_at:
+            return
+
+        seq = next(self._counter)
+        self._pending[reminder_id] = (seq, reminder)
+        heapq.heappush(self._heap, (fire_at, seq, reminder_id))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def _next_delay(self) -> Optional[float]:
+        while self._heap:
+            fire_at, seq, reminder_id = self._heap[0]
+            current = self._pending.get(reminder_id)
+            if current and current[0] == seq:
+                return max(0.0, (fire_at - datetime.now()).total_seconds())
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._next_delay()
+                self._wakeup.clear()
+                if delay is None or delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay or 3600, 3600))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                fire_at, seq, reminder_id = heapq.heappop(self._heap)
+                current = self._pending.get(reminder_id)
+                if not current or current[0] != seq:
+                    continue
+                del self._pending[reminder_id]
+                await self._fire(reminder_id, current[1], fire_at)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в очереди напоминаний: {e}")
+                await asyncio.sleep(1)
+
+    async def _load_flight(self, flight_id: str) -> Optional[Dict[str, Any]]:
+        replica = self.db_handler.flight_replica
+        if replica.ready:
+            return replica.get(flight_id)
+
+        flight_doc = await self.db_handler.get_document('flights', flight_id)
+        return flight_doc.to_dict() if flight_doc.exists else None
+
+    async def _fire(self, reminder_id: str, reminder: Dict[str, Any], fire_at: datetime):
+        now = datetime.now()
+        flight_data = await self._load_flight(reminder['flight_id'])
+
+        # Рейс завершен, отменен или уже вылетел - напоминание не нужно
+        if not flight_data or flight_data.get('status') in ('departed', 'cancelled', 'completed'):
+            await self._drop(reminder_id)
+            return
+
+        # Время вылета могло измениться после создания подписки
+        actual_fire_at = reminder_fire_time(reminder['type'], flight_data)
+        if actual_fire_at and actual_fire_at > now + timedelta(minutes=1):
+            reminder['fire_at'] = actual_fire_at.isoformat()
+            await self.db_handler.update_document(self.COLLECTION, reminder_id, {
+                'fire_at': reminder['fire_at']
+            })
+            self._push(reminder_id, reminder)
+            self.stats['rescheduled'] += 1
+            return
+
+        if now - (actual_fire_at or fire_at) > self.GRACE_PERIOD:
+            await self._drop(reminder_id)
+            return
+
+        try:
+            delivered = await self._sender(reminder, flight_data) if self._sender else False
+        except Exception as e:
+            self.stats['errors'] += 1
+            await self._retry(reminder_id, reminder, now, e)
+            return
+        self._attempts.pop(reminder_id, None)
+
+        try:
+            if delivered:
+                self.stats['sent'] += 1
+                await self.db_handler.mark_notification_sent(reminder['subscription_id'], reminder['type'])
+            await self.db_handler.delete_document(self.COLLECTION, reminder_id)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения отправленного напоминания {reminder_id}: {e}")
+
+    async def _retry(self, reminder_id: str, reminder: Dict[str, Any], now: datetime, error: Exception):
+        """Повторить отправку позже или снять напоминание после MAX_ATTEMPTS попыток"""
+        attempts = self._attempts.get(reminder_id, 0) + 1
+        if attempts >= self.MAX_ATTEMPTS:
+            self._attempts.pop(reminder_id, None)
+            logger.warning(f"Напоминание {reminder_id} снято после {attempts} попыток: {error}")
+            await self._drop(reminder_id)
+            return
+
+        self._attempts[reminder_id] = attempts
+        retry_at = now + self.RETRY_DELAY * 2 ** (attempts - 1)
+        logger.warning(f"Ошибка отправки напоминания {reminder_id} (попытка {attempts}), "
+                       f"повтор в {retry_at:%H:%M:%S}: {error}")
+        # Срок повтора только в памяти - после перезапуска сработает исходный срок
+        self._push(reminder_id, {**reminder, 'fire_at': retry_at.isoformat()})
+        self.stats['retried'] += 1
+
+    async def _drop(self, reminder_id: str):
+        self.stats['dropped'] += 1
+        try:
+            await self.db_handler.delete_document(self.COLLECTION, reminder_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления напоминания {reminder_id}: {e}")
@@ -0,0 +1,74 @@
+import math
+from typing import Dict, List, Optional, Any, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Модель времени рейса: руление, набор и снижение + крейсерский участок
+BLOCK_OVERHEAD_MIN = 30
+CRUISE_SPEED_KMH = 750
+MIN_BLOCK_TIME = 30
+
+
+def great_circle_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (формула гаверсинусов), км"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def estimate_block_time(distance_km: float) -> int:
+    """Оценка времени рейса от уборки колодок до их установки, минуты (кратно 5)"""
+    minutes = BLOCK_OVERHEAD_MIN + distance_km / CRUISE_SPEED_KMH * 60
+    return max(MIN_BLOCK_TIME, int(5 * round(minutes / 5)))
+
+
+def airport_coordinates(airport: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """(широта, долгота) записи аэропорта или None, если координат нет"""
+    if not airport:
+        return None
+    try:
+        latitude = float(airport.get('latitude'))
+        longitude = float(airport.get('longitude'))
+    except (TypeError, ValueError):
+        return None
+    if latitude == 0 and longitude == 0:
+        return None
+    return latitude, longitude
+
+
+def estimate_route(departure: Optional[Dict[str, Any]],
+                   arrival: Optional[Dict[str, Any]]) -> Optional[Tuple[float, int]]:
+    """(расстояние км, время рейса мин) для двух записей аэропортов или None"""
+    departure_point = airport_coordinates(departure)
+    arrival_point = airport_coordinates(arrival)
+    if not departure_point or not arrival_point:
+        return None
+    distance = great_circle_km(*departure_point, *arrival_point)
+    return distance, estimate_block_time(distance)
+
+
+def _route_endpoint(airport_db, route: Dict[str, Any], side: str) -> Optional[Tuple[float, float]]:
+    for field in (f'{side}_icao', f'{side}_code'):
+        code = route.get(field)
+        if code:
+            point = airport_coordinates(airport_db.get_by_code(code))
+            if point:
+                return point
+    return None
+
+
+def estimate_routes(airport_db, routes: List[Dict[str, Any]]) -> List[Optional[Tuple[float, int]]]:
+    """Оценка для всех маршрутов авиакомпании сразу"""
+    results: List[Optional[Tuple[float, int]]] = [None] * len(routes)
+    if airport_db is None:
+        return results
+
+    for position, route in enumerate(routes):
+        departure = _route_endpoint(airport_db, route, 'departure')
+        arrival = _route_endpoint(airport_db, route, 'arrival')
+        if departure and arrival:
+            distance = great_circle_km(*departure, *arrival)
+            results[position] = (distance, estimate_block_time(distance))
+    return results
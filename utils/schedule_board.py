@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Any, Tuple
+
+import discord
+
+from utils.flight_index import FlightAutocompleteIndex
+
+logger = logging.getLogger('aviasales_bot')
+
+# Сколько секунд копить изменения рейсов перед пересборкой табло
+REBUILD_DEBOUNCE = 2.0
+# Сколько рейсов показывать в разделах "Сегодня" и "Завтра"
+BUCKET_PREVIEW = 3
+
+
+class ScheduleSnapshot:
+    """Готовое табло расписания: корзины рейсов, embed и варианты выбора.
+
+    Объект неизменяемый после сборки и общий для всех вызовов
+    /расписание_рейсов - его нельзя изменять при отправке.
+    """
+
+    def __init__(self, flights: List[Tuple[str, Dict[str, Any]]], built_at: Optional[datetime] = None):
+        self.built_at = built_at or datetime.now()
+        self.day: date = self.built_at.date()
+        self.flights = flights
+        self.by_id = dict(flights)
+
+        self.status_counts = {'scheduled': 0, 'boarding': 0, 'delayed': 0}
+        self.today: List[Tuple[str, Dict[str, Any]]] = []
+        self.tomorrow: List[Tuple[str, Dict[str, Any]]] = []
+        self.future: List[Tuple[str, Dict[str, Any]]] = []
+        self._bucket()
+
+        self.embed = self._render_embed()
+        self.options = self._render_options()
+
+    def _bucket(self):
+        tomorrow = self.day + timedelta(days=1)
+        for flight_id, flight_data in self.flights:
+            status = flight_data.get('status', 'scheduled')
+            if status in self.status_counts:
+                self.status_counts[status] += 1
+
+            try:
+                flight_date = datetime.fromisoformat(flight_data['departure_datetime'].replace('Z', '+00:00')).date()
+            except (KeyError, AttributeError, ValueError):
+                self.future.append((flight_id, flight_data))
+                continue
+
+            if flight_date == self.day:
+                self.today.append((flight_id, flight_data))
+            elif flight_date == tomorrow:
+                self.tomorrow.append((flight_id, flight_data))
+            else:
+                self.future.append((flight_id, flight_data))
+
+    @staticmethod
+    def _bucket_text(flights: List[Tuple[str, Dict[str, Any]]]) -> str:
+        text = ""
+        for _, flight_data in flights[:BUCKET_PREVIEW]:
+            text += f"• **{flight_data.get('flight_number', 'N/A')}** - {flight_data.get('departure_airport', 'N/A')} → {flight_data.get('arrival_airport', 'N/A')} - {flight_data.get('departure_time', 'N/A')}\n"
+        if len(flights) > BUCKET_PREVIEW:
+            text += f"*...и еще {len(flights) - BUCKET_PREVIEW} рейсов*"
+        return text or "Нет рейсов"
+
+    def _render_embed(self) -> discord.Embed:
+        embed = discord.Embed(
+            title="📅 Расписание рейсов",
+            description=f"Найдено активных рейсов: **{len(self.flights)}**",
+            color=discord.Color.green(),
+            timestamp=self.built_at
+        )
+
+        embed.add_field(
+            name="📊 Статистика статусов",
+            value=f"""
+            🟢 По расписанию: **{self.status_counts['scheduled']}**
+            🟡 Идет регистрация: **{self.status_counts['boarding']}**
+            🟠 Задержано: **{self.status_counts['delayed']}**
+            """,
+            inline=False
+        )
+
+        if self.today:
+            embed.add_field(name="📅 Сегодня", value=self._bucket_text(self.today), inline=False)
+        if self.tomorrow:
+            embed.add_field(name="📅 Завтра", value=self._bucket_text(self.tomorrow), inline=False)
+        return embed
+
+    def _render_options(self) -> List[discord.SelectOption]:
+        options = []
+        for flight_id, flight_data in self.flights[:25]:
+            dep_code = flight_data.get('departure_code', 'N/A')
+            arr_code = flight_data.get('arrival_code', 'N/A')
+            flight_num = flight_data.get('flight_number', 'N/A')
+            airline = flight_data.get('airline_name', 'Неизвестно')
+
+            options.append(discord.SelectOption(
+                label=f"{flight_num} ({dep_code} → {arr_code})",
+                description=f"{airline} - {flight_data.get('departure_date', '')} {flight_data.get('departure_time', '')}"[:100],
+                value=flight_id,
+                emoji="✈️"
+            ))
+        return options
+
+
+class ScheduleBoard:
+    """Общее табло /расписание_рейсов поверх реплики рейсов.
+
+    Табло собирается один раз и отдается всем вызовам команды. Изменения
+    рейсов, которые видны на табло, помечают его устаревшим и пересобирают
+    не сразу, а через REBUILD_DEBOUNCE секунд - пачка изменений (первый
+    снимок реплики, массовая смена статусов) дает одну пересборку.
+    В полночь табло пересобирается при первом обращении: меняются
+    разделы "Сегодня" и "Завтра".
+    """
+
+    STATUSES = FlightAutocompleteIndex.SEARCHABLE_STATUSES
+
+    def __init__(self, replica, debounce: float = REBUILD_DEBOUNCE):
+        self.replica = replica
+        self.debounce = debounce
+        self._snapshot: Optional[ScheduleSnapshot] = None
+        self._rebuild_handle: Optional[asyncio.TimerHandle] = None
+        self.stats = {'rebuilds': 0, 'changes': 0, 'served': 0}
+        replica.add_listener(self._on_flight_change)
+
+    def _on_flight_change(self, change_type: str, flight_id: str, flight_data: Optional[Dict]):
+        on_board = self._snapshot is not None and flight_id in self._snapshot.by_id
+        becomes_visible = change_type != 'REMOVED' and flight_data.get('status') in self.STATUSES
+        if not on_board and not becomes_visible:
+            return
+
+        self.stats['changes'] += 1
+        if self._rebuild_handle is None:
+            self._rebuild_handle = asyncio.get_running_loop().call_later(self.debounce, self._scheduled_rebuild)
+
+    def _scheduled_rebuild(self):
+        self._rebuild_handle = None
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Ошибка пересборки табло расписания: {e}")
+
+    def rebuild(self) -> ScheduleSnapshot:
+        """Собрать табло заново из реплики"""
+        if self._rebuild_handle is not None:
+            self._rebuild_handle.cancel()
+            self._rebuild_handle = None
+        self._snapshot = ScheduleSnapshot(self.replica.active_flights(self.STATUSES))
+        self.stats['rebuilds'] += 1
+        return self._snapshot
+
+    def get(self) -> ScheduleSnapshot:
+        """Текущее табло (собирается при первом обращении и после полуночи)"""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.day != datetime.now().date():
+            snapshot = self.rebuild()
+        self.stats['served'] += 1
+        return snapshot
+
+    def close(self):
+        if self._rebuild_handle is not None:
+            self._rebuild_handle.cancel()
+            self._rebuild_handle = None
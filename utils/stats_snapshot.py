@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Any, Callable, Awaitable
+
+logger = logging.getLogger('aviasales_bot')
+
+
+class StatsSnapshot:
+    """Общий снимок статистики бота.
+
+    Один источник цифр для BotData, менеджера статусов, get_bot_info и
+    админ-панели. Снимок перечитывается не чаще, чем раз в max_age секунд;
+    одновременные запросы ждут одну и ту же загрузку. Между загрузками
+    известные изменения (новый рейс, команда, ошибка) применяются через
+    adjust/set, поэтому цифры не отстают, а запросов к Firestore не больше.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Dict[str, Any]]], max_age: float = 600):
+        self._loader = loader
+        self.max_age = max_age
+        self._data: Dict[str, Any] = {}
+        self._updated_at: Optional[datetime] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self.stats = {
+            'loads': 0,
+            'coalesced': 0,
+            'adjustments': 0
+        }
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        return self._updated_at
+
+    def age(self) -> float:
+        """Возраст снимка в секундах (бесконечность, если его еще нет)"""
+        if self._updated_at is None:
+            return float('inf')
+        return (datetime.now() - self._updated_at).total_seconds()
+
+    def peek(self) -> Dict[str, Any]:
+        """Текущий снимок без сетевых запросов"""
+        return dict(self._data)
+
+    async def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Снимок не старше max_age секунд (по умолчанию - бюджет снимка)"""
+        budget = self.max_age if max_age is None else max_age
+        if self.age() <= budget:
+            return dict(self._data)
+        return await self.refresh()
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Перечитать снимок; параллельные вызовы ждут одну загрузку"""
+        if self._inflight is not None and not self._inflight.done():
+            self.stats['coalesced'] += 1
+            return dict(await asyncio.shield(self._inflight))
+
+        self._inflight = asyncio.ensure_future(self._load())
+        return dict(await asyncio.shield(self._inflight))
+
+    async def _load(self) -> Dict[str, Any]:
+        try:
+            data = await self._loader()
+            self._data.update(data)
+            self._updated_at = datetime.now()
+            self.stats['loads'] += 1
+        except Exception as e:
+            logger.error(f"Ошибка загрузки снимка статистики: {e}")
+        return self._data
+
+    def adjust(self, key: str, delta: int = 1):
+        """Применить известное изменение счетчика без перечитывания"""
+        if key in self._data and isinstance(self._data[key], (int, float)):
+            self._data[key] += delta
+            self.stats['adjustments'] += 1
+
+    def set(self, key: str, value: Any):
+        """Установить значение, известное без запроса (например, из реплики)"""
+        self._data[key] = value
+        self.stats['adjustments'] += 1
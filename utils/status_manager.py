@@ -942,19 +942,14 @@ class StatusManager:
             return {}
 
         try:
-            # Используем кэшированные данные, если они свежие
-            if self.cached_stats and (datetime.now() -
-                                      self.last_stats_update).seconds < 300:
-                return self.cached_stats
-
             stats = {
                 "guilds": len(self.bot.guilds),
                 "users": len(self.bot.users),
-                "airlines": 0,
-                "flights": 0,
-                "active_flights": 0,
-                "active_users": random.randint(50, 500),
-                "support_tickets": 0,
+                "airlines": "?",
+                "flights": "?",
+                "active_flights": "?",
+                "active_users": len(self.bot.users),
+                "support_tickets": "?",
                 "meme_statuses": len(self.short_sassy_statuses) + 
                                 sum(len(v) for v in self.meme_statuses.values()) + 
                                 len(self.absurd_statuses),
@@ -966,41 +961,15 @@ class StatusManager:
                                  len(self.absurd_statuses)
             }
 
-            # Получаем данные из Firebase (если есть)
+            # Данные Firebase берем из общего снимка статистики BotData
             if hasattr(self.bot, 'data') and self.bot.data:
-                try:
-                    # Авиакомпании
-                    airlines_docs = self.bot.data.get_collection(
-                        'airlines').stream()
-                    stats['airlines'] = len(list(airlines_docs))
-
-                    # Рейсы
-                    flights_docs = self.bot.data.get_collection(
-                        'flights').stream()
-                    stats['flights'] = len(list(flights_docs))
-
-                    # Активные рейсы (сегодня)
-                    now = datetime.now()
-                    today_start = datetime(now.year, now.month, now.day)
-
-                    active_query = self.bot.data.get_collection(
-                        'flights').where('created_at', '>=',
-                                         today_start).stream()
-                    stats['active_flights'] = len(list(active_query))
-
-                    # Обращения в поддержку
-                    tickets_query = self.bot.data.get_collection(
-                        'support_tickets').where('status', '==',
-                                                 'open').stream()
-                    stats['support_tickets'] = len(list(tickets_query))
-
-                except Exception as e:
-                    # Если нет доступа к Firebase, используем демо-данные
+                snapshot = await self.bot.data.stats_snapshot.get()
+                if snapshot:
                     stats.update({
-                        'airlines': random.randint(10, 50),
-                        'flights': random.randint(100, 1000),
-                        'active_flights': random.randint(5, 50),
-                        'support_tickets': random.randint(0, 10)
+                        'airlines': snapshot.get('total_airlines', '?'),
+                        'flights': snapshot.get('total_flights', '?'),
+                        'active_flights': snapshot.get('active_flights', '?'),
+                        'support_tickets': snapshot.get('open_tickets', '?')
                     })
 
             # Кэшируем статистику
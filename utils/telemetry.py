@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger('aviasales_bot')
+
+
+class TelemetryBuffer:
+    """Отложенная запись телеметрии в коллекции commands и errors.
+
+    Записи копятся в ограниченной очереди и уходят в Firestore пакетами,
+    когда набралось flush_size записей или прошло flush_interval секунд.
+
+    Политика переполнения: новая запись о команде отбрасывается со
+    счетчиком, а ошибка вытесняет самую старую запись о команде - ошибки
+    теряются только если очередь целиком состоит из ошибок.
+    """
+
+    def __init__(self, db_handler, max_size: int = 2000,
+                 flush_size: int = 200, flush_interval: float = 30):
+        self.db_handler = db_handler
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue: deque = deque()
+        self._flush_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'flushes': 0,
+            'dropped': {'commands': 0, 'errors': 0},
+            'failed': 0
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def record(self, collection: str, data: Dict[str, Any]):
+        """Поставить запись в очередь (без сетевых вызовов)"""
+        if len(self._queue) >= self.max_size:
+            if collection == 'commands' or not self._evict_command():
+                self.stats['dropped'][collection] = self.stats['dropped'].get(collection, 0) + 1
+                return
+
+        self._queue.append((collection, data))
+        self.stats['queued'] += 1
+        if len(self._queue) >= self.flush_size:
+            self._flush_event.set()
+
+    def _evict_command(self) -> bool:
+        for i, (collection, _) in enumerate(self._queue):
+            if collection == 'commands':
+                del self._queue[i]
+                self.stats['dropped']['commands'] += 1
+                return True
+        return False
+
+    async def flush(self):
+        """Записать все накопленные записи пакетами"""
+        async with self._flush_lock:
+            while self._queue:
+                chunk: List[Tuple[str, Dict[str, Any]]] = []
+                while self._queue and len(chunk) < self.db_handler.MAX_BATCH_OPS:
+                    chunk.append(self._queue.popleft())
+
+                try:
+                    await self.db_handler.add_documents(chunk)
+                    self.stats['written'] += len(chunk)
+                    self.stats['flushes'] += 1
+                except Exception as e:
+                    # Телеметрия не критична - не возвращаем записи в очередь
+                    self.stats['failed'] += len(chunk)
+                    logger.error(f"Ошибка записи телеметрии ({len(chunk)} записей): {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_event.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в буфере телеметрии: {e}")
+
+    async def close(self):
+        """Остановить фоновую запись и сбросить остаток очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()